@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Content-addressed artifact store for workflow outputs
+Every file a run produces is stored once under its SHA-256 digest and linked
+back to its run-level name, so identical outputs across runs (cache hits,
+reused videos, repeated renders) take no extra disk space. A small SQLite
+index records which runs reference which blobs; each run also gets its own
+directory of links, so a workflow uploads exactly one run instead of the whole
+output directory. `gc` removes old runs by age and total size, then every blob
+no remaining run references.
+
+Links are reflinks (copy-on-write clones) where the filesystem supports them,
+otherwise hardlinks, otherwise copies. A hardlinked output shares its inode
+with the blob, so writers must replace outputs rather than rewrite them in place.
+"""
+
+import argparse
+import errno
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator
+
+from media_cache import file_digest, DEFAULT_CACHE_DIR
+
+DEFAULT_STORE_DIR = "store"
+INDEX_FILENAME = "index.sqlite3"
+DEFAULT_KEEP_LAST = 1
+
+# Run IDs become file and directory names, so they may not contain separators
+_RUN_ID_RE = re.compile(r"[\w.-]{1,128}")
+
+# ioctl(FICLONE) on Linux: clone src's extents into dst (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    manifest TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS refs_digest ON refs (digest);
+"""
+
+
+def validate_run_id(run_id: str) -> str:
+    """Return run_id if it is safe to use as a file name component, else raise ValueError"""
+    if not _RUN_ID_RE.fullmatch(run_id) or not run_id.strip("."):
+        raise ValueError(f"Invalid run ID {run_id!r}: use 1-128 letters, digits, '_', '-' or '.', not only dots")
+    return run_id
+
+
+def reflink(src: str, dst: str):
+    """Clone src to dst without copying data; raises OSError where unsupported"""
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+
+
+def place(src: str, dst: str) -> str:
+    """Make dst share src's data as cheaply as the filesystem allows; returns the method used"""
+    try:
+        reflink(src, dst)
+        return "reflink"
+    except (OSError, ImportError):
+        pass
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+def replace_with(src: str, dst: str) -> str:
+    """Atomically point dst at src's data"""
+    tmp = f"{dst}.{os.getpid()}.link.tmp"
+    method = place(src, tmp)
+    os.replace(tmp, dst)
+    return method
+
+
+class ArtifactStore:
+    def __init__(self, root: Path, protected_dirs: Optional[List[Path]] = None):
+        """protected_dirs hold files other components own (the media cache by default); gc never deletes them"""
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.run_dir = self.root / "runs"
+        if protected_dirs is None:
+            protected_dirs = [self.root.parent / DEFAULT_CACHE_DIR]
+        self.protected_dirs = [Path(path).resolve() for path in protected_dirs]
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        with self.connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        # Short-lived connections, as in job_queue, so threads and worker processes can share the index
+        db = sqlite3.connect(self.root / INDEX_FILENAME, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def blob_path(self, digest: str, suffix: str = "") -> Path:
+        # Two-level fan-out keeps every directory small however many blobs there are
+        return self.blob_dir / digest[:2] / f"{digest}{suffix}"
+
+    def ingest(self, path: str) -> Dict[str, Any]:
+        """Store a file under its digest; a duplicate of a stored blob is relinked to it to free its space"""
+        digest = file_digest(path)
+        size = os.path.getsize(path)
+        with self.connect() as db:
+            row = db.execute("SELECT file FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row and (self.root / row["file"]).is_file():
+            blob = self.root / row["file"]
+            deduplicated = not os.path.samefile(path, blob)
+            if deduplicated:
+                replace_with(str(blob), path)
+            return {"digest": digest, "blob": blob, "size": size, "deduplicated": deduplicated}
+
+        blob = self.blob_path(digest, Path(path).suffix)
+        blob.parent.mkdir(exist_ok=True)
+        tmp = blob.with_name(f"{blob.name}.{os.getpid()}.tmp")
+        place(path, tmp)
+        os.replace(tmp, blob)
+        with self.connect() as db:
+            db.execute("INSERT OR REPLACE INTO blobs (digest, file, size, created) VALUES (?, ?, ?, ?)",
+                       (digest, str(blob.relative_to(self.root)), size, time.time()))
+        return {"digest": digest, "blob": blob, "size": size, "deduplicated": False}
+
+    def add_run(self, run_id: str, files: List[str], manifest: Optional[str] = None) -> Path:
+        """Store a run's output files and link them by name into runs/<run_id>/; returns that directory"""
+        run_path = self.run_dir / validate_run_id(run_id)
+        run_path.mkdir(exist_ok=True)
+        refs = []
+        saved = 0
+        for path in dict.fromkeys(files):
+            if not path or not os.path.isfile(path):
+                continue
+            entry = self.ingest(path)
+            name = os.path.basename(path)
+            replace_with(str(entry["blob"]), str(run_path / name))
+            refs.append((run_id, name, entry["digest"], os.path.abspath(path)))
+            if entry["deduplicated"]:
+                saved += entry["size"]
+        if manifest and os.path.isfile(manifest):
+            # Manifests are small and unique per run, so they are copied rather than stored as blobs
+            shutil.copy2(manifest, run_path / os.path.basename(manifest))
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM refs WHERE run_id = ?", (run_id,))
+            db.executemany("INSERT INTO refs (run_id, name, digest, source) VALUES (?, ?, ?, ?)", refs)
+            db.execute("INSERT INTO runs (run_id, manifest, created) VALUES (?, ?, ?)"
+                       " ON CONFLICT(run_id) DO UPDATE SET manifest = excluded.manifest",
+                       (run_id, os.path.abspath(manifest) if manifest else None, time.time()))
+            db.execute("COMMIT")
+        print(f"🗄️ Stored {len(refs)} artifact(s) for run {run_id}"
+              + (f", {saved / 1024 / 1024:.1f} MB deduplicated" if saved else "") + f": {run_path}")
+        return run_path
+
+    def stats(self) -> Dict[str, Any]:
+        """Run and blob counts, and logical bytes (per run) vs stored bytes (unique blobs)"""
+        with self.connect() as db:
+            runs = db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            blobs, stored = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            logical = db.execute(
+                "SELECT COALESCE(SUM(b.size), 0) FROM refs r JOIN blobs b ON b.digest = r.digest"
+            ).fetchone()[0]
+        return {"runs": runs, "blobs": blobs, "stored_bytes": stored, "logical_bytes": logical,
+                "dedup_ratio": round(logical / stored, 3) if stored else None}
+
+    def show(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self.connect() as db:
+            run = db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if run is None:
+                return None
+            refs = db.execute(
+                "SELECT r.name, r.digest, r.source, b.size FROM refs r JOIN blobs b ON b.digest = r.digest"
+                " WHERE r.run_id = ? ORDER BY r.name", (run_id,)
+            ).fetchall()
+        return {**dict(run), "directory": str(self.run_dir / run_id), "files": [dict(ref) for ref in refs]}
+
+    def select_expired(self, db: sqlite3.Connection, max_size_mb: Optional[float], max_age_days: Optional[float],
+                       keep_last: int) -> List[str]:
+        """Runs to drop: older than max_age_days, then oldest first until unique blobs fit in max_size_mb"""
+        runs = db.execute("SELECT run_id, created FROM runs ORDER BY created DESC").fetchall()
+        digests: Dict[str, set] = {}
+        for row in db.execute("SELECT run_id, digest FROM refs"):
+            digests.setdefault(row["run_id"], set()).add(row["digest"])
+        sizes = {row["digest"]: row["size"] for row in db.execute("SELECT digest, size FROM blobs")}
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+        max_bytes = max_size_mb * 1024 * 1024 if max_size_mb is not None else None
+
+        expired = []
+        kept: set = set()
+        total = 0
+        over_budget = False
+        # Newest first: a run only costs the blobs no newer kept run already holds
+        for index, run in enumerate(runs):
+            blobs = digests.get(run["run_id"], set())
+            added = sum(sizes.get(digest, 0) for digest in blobs - kept)
+            if index >= keep_last:
+                # Once one run is over the size budget, every older one goes too
+                over_budget = over_budget or (max_bytes is not None and total + added > max_bytes)
+                if over_budget or (cutoff is not None and run["created"] < cutoff):
+                    expired.append(run["run_id"])
+                    continue
+            kept |= blobs
+            total += added
+        return expired
+
+    def gc(self, max_size_mb: Optional[float] = None, max_age_days: Optional[float] = None,
+           keep_last: int = DEFAULT_KEEP_LAST, dry_run: bool = False) -> Dict[str, Any]:
+        """Remove expired runs (their links, run-level outputs and manifests), then unreferenced blobs
+
+        Runs are ordered newest first; keep_last of them always survive, so the
+        run that just finished is never collected by its own retention pass.
+        """
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            expired = set(self.select_expired(db, max_size_mb, max_age_days, keep_last))
+            refs = db.execute("SELECT run_id, digest, source FROM refs").fetchall()
+            blobs = db.execute("SELECT digest, file, size FROM blobs").fetchall()
+            manifests = [row["manifest"] for row in db.execute("SELECT run_id, manifest FROM runs")
+                         if row["run_id"] in expired and row["manifest"]]
+            live_digests = {row["digest"] for row in refs if row["run_id"] not in expired}
+            live_sources = {row["source"] for row in refs if row["run_id"] not in expired}
+            sources = {row["source"] for row in refs if row["run_id"] in expired} - live_sources
+            orphans = [row for row in blobs if row["digest"] not in live_digests]
+            if not dry_run:
+                db.executemany("DELETE FROM refs WHERE run_id = ?", [(run_id,) for run_id in expired])
+                db.executemany("DELETE FROM runs WHERE run_id = ?", [(run_id,) for run_id in expired])
+                db.executemany("DELETE FROM blobs WHERE digest = ?", [(row["digest"],) for row in orphans])
+            db.execute("COMMIT")
+
+        if not dry_run:
+            # The index is already consistent; a crash below only leaves files the index no longer knows
+            run_root = self.run_dir.resolve()
+            for run_id in expired:
+                run_path = (self.run_dir / run_id).resolve()
+                # A run ID from an older index could still name a path outside runs/
+                if run_path.parent != run_root:
+                    print(f"⚠️ Not removing {run_path}: run {run_id!r} is not a directory under {run_root}")
+                    continue
+                shutil.rmtree(run_path, ignore_errors=True)
+            output_root = self.root.resolve().parent
+            for path in sources | set(manifests):
+                resolved = Path(path).resolve()
+                # Only run-level outputs in the store's output directory; never files a run merely pointed at,
+                # nor files another component owns, such as cache entries the cache index still lists
+                if (resolved.is_relative_to(output_root)
+                        and not any(resolved.is_relative_to(protected) for protected in self.protected_dirs)):
+                    self._unlink(path)
+            for row in orphans:
+                self._unlink(str(self.root / row["file"]))
+        return {"runs_removed": len(expired), "blobs_removed": len(orphans),
+                "bytes_freed": sum(row["size"] for row in orphans), "dry_run": dry_run,
+                "removed_runs": sorted(expired)}
+
+    def verify(self) -> List[str]:
+        """Return digests whose blob is missing or no longer matches its content"""
+        with self.connect() as db:
+            rows = db.execute("SELECT digest, file FROM blobs").fetchall()
+        bad = []
+        for row in rows:
+            path = self.root / row["file"]
+            if not path.is_file() or file_digest(str(path)) != row["digest"]:
+                bad.append(row["digest"])
+        return bad
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                print(f"⚠️ Could not remove {path}: {e}")
+
+
+def main():
+    """Inspect the artifact store and apply retention policies"""
+    parser = argparse.ArgumentParser(description='Media artifact store administration')
+    parser.add_argument('--root', default=os.path.join('output', DEFAULT_STORE_DIR),
+                      help='Artifact store directory (default: %(default)s)')
+    parser.add_argument('--protect', action='append', metavar='DIR',
+                      help='Directory whose files gc must never delete; repeatable '
+                           f'(default: {DEFAULT_CACHE_DIR}/ next to the store)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='Show run and blob counts and the deduplicated size')
+    show = commands.add_parser('show', help='Show the files of one run')
+    show.add_argument('run_id')
+    gc = commands.add_parser('gc', help='Remove old runs and unreferenced blobs')
+    gc.add_argument('--max-size-mb', type=float, help='Keep the newest runs whose blobs fit in this size')
+    gc.add_argument('--max-age-days', type=float, help='Remove runs older than this')
+    gc.add_argument('--keep-last', type=int, default=DEFAULT_KEEP_LAST,
+                    help='Always keep this many newest runs (default: %(default)s)')
+    gc.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+    commands.add_parser('verify', help='Check every blob still matches its digest')
+    args = parser.parse_args()
+
+    store = ArtifactStore(Path(args.root), protected_dirs=args.protect)
+    if args.command == 'stats':
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == 'show':
+        print(json.dumps(store.show(args.run_id), indent=2))
+    elif args.command == 'gc':
+        summary = store.gc(args.max_size_mb, args.max_age_days, args.keep_last, args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"🧹 {verb} {summary['runs_removed']} run(s) and {summary['blobs_removed']} blob(s), "
+              f"{summary['bytes_freed'] / 1024 / 1024:.1f} MB")
+    elif args.command == 'verify':
+        bad = store.verify()
+        print(f"{'❌' if bad else '✅'} {len(bad)} damaged blob(s)")
+        for digest in bad:
+            print(f"  - {digest}")
+        if bad:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Fit a music track to a video's length
+Short music clips are looped with equal-power crossfades, faded in and out
+and loudness-normalized chunk by chunk, then piped as raw PCM straight into
+the ffmpeg muxer, so memory does not grow with the video length. This lets
+the workflow ask for short, cheap music generations and still cover any
+video length.
+"""
+
+import subprocess
+import threading
+from typing import Optional, Dict, Any, List, Iterator
+
+import numpy as np
+
+from ffmpeg_tools import get_ffmpeg_exe, stream_reencode, DEFAULT_FRAME_BUFFER_MB
+
+DEFAULT_SAMPLE_RATE = 48000
+DEFAULT_CHANNELS = 2
+DEFAULT_CROSSFADE = 1.5
+DEFAULT_FADE_IN = 0.5
+DEFAULT_FADE_OUT = 2.0
+DEFAULT_TARGET_DBFS = -16.0
+DEFAULT_PEAK_DBFS = -1.0
+# PCM handed to ffmpeg per write; the fitted track is never held whole
+DEFAULT_CHUNK_SECONDS = 1.0
+
+
+def db_to_gain(db: float) -> float:
+    return float(10 ** (db / 20))
+
+
+class AudioFitter:
+    def __init__(self, crossfade: float = DEFAULT_CROSSFADE, fade_in: float = DEFAULT_FADE_IN,
+                 fade_out: float = DEFAULT_FADE_OUT, target_dbfs: Optional[float] = DEFAULT_TARGET_DBFS,
+                 peak_dbfs: float = DEFAULT_PEAK_DBFS, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 channels: int = DEFAULT_CHANNELS, chunk_seconds: float = DEFAULT_CHUNK_SECONDS):
+        """Times are in seconds; target_dbfs is an RMS level, None leaves the level alone"""
+        self.crossfade = crossfade
+        self.fade_in = fade_in
+        self.fade_out = fade_out
+        self.target_dbfs = target_dbfs
+        self.peak_dbfs = peak_dbfs
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.chunk_seconds = chunk_seconds
+
+    def decode(self, audio_path: str) -> np.ndarray:
+        """Decode any audio file ffmpeg understands into a (samples, channels) float32 array"""
+        proc = subprocess.run(
+            [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", audio_path, "-vn",
+             "-f", "f32le", "-ac", str(self.channels), "-ar", str(self.sample_rate), "pipe:1"],
+            capture_output=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg decode failed: {proc.stderr.decode(errors='replace').strip()}")
+        samples = np.frombuffer(proc.stdout, dtype=np.float32).reshape(-1, self.channels)
+        if not len(samples):
+            raise RuntimeError(f"{audio_path} contains no audio")
+        return samples
+
+    def _looped(self, samples: np.ndarray, length: int) -> Iterator[np.ndarray]:
+        """Yield samples repeated to exactly length frames, crossfading each seam with equal power"""
+        source_length = len(samples)
+        if length <= source_length:
+            yield from self._chunks(samples[:length])
+            return
+        overlap = min(int(self.crossfade * self.sample_rate), source_length // 2)
+        period = source_length - overlap
+
+        # The first repeat plays the source up to `period`; every later repeat is the
+        # same block, whose first `overlap` frames fade in over the tail of the previous
+        # repeat (source frames period..end), so that block is built once and reused
+        steady = samples[:period].copy()
+        if overlap:
+            theta = (np.arange(overlap) / overlap * (np.pi / 2)).astype(np.float32)[:, None]
+            steady[:overlap] = samples[:overlap] * np.sin(theta) + samples[period:] * np.cos(theta)
+        remaining = length
+        block = samples[:period]
+        while remaining > 0:
+            yield from self._chunks(block[:remaining])
+            remaining -= min(len(block), remaining)
+            block = steady
+
+    def _chunks(self, block: np.ndarray) -> Iterator[np.ndarray]:
+        size = max(1, int(self.chunk_seconds * self.sample_rate))
+        for start in range(0, len(block), size):
+            yield block[start:start + size]
+
+    def _shaped(self, samples: np.ndarray, length: int) -> Iterator[np.ndarray]:
+        """Yield the looped track in chunks with the fade-in and fade-out applied"""
+        fade_in = min(int(self.fade_in * self.sample_rate), length // 2)
+        fade_out = min(int(self.fade_out * self.sample_rate), length // 2)
+        fade_out_start = length - fade_out
+        position = 0
+        for chunk in self._looped(samples, length):
+            end = position + len(chunk)
+            if position < fade_in or end > fade_out_start:
+                chunk = chunk.copy()
+                index = np.arange(position, end)
+                gain = np.ones(len(chunk), dtype=np.float32)
+                if position < fade_in:
+                    gain = np.minimum(gain, index / max(fade_in - 1, 1))
+                if end > fade_out_start:
+                    gain = np.minimum(gain, 1 - (index - fade_out_start) / max(fade_out - 1, 1))
+                chunk *= np.clip(gain, 0, 1).astype(np.float32)[:, None]
+            yield chunk
+            position = end
+
+    def stream(self, samples: np.ndarray, duration: float) -> Iterator[np.ndarray]:
+        """Yield the fitted track (looped or trimmed to duration, faded, normalized) in chunks
+
+        Memory stays at one loop period plus one chunk however long the video is:
+        the loudness is measured in a first pass over the chunks and applied in a second.
+        """
+        length = int(round(duration * self.sample_rate))
+        gain = np.float32(1)
+        if self.target_dbfs is not None and length:
+            square_sum = 0.0
+            peak = 0.0
+            for chunk in self._shaped(samples, length):
+                square_sum += float(np.sum(np.square(chunk, dtype=np.float64)))
+                peak = max(peak, float(np.max(np.abs(chunk))))
+            rms = (square_sum / (length * self.channels)) ** 0.5
+            if rms > 0:
+                # Never push peaks past the ceiling to reach the target level
+                gain = np.float32(min(db_to_gain(self.target_dbfs) / rms, db_to_gain(self.peak_dbfs) / peak))
+        for chunk in self._shaped(samples, length):
+            yield chunk * gain
+
+    def fit(self, samples: np.ndarray, duration: float) -> np.ndarray:
+        """Loop or trim to duration, apply fades and normalize loudness, as one array"""
+        chunks = list(self.stream(samples, duration))
+        return np.concatenate(chunks) if chunks else np.zeros((0, self.channels), dtype=np.float32)
+
+    def loop(self, samples: np.ndarray, length: int) -> np.ndarray:
+        """Repeat samples to exactly length frames, crossfading each seam, as one array"""
+        return np.concatenate(list(self._looped(samples, length)))
+
+    def pcm(self, audio_path: str, duration: float) -> Iterator[bytes]:
+        """Raw f32le PCM of audio_path fitted to duration, chunk by chunk"""
+        # Decoded up front so a bad music file fails before any output is started
+        samples = self.decode(audio_path)
+        return (chunk.tobytes() for chunk in self.stream(samples, duration))
+
+    def mux(self, video_path: str, audio_path: str, output_path: str, duration: float,
+            copy_video: bool = True, audio_bitrate: str = "192k", video_info: Optional[Dict[str, Any]] = None,
+            buffer_mb: float = DEFAULT_FRAME_BUFFER_MB) -> str:
+        """Fit audio_path to duration and mux it onto video_path in a single ffmpeg call
+
+        Without copy_video the frames go through stream_reencode's bounded buffer
+        (buffer_mb) and the fitted PCM through a second pipe into the same encoder.
+        """
+        pcm = self.pcm(audio_path, duration)
+        if not copy_video:
+            stream_reencode(video_path, None, output_path, video_info=video_info, duration=duration,
+                            buffer_mb=buffer_mb, audio_bitrate=audio_bitrate, audio_pcm=pcm,
+                            sample_rate=self.sample_rate, channels=self.channels)
+            return output_path
+        command: List[str] = [
+            get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+            "-i", video_path,
+            "-f", "f32le", "-ar", str(self.sample_rate), "-ac", str(self.channels), "-i", "pipe:0",
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c:v", "copy", "-c:a", "aac", "-b:a", audio_bitrate, "-t", f"{duration:.3f}",
+            "-movflags", "+faststart", output_path,
+        ]
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Drained on a thread so a chatty ffmpeg can't block on stderr while we block on stdin
+        errors: List[bytes] = []
+        drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+        drain.start()
+        try:
+            for data in pcm:
+                proc.stdin.write(data)
+        except BrokenPipeError:
+            # ffmpeg stopped reading (it reached -t or failed); its return code tells which
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            proc.wait()
+            drain.join()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg mux failed: {b''.join(errors).decode(errors='replace').strip()}")
+        return output_path
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the media generation pipeline
+Runs the generate_media.py and generate_protein_media.py workflows against
+local stand-ins for Anthropic, Imagen, Hailuo and Lyria that answer with
+real (tiny) media files after a configurable delay, and reports throughput,
+stage latency, peak RSS and encode time across concurrency levels without
+spending API credits.
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from metrics import peak_rss_mb
+
+DEFAULT_LATENCY = {"anthropic": 0.2, "imagen": 1.0, "hailuo": 3.0, "lyria": 1.5}
+DEFAULT_CONCURRENCY = [1, 4, 16]
+STUB_PROJECT = "benchmark"
+
+
+def parse_latency(spec: str) -> Dict[str, float]:
+    """Parse 'anthropic=0.2,hailuo=3' into per-provider latencies"""
+    latency = dict(DEFAULT_LATENCY)
+    for item in filter(None, spec.split(",")):
+        name, _, seconds = item.partition("=")
+        latency[name.strip()] = float(seconds)
+    return latency
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return round(ordered[rank], 3)
+
+
+class MediaFixtures:
+    """Tiny but real PNG, WAV and MP4 payloads for the stub providers"""
+
+    def __init__(self, root: Path, media_seconds: float):
+        from ffmpeg_tools import get_ffmpeg_exe
+
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.video = self.root / "fixture.mp4"
+        subprocess.run(
+            [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "lavfi",
+             "-i", f"testsrc=size=320x240:rate=24:duration={media_seconds}",
+             "-c:v", "libx264", "-pix_fmt", "yuv420p", str(self.video)],
+            check=True
+        )
+        self.audio = self._sine_wav(media_seconds)
+
+    def _sine_wav(self, seconds: float, sample_rate: int = 22050) -> bytes:
+        import math
+        frames = bytearray()
+        for i in range(int(seconds * sample_rate)):
+            sample = int(12000 * math.sin(2 * math.pi * 440 * i / sample_rate))
+            frames += sample.to_bytes(2, "little", signed=True)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(bytes(frames))
+        return buffer.getvalue()
+
+    def image(self) -> bytes:
+        # A random colour per request keeps content hashes unique, so
+        # nothing downstream deduplicates the benchmark's own outputs
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), tuple(random.randrange(256) for _ in range(3))).save(buffer, "PNG")
+        return buffer.getvalue()
+
+
+class StubProviders:
+    """Local HTTP stand-ins for the Anthropic, fal queue and Vertex AI APIs"""
+
+    def __init__(self, fixtures: MediaFixtures, output_dir: Path, latency: Dict[str, float],
+                 failure_rate: float = 0.0):
+        self.fixtures = fixtures
+        self.output_dir = output_dir
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.jobs: Dict[str, float] = {}
+        self.job_kinds: Dict[str, str] = {}
+        self.calls: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, provider: str):
+        with self.lock:
+            self.calls[provider] = self.calls.get(provider, 0) + 1
+
+    def should_fail(self) -> bool:
+        return random.random() < self.failure_rate
+
+    def delay(self, provider: str):
+        base = self.latency.get(provider, 0)
+        time.sleep(base * random.uniform(0.8, 1.2))
+
+    def write_output(self, prefix: str, suffix: str, payload: bytes) -> str:
+        path = self.output_dir / f"{prefix}_{uuid.uuid4().hex[:12]}{suffix}"
+        path.write_bytes(payload)
+        return str(path)
+
+    def claude_tool_output(self, tools: List[Dict[str, Any]]) -> str:
+        """Do what the named MCP tool would do and return the downloaded file path"""
+        names = " ".join(tool["name"] for tool in tools)
+        if "imagen" in names:
+            self.delay("imagen")
+            return self.write_output("imagen3", ".png", self.fixtures.image())
+        if "hailuo" in names:
+            self.delay("hailuo")
+            return self.write_output("hailuo_02", ".mp4", self.fixtures.video.read_bytes())
+        self.delay("lyria")
+        return self.write_output("lyria_output", ".wav", self.fixtures.audio)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, body: Dict[str, Any], status: int = 200):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_POST(self):
+                body = self.read_json()
+                if self.path.startswith("/v1/messages"):
+                    stub.count("anthropic")
+                    stub.delay("anthropic")
+                    if stub.should_fail():
+                        return self.send_json({"type": "error", "error": {"type": "api_error",
+                                                                           "message": "injected"}}, 500)
+                    text = stub.claude_tool_output(body.get("tools", []))
+                    return self.send_json({
+                        "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant",
+                        "model": body.get("model"), "stop_reason": "end_turn", "stop_sequence": None,
+                        "content": [{"type": "text", "text": text}],
+                        "usage": {"input_tokens": len(json.dumps(body)) // 4, "output_tokens": 20}
+                    })
+                if ":predict" in self.path:
+                    provider = "lyria" if "lyria" in self.path else "imagen"
+                    stub.count(provider)
+                    stub.delay(provider)
+                    if stub.should_fail():
+                        return self.send_json({"error": "injected"}, 500)
+                    payload = stub.fixtures.audio if provider == "lyria" else stub.fixtures.image()
+                    return self.send_json({"predictions": [
+                        {"bytesBase64Encoded": base64.b64encode(payload).decode("ascii")}
+                    ]})
+                # fal queue submit; Imagen 4 jobs come back as images, everything else as Hailuo video
+                provider = "imagen" if "imagen4" in self.path else "hailuo"
+                stub.count(provider)
+                request_id = uuid.uuid4().hex
+                with stub.lock:
+                    stub.jobs[request_id] = time.time() + stub.latency.get(provider, 0)
+                    stub.job_kinds[request_id] = provider
+                base = f"{stub.url}/fal-ai/minimax/requests/{request_id}"
+                self.send_json({"request_id": request_id, "status_url": f"{base}/status",
+                                "response_url": base, "cancel_url": f"{base}/cancel"})
+
+            def do_PUT(self):
+                self.send_json({"status": "CANCELLATION_REQUESTED"})
+
+            def do_GET(self):
+                if self.path.startswith("/files/"):
+                    image = self.path.endswith(".png")
+                    payload = stub.fixtures.image() if image else stub.fixtures.video.read_bytes()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/png" if image else "video/mp4")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                parts = self.path.strip("/").split("/")
+                request_id = parts[3] if len(parts) > 3 else ""
+                if request_id not in stub.jobs:
+                    return self.send_json({"detail": "not found"}, 404)
+                if self.path.endswith("/status"):
+                    if stub.should_fail():
+                        return self.send_json({"detail": "injected"}, 503)
+                    done = time.time() >= stub.jobs[request_id]
+                    return self.send_json({"status": "COMPLETED" if done else "IN_PROGRESS"})
+                if stub.job_kinds.get(request_id) == "imagen":
+                    return self.send_json({"images": [{"url": f"{stub.url}/files/{request_id}.png"}]})
+                self.send_json({"video": {"url": f"{stub.url}/files/{request_id}.mp4"}})
+
+        return Handler
+
+
+class StubAuth:
+    """Stands in for VertexAuth so no Google credentials are needed"""
+
+    project = STUB_PROJECT
+
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": "Bearer benchmark"}
+
+
+def summarize(name: str, concurrency: int, elapsed: float, runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    completed = [r for r in runs if "final_video" in r.get("generated_files", {})]
+    stage_latency = {}
+    for stage in ("image", "video", "music", "combine"):
+        durations = [r["stages"][stage]["duration_seconds"] for r in runs if stage in r.get("stages", {})]
+        stage_latency[stage] = {"p50": percentile(durations, 50), "p95": percentile(durations, 95)}
+    return {
+        "variant": name,
+        "concurrency": concurrency,
+        "jobs": len(runs),
+        "completed": len(completed),
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_second": round(len(runs) / elapsed, 3) if elapsed else None,
+        "stage_latency": stage_latency,
+        "encode_seconds_p50": stage_latency["combine"]["p50"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_generate_media(stubs: StubProviders, output_dir: Path, concurrency: int, jobs: int,
+                         dispatch: str) -> Dict[str, Any]:
+    import generate_media
+    from hailuo_jobs import HailuoClient, HailuoJobPoller
+    from providers import build_session, ImagenAdapter, LyriaAdapter, HailuoAdapter
+
+    generate_media.OUTPUT_DIR = output_dir
+    limits = {name: max(concurrency, 1) for name in generate_media.DEFAULT_PROVIDER_LIMITS}
+    providers = {}
+    poller = None
+    if dispatch == "direct":
+        session = build_session(pool_size=sum(limits.values()))
+        poller = HailuoJobPoller(HailuoClient(api_key="benchmark", base_url=stubs.url, session=session),
+                                 output_dir, initial_interval=0.2, max_interval=1.0)
+        providers = {
+            "imagen": ImagenAdapter(session, StubAuth(), output_dir, base_url=stubs.url),
+            "lyria": LyriaAdapter(session, StubAuth(), output_dir, base_url=stubs.url),
+            "hailuo": HailuoAdapter(poller),
+        }
+    generator = generate_media.MediaGenerator(limits=limits, providers=providers)
+    batch_jobs = [{"id": f"bench{i:04d}", "image_prompt": f"benchmark cat {i}"} for i in range(jobs)]
+    started = time.time()
+    batch = generator.run_batch(batch_jobs, workers=concurrency)
+    elapsed = time.time() - started
+    if poller:
+        poller.close()
+    return summarize(f"generate_media[{dispatch}]", concurrency, elapsed, batch["jobs"])
+
+
+def bench_protein_media(stubs: StubProviders, output_dir: Path, concurrency: int, jobs: int) -> Dict[str, Any]:
+    from concurrent.futures import ThreadPoolExecutor
+    import generate_protein_media
+    from hailuo_jobs import HailuoClient, HailuoJobPoller
+    from providers import build_session, LyriaAdapter, HailuoAdapter, FalImagenAdapter
+
+    session = build_session(pool_size=max(concurrency, 1) * 3)
+    poller = HailuoJobPoller(HailuoClient(api_key="benchmark", base_url=stubs.url, session=session),
+                             output_dir, initial_interval=0.2, max_interval=1.0)
+    providers = {
+        "imagen4-ultra": FalImagenAdapter(session, output_dir, base_url=stubs.url, initial_interval=0.2),
+        "hailuo": HailuoAdapter(poller),
+        "lyria": LyriaAdapter(session, StubAuth(), output_dir, base_url=stubs.url),
+    }
+
+    def run_one(i):
+        generator = generate_protein_media.MediaGenerator(output_dir, providers,
+                                                          image_prompt=f"benchmark protein {i}")
+        try:
+            files = {"final_video": generator.run_workflow(output_dir / f"protein_bench_{i:04d}.json")}
+        except Exception:
+            # A failed run still counts, as it does for the other variants
+            files = {}
+        stages = {stage: {"duration_seconds": entry["duration_seconds"]}
+                  for stage, entry in generator.stages.items()}
+        if "final_video" in stages:
+            stages["combine"] = stages.pop("final_video")
+        return {"generated_files": files, "stages": stages}
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        runs = list(executor.map(run_one, range(jobs)))
+    elapsed = time.time() - started
+    poller.close()
+    return summarize("generate_protein_media", concurrency, elapsed, runs)
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    header = f"{'variant':<26}{'conc':>5}{'jobs':>6}{'ok':>5}{'jobs/s':>9}" \
+             f"{'image p50/p95':>16}{'video p50/p95':>16}{'music p50/p95':>16}{'encode p50':>12}{'RSS MB':>9}"
+    print(header)
+    print("-" * len(header))
+
+    def pair(latency: Dict[str, Optional[float]]) -> str:
+        if latency["p50"] is None:
+            return "-"
+        return f"{latency['p50']:.2f}/{latency['p95']:.2f}"
+
+    for row in rows:
+        latency = row["stage_latency"]
+        encode = "-" if row["encode_seconds_p50"] is None else f"{row['encode_seconds_p50']:.3f}"
+        print(f"{row['variant']:<26}{row['concurrency']:>5}{row['jobs']:>6}{row['completed']:>5}"
+              f"{row['jobs_per_second']:>9.3f}{pair(latency['image']):>16}{pair(latency['video']):>16}"
+              f"{pair(latency['music']):>16}{encode:>12}{row['peak_rss_mb'] or '-':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for the media generation pipeline')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY,
+                      help='Concurrency levels to measure')
+    parser.add_argument('--jobs', type=int, default=16,
+                      help='Jobs per concurrency level')
+    parser.add_argument('--latency', default='',
+                      help='Per-provider stub latency in seconds, e.g. anthropic=0.2,hailuo=3')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                      help='Probability that a stub request fails with a 5xx error')
+    parser.add_argument('--media-seconds', type=float, default=4.0,
+                      help='Length of the stub video and music clips')
+    parser.add_argument('--variants', nargs='+', default=['claude', 'direct', 'protein'],
+                      choices=['claude', 'direct', 'protein'],
+                      help='Pipeline variants to benchmark')
+    parser.add_argument('--json', metavar='PATH',
+                      help='Also write the report as JSON')
+    parser.add_argument('--verbose', action='store_true',
+                      help='Show workflow output instead of only the report')
+    parser.add_argument('--keep', action='store_true',
+                      help='Keep the working directory of fixtures and outputs instead of deleting it')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="media_benchmark_"))
+    try:
+        run_benchmark(args, workdir)
+    finally:
+        if args.keep:
+            print(f"Kept working directory: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_benchmark(args: argparse.Namespace, workdir: Path):
+    fixtures = MediaFixtures(workdir / "fixtures", args.media_seconds)
+    latency = parse_latency(args.latency)
+    rows = []
+
+    with StubProviders(fixtures, workdir, latency, args.failure_rate) as stubs:
+        os.environ["ANTHROPIC_BASE_URL"] = stubs.url
+        os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+        for concurrency in args.concurrency:
+            for variant in args.variants:
+                output_dir = workdir / f"{variant}_c{concurrency}"
+                output_dir.mkdir(parents=True, exist_ok=True)
+                stubs.output_dir = output_dir
+                print(f"⏱️ {variant} at concurrency {concurrency} ({args.jobs} jobs)...", file=sys.stderr)
+                quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+                with quiet:
+                    if variant == "protein":
+                        rows.append(bench_protein_media(stubs, output_dir, concurrency, args.jobs))
+                    else:
+                        rows.append(bench_generate_media(stubs, output_dir, concurrency, args.jobs, variant))
+
+    print_report(rows)
+    print(f"\nStub latency: {latency}, failure rate: {args.failure_rate}")
+    print(f"Stub calls: {stubs.calls}")
+    print("Peak RSS is the process-wide peak so far, so it only grows across rows.")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"latency": latency, "failure_rate": args.failure_rate, "stub_calls": stubs.calls,
+                       "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
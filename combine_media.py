@@ -1,41 +1,291 @@
 #!/usr/bin/env python3
+"""
+Batch combiner: put music onto many videos at once
+Pairs come from a manifest (JSON list or JSON Lines of {"video", "audio",
+"output"}) or from video globs plus one or more music files, and are muxed on
+a process pool sized to the available cores. Each pair copies the video
+stream when its codec allows and re-encodes only when it must. A sidecar next
+to every output records the input hashes, sizes and mtimes it was built from,
+so rerunning over a backlog only processes new or changed pairs.
+
+    python combine_media.py 'output/hailuo_02_*.mp4' --audio 'music/*.wav' --output-dir backfill
+    python combine_media.py --manifest pairs.jsonl --jobs 4
+"""
+
+import argparse
+import glob
+import json
 import os
-from moviepy import VideoFileClip, AudioFileClip
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from ffmpeg_tools import probe_media, can_stream_copy, mux_video_audio, stream_reencode
+from audio_fit import AudioFitter, DEFAULT_CROSSFADE, DEFAULT_TARGET_DBFS
+from media_cache import file_digest
+
+SIDECAR_SUFFIX = ".combine.json"
+OUTPUT_SUFFIX = "_with_music.mp4"
+
+
+def available_cores() -> int:
+    """Cores this process may run on, which can be fewer than the machine has (containers, taskset)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def expand(patterns: List[str]) -> List[str]:
+    """Expand globs (and plain paths) into a sorted, de-duplicated file list"""
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        paths += sorted(path for path in matches if os.path.isfile(path))
+    return list(dict.fromkeys(paths))
+
+
+def load_manifest(path: str) -> List[Dict[str, str]]:
+    """Read pairs from a JSON list or a JSON Lines file"""
+    with open(path) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        entries = json.loads(text)
+    else:
+        entries = []
+        for line_number, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from e
+    base = os.path.dirname(os.path.abspath(path))
+    pairs = []
+    for index, entry in enumerate(entries):
+        if "video" not in entry or "audio" not in entry:
+            raise ValueError(f"{path}: entry {index} needs both 'video' and 'audio'")
+        # Relative paths are relative to the manifest, so it can travel with its media
+        pairs.append({key: os.path.join(base, entry[key]) if entry.get(key) else entry.get(key)
+                      for key in ("video", "audio", "output")})
+    return pairs
+
+
+def pair_with_audio(videos: List[str], audio: List[str]) -> List[Dict[str, str]]:
+    """One music file goes on every video; several are assigned round-robin in sorted order"""
+    return [{"video": video, "audio": audio[index % len(audio)], "output": None}
+            for index, video in enumerate(videos)]
+
+
+def default_output(video_path: str, output_dir: Optional[str]) -> str:
+    directory = output_dir or os.path.dirname(video_path)
+    return os.path.join(directory, Path(video_path).stem + OUTPUT_SUFFIX)
+
+
+def find_collisions(pairs: List[Dict[str, str]]) -> Dict[str, List[str]]:
+    """Outputs more than one pair would write, with the videos that would overwrite each other"""
+    videos: Dict[str, List[str]] = {}
+    for pair in pairs:
+        videos.setdefault(os.path.abspath(pair["output"]), []).append(pair["video"])
+    return {output: sources for output, sources in videos.items() if len(sources) > 1}
+
+
+def fingerprint(path: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Size, mtime and SHA-256 of a file; the digest is reused while size and mtime are unchanged"""
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return previous
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_digest(path)}
+
+
+def read_sidecar(output_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(output_path + SIDECAR_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_sidecar(output_path: str, sidecar: Dict[str, Any]):
+    tmp_path = output_path + SIDECAR_SUFFIX + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(sidecar, f, indent=2)
+    os.replace(tmp_path, output_path + SIDECAR_SUFFIX)
+
+
+def up_to_date(sidecar: Optional[Dict[str, Any]], output_path: str, inputs: Dict[str, Dict[str, Any]],
+               settings: Dict[str, Any]) -> bool:
+    """The output exists unchanged and was built from these exact inputs with these settings"""
+    if not sidecar or not os.path.isfile(output_path):
+        return False
+    stat = os.stat(output_path)
+    output = sidecar.get("output", {})
+    if output.get("size") != stat.st_size or output.get("mtime_ns") != stat.st_mtime_ns:
+        return False
+    return (sidecar.get("settings") == settings
+            and all(sidecar.get(key, {}).get("sha256") == value["sha256"] for key, value in inputs.items()))
+
+
+def combine_pair(pair: Dict[str, str], settings: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+    """Mux one video/audio pair unless its output is already up to date; runs in a pool worker"""
+    started = time.time()
+    video_path, audio_path, output_path = pair["video"], pair["audio"], pair["output"]
+    result: Dict[str, Any] = {"video": video_path, "audio": audio_path, "output": output_path}
+    partial_path = None
+    try:
+        sidecar = read_sidecar(output_path)
+        previous = sidecar or {}
+        inputs = {"video": fingerprint(video_path, previous.get("video")),
+                  "audio": fingerprint(audio_path, previous.get("audio"))}
+        if not force and up_to_date(sidecar, output_path, inputs, settings):
+            if inputs != {"video": previous.get("video"), "audio": previous.get("audio")}:
+                # Touched but unchanged inputs: remember the new mtimes so the next run skips hashing
+                write_sidecar(output_path, {**previous, **inputs})
+            return {**result, "status": "skipped", "seconds": time.time() - started,
+                    "media_seconds": previous.get("duration") or 0, "bytes": os.path.getsize(output_path)}
+
+        video_info = probe_media(video_path)
+        copy_video = settings["mux_mode"] == "auto" and can_stream_copy(video_info)
+        duration = video_info["duration"]
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        # Written under a temporary name so an interrupted mux never looks like a finished output
+        root, extension = os.path.splitext(output_path)
+        partial_path = f"{root}.partial{extension}"
+        # Same fallbacks as the workflow: fitted audio, then the raw track copied, then a full re-encode
+        done = False
+        if settings["audio_fit"] and duration:
+            fitter = AudioFitter(crossfade=settings["crossfade"], target_dbfs=settings["target_loudness"])
+            try:
+                fitter.mux(video_path, audio_path, partial_path, duration, copy_video=copy_video,
+                           video_info=video_info)
+                done = True
+            except RuntimeError as e:
+                result["fallbacks"] = [f"audio fit failed: {e}"]
+        if not done and copy_video:
+            try:
+                mux_video_audio(video_path, audio_path, partial_path, duration=duration)
+                done = True
+            except RuntimeError as e:
+                result.setdefault("fallbacks", []).append(f"stream copy failed: {e}")
+                copy_video = False
+        if not done:
+            stream_reencode(video_path, audio_path, partial_path, video_info=video_info)
+        os.replace(partial_path, output_path)
+
+        stat = os.stat(output_path)
+        sidecar = {**inputs, "settings": settings, "duration": duration, "copy_video": copy_video,
+                   "output": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}}
+        write_sidecar(output_path, sidecar)
+        return {**result, "status": "copied" if copy_video else "reencoded", "seconds": time.time() - started,
+                "media_seconds": duration or 0, "bytes": stat.st_size}
+    except Exception as e:
+        if partial_path and os.path.exists(partial_path):
+            os.unlink(partial_path)
+        return {**result, "status": "failed", "error": str(e), "seconds": time.time() - started,
+                "media_seconds": 0, "bytes": 0}
+
 
-# File paths
-video_path = "hailuo_02_20250706_164018.mp4"
-audio_path = "lyria_output_6ddEkayHR.wav"
-output_path = "final_cat_video_with_music.mp4"
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    processed = [r for r in results if r["status"] in ("copied", "reencoded")]
+    media_seconds = sum(r["media_seconds"] for r in processed)
+    output_bytes = sum(r["bytes"] for r in processed)
+    return {
+        "pairs": len(results),
+        **{status: counts.get(status, 0) for status in ("copied", "reencoded", "skipped", "failed")},
+        "elapsed_seconds": round(elapsed, 3),
+        "pairs_per_second": round(len(processed) / elapsed, 3) if elapsed else None,
+        # Seconds of finished video per wall-clock second, across all workers
+        "realtime_factor": round(media_seconds / elapsed, 2) if elapsed else None,
+        "output_mb_per_second": round(output_bytes / 1024 / 1024 / elapsed, 2) if elapsed else None,
+    }
 
-print("Loading video file...")
-# Load video clip
-video = VideoFileClip(video_path)
 
-print("Loading audio file...")
-# Load audio clip
-audio = AudioFileClip(audio_path)
+def main(argv: Optional[List[str]] = None):
+    """Combine many video/music pairs in parallel"""
+    parser = argparse.ArgumentParser(description='Put music onto videos in parallel, skipping up-to-date outputs')
+    parser.add_argument('videos', nargs='*', metavar='VIDEO',
+                      help='Video files or glob patterns (quote globs so the shell leaves them alone)')
+    parser.add_argument('--audio', nargs='+', metavar='AUDIO',
+                      help='Music files or globs for the videos; several are assigned round-robin')
+    parser.add_argument('--manifest', metavar='PATH',
+                      help='JSON list or JSON Lines of {"video", "audio", "output"} pairs')
+    parser.add_argument('--output-dir',
+                      help=f'Where outputs go when a pair names none (default: next to each video, *{OUTPUT_SUFFIX})')
+    parser.add_argument('--jobs', type=int, default=available_cores(),
+                      help='Worker processes (default: %(default)s, the number of cores)')
+    parser.add_argument('--mux-mode', choices=['auto', 'reencode'], default='auto',
+                      help='auto: copy the video stream when codecs allow; reencode: always re-encode with libx264')
+    parser.add_argument('--no-audio-fit', action='store_true',
+                      help='Only trim the music; do not loop, fade or normalize it to the video length')
+    parser.add_argument('--crossfade', type=float, default=DEFAULT_CROSSFADE,
+                      help='Crossfade in seconds when looping short music (default: %(default)s)')
+    parser.add_argument('--target-loudness', type=float, default=DEFAULT_TARGET_DBFS,
+                      help='Music RMS level in dBFS (default: %(default)s)')
+    parser.add_argument('--force', action='store_true',
+                      help='Rebuild outputs even when they are up to date')
+    parser.add_argument('--json', metavar='PATH',
+                      help='Also write per-pair results and the summary as JSON')
+    args = parser.parse_args(argv)
 
-# Get video duration
-video_duration = video.duration
-print(f"Video duration: {video_duration:.2f} seconds")
-print(f"Audio duration: {audio.duration:.2f} seconds")
+    if args.manifest:
+        pairs = load_manifest(args.manifest)
+    elif args.videos and args.audio:
+        audio = expand(args.audio)
+        if not audio:
+            parser.error(f"No music files match {' '.join(args.audio)}")
+        pairs = pair_with_audio(expand(args.videos), audio)
+    else:
+        parser.error("Give --manifest, or video paths/globs together with --audio")
+    for pair in pairs:
+        pair["output"] = pair.get("output") or default_output(pair["video"], args.output_dir)
+    collisions = find_collisions(pairs)
+    if collisions:
+        # Same-named videos from different directories would silently overwrite each other's output
+        lines = [f"  {output} <- {', '.join(videos)}" for output, videos in sorted(collisions.items())]
+        parser.error("several pairs write the same output; give them distinct 'output' paths "
+                     "in a manifest or rename the videos:\n" + "\n".join(lines))
+    if not pairs:
+        print("⚠️ No videos to combine")
+        return
 
-# Trim audio to match video duration if needed
-if audio.duration > video_duration:
-    audio = audio.subclipped(0, video_duration)
-    print(f"Audio trimmed to {video_duration:.2f} seconds")
+    settings = {"mux_mode": args.mux_mode, "audio_fit": not args.no_audio_fit,
+                "crossfade": args.crossfade, "target_loudness": args.target_loudness}
+    workers = max(1, min(args.jobs, len(pairs)))
+    print(f"🎬 Combining {len(pairs)} pair(s) on {workers} worker process(es)...")
 
-# Set audio to video
-print("Combining video and audio...")
-final_video = video.with_audio(audio)
+    started = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(combine_pair, pair, settings, args.force) for pair in pairs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            icon = {"skipped": "⏭️", "failed": "❌"}.get(result["status"], "✅")
+            detail = result.get("error") or f"{result['seconds']:.1f}s"
+            print(f"[{len(results)}/{len(pairs)}] {icon} {result['status']}: {result['output']} ({detail})",
+                  flush=True)
+            for fallback in result.get("fallbacks", []):
+                print(f"   ⚠️ {fallback}", flush=True)
+    summary = summarize(results, time.time() - started)
 
-# Write the final video
-print("Writing final video...")
-final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
+    print(f"\n📊 {summary['pairs']} pair(s) in {summary['elapsed_seconds']:.1f}s: "
+          f"{summary['copied']} stream copied, {summary['reencoded']} re-encoded, "
+          f"{summary['skipped']} up to date, {summary['failed']} failed")
+    print(f"   {summary['pairs_per_second']} pairs/s, {summary['realtime_factor']}x realtime, "
+          f"{summary['output_mb_per_second']} MB/s written")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "pairs": results}, f, indent=2)
+    if summary["failed"]:
+        sys.exit(1)
 
-print(f"Final video saved as: {output_path}")
 
-# Clean up
-video.close()
-audio.close()
-final_video.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
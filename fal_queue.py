@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Client for the fal request queue
+Every fal-hosted model (Hailuo, Imagen 4 Ultra, ...) is driven the same way:
+submit a payload, poll its status with exponential backoff and jitter
+(riding out 5xx responses and dropped connections), fetch the result and
+download the media it points to.
+"""
+
+import os
+import random
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+import requests
+
+from fetcher import ArtifactFetcher
+
+FAL_QUEUE_URL = os.getenv("FAL_QUEUE_URL", "https://queue.fal.run")
+
+# HTTP statuses worth retrying while polling
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Queue states that mean "keep polling"; RETRY marks a poll that hit a transient error
+PENDING_STATES = ("IN_QUEUE", "IN_PROGRESS", "RETRY")
+
+
+class FalJobError(RuntimeError):
+    """Raised when a fal queue request fails, is cancelled or misses its deadline"""
+
+
+def backoff(attempt: int, initial_interval: float, max_interval: float) -> float:
+    """Exponential backoff with equal jitter, capped at max_interval"""
+    interval = min(max_interval, initial_interval * (2 ** attempt))
+    return interval / 2 + random.uniform(0, interval / 2)
+
+
+class FalQueueClient:
+    """Submit, status and result adapters for the fal queue API"""
+
+    def __init__(self, app_id: str, api_key: Optional[str] = None, base_url: str = FAL_QUEUE_URL,
+                 session: Optional[requests.Session] = None):
+        self.base_url = base_url.rstrip("/")
+        self.app_id = app_id
+        self.session = session or requests.Session()
+        # Sent per request so a pooled session can be shared with other providers
+        self.headers = {"Authorization": f"Key {api_key or os.getenv('FAL_KEY', '')}"}
+        self.fetcher = ArtifactFetcher(self.session)
+
+    def submit_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a request for app_id with an app-specific input payload"""
+        response = self.session.post(
+            f"{self.base_url}/{self.app_id}",
+            json=payload,
+            headers=self.headers,
+            timeout=60
+        )
+        response.raise_for_status()
+        data = response.json()
+        return {
+            "request_id": data["request_id"],
+            "status_url": data["status_url"],
+            "response_url": data["response_url"],
+            "cancel_url": data.get("cancel_url")
+        }
+
+    def status(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.get(job["status_url"], headers=self.headers, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def poll(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch the status once; transient failures come back as status RETRY and count in job["retries"]"""
+        try:
+            status = self.status(job)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code not in RETRYABLE_STATUS_CODES:
+                raise
+            status = {"status": "RETRY"}
+            job["retries"] = job.get("retries", 0) + 1
+        except requests.ConnectionError:
+            status = {"status": "RETRY"}
+            job["retries"] = job.get("retries", 0) + 1
+        job["polls"] = job.get("polls", 0) + 1
+        return status
+
+    def result(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.get(job["response_url"], headers=self.headers, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def cancel(self, job: Dict[str, Any]):
+        if job.get("cancel_url"):
+            self.session.put(job["cancel_url"], headers=self.headers, timeout=30)
+
+    def download(self, url: str, dest: Path, expected_size: Optional[int] = None) -> Dict[str, Any]:
+        return self.fetcher.fetch(url, dest, expected_size=expected_size)
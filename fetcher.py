@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Streaming, resumable and verified artifact downloads
+Generated media is streamed to disk in fixed-size chunks over a pooled
+keep-alive session, hashed while it streams, and resumed with HTTP Range
+requests when a connection drops part way through.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+import requests
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_MAX_WORKERS = 4
+
+# Errors after which the partial file is kept and the download resumed
+RESUMABLE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class ArtifactVerificationError(RuntimeError):
+    """Raised when a downloaded artifact's size or hash doesn't match what was expected"""
+
+
+class ArtifactFetcher:
+    def __init__(self, session: Optional[requests.Session] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_retries: int = DEFAULT_MAX_RETRIES, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.session = session or requests.Session()
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.max_workers = max_workers
+
+    def _hash_partial(self, part_path: Path) -> "hashlib._Hash":
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                digest.update(chunk)
+        return digest
+
+    @staticmethod
+    def _range_total(response: requests.Response) -> Optional[int]:
+        """The complete size from a Content-Range header ("bytes 0-9/10" or, on 416, "bytes */10")"""
+        content_range = response.headers.get("Content-Range", "")
+        if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+            return int(content_range.rsplit("/", 1)[1])
+        return None
+
+    def fetch(self, url: str, dest: Path, expected_sha256: Optional[str] = None,
+              expected_size: Optional[int] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Download url to dest, resuming from a previous partial download if one exists
+
+        expected_size is what the caller was promised; it is checked against the size the
+        server reports and against the finished file, so neither can quietly override it.
+        """
+        dest = Path(dest)
+        part_path = dest.with_name(dest.name + ".part")
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        digest = self._hash_partial(part_path) if offset else hashlib.sha256()
+        transferred = 0
+        # Size reported by the server, kept apart from the caller's expected_size
+        total = None
+        attempt = 0
+
+        while True:
+            request_headers = dict(headers or {})
+            if offset:
+                request_headers["Range"] = f"bytes={offset}-"
+            try:
+                with self.session.get(url, headers=request_headers, stream=True, timeout=(10, 60)) as response:
+                    if response.status_code == 416 and offset:
+                        # Nothing left to send, which only means "complete" if the partial has the right size
+                        known = expected_size if expected_size is not None else self._range_total(response)
+                        if known is not None and offset == known:
+                            total = self._range_total(response)
+                            break
+                        # Longer than the artifact, or no way to tell: the partial is stale, start over
+                        attempt += 1
+                        if attempt > self.max_retries:
+                            raise ArtifactVerificationError(
+                                f"{dest.name}: server refused to resume at {offset} bytes (size {known})")
+                        print(f"⚠️ Discarding stale partial download of {dest.name} ({offset} bytes)")
+                        part_path.unlink()
+                        offset = 0
+                        digest = hashlib.sha256()
+                        continue
+                    response.raise_for_status()
+                    if offset and response.status_code != 206:
+                        # The server ignored the Range header, so start over
+                        offset = 0
+                        digest = hashlib.sha256()
+                    if response.status_code == 206:
+                        total = self._range_total(response)
+                    elif response.headers.get("Content-Length", "").isdigit():
+                        total = int(response.headers["Content-Length"])
+                    if expected_size is not None and total is not None and total != expected_size:
+                        raise ArtifactVerificationError(
+                            f"{dest.name}: server reports {total} bytes, expected {expected_size}")
+                    with open(part_path, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            f.write(chunk)
+                            digest.update(chunk)
+                            offset += len(chunk)
+                            transferred += len(chunk)
+                break
+            except (requests.HTTPError, *RESUMABLE_ERRORS) as e:
+                if isinstance(e, requests.HTTPError) and (e.response is None or e.response.status_code < 500):
+                    raise
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"⚠️ Download of {dest.name} interrupted at {offset} bytes ({e}), resuming in {delay:.1f}s")
+                time.sleep(delay)
+
+        size = part_path.stat().st_size
+        for label, wanted in (("expected", expected_size), ("server reported", total)):
+            if wanted is not None and size != wanted:
+                if size > wanted:
+                    # Too long can never be resumed into the right file
+                    part_path.unlink()
+                raise ArtifactVerificationError(f"{dest.name}: {label} {wanted} bytes, got {size}")
+        sha256 = digest.hexdigest()
+        if expected_sha256 and sha256 != expected_sha256:
+            part_path.unlink()
+            raise ArtifactVerificationError(f"{dest.name}: SHA-256 {sha256} does not match {expected_sha256}")
+        os.replace(part_path, dest)
+        return {"path": str(dest), "size": size, "sha256": sha256, "bytes_transferred": transferred,
+                "retries": attempt}
+
+    def fetch_many(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Download several artifacts in parallel; each item holds fetch() keyword arguments"""
+        def fetch_one(item: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                return self.fetch(**item)
+            except Exception as e:
+                return {"path": str(item["dest"]), "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(fetch_one, items))
+
+
+def main():
+    """Download one or more artifact URLs into a directory"""
+    parser = argparse.ArgumentParser(description='Resumable, verified artifact downloads')
+    parser.add_argument('urls', nargs='+', help='Artifact URLs to download')
+    parser.add_argument('--output-dir', default='output', help='Directory to download into')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help='Parallel downloads')
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fetcher = ArtifactFetcher(max_workers=args.workers)
+    items = [{"url": url, "dest": output_dir / (url.split("?")[0].rstrip("/").rsplit("/", 1)[-1] or "artifact")}
+             for url in args.urls]
+    failed = False
+    for result in fetcher.fetch_many(items):
+        if "error" in result:
+            failed = True
+            print(f"❌ {result['path']}: {result['error']}")
+        else:
+            print(f"✅ {result['path']} ({result['size']} bytes, sha256 {result['sha256'][:12]}...)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
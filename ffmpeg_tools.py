@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+FFmpeg helpers for combining generated media
+Probes streams and muxes a music track onto a video without decoding or
+re-encoding the video frames when the codecs allow it. When a re-encode is
+unavoidable, frames stream from a decoder process to an encoder process
+through a fixed-size buffer, so memory stays flat for any clip length.
+"""
+
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+from typing import Optional, Dict, Any, List, Iterable
+
+# Video codecs that can be copied into an .mp4 container as-is
+MP4_COPY_VIDEO_CODECS = {"h264", "hevc", "mpeg4", "av1"}
+
+# Upper bound on decoded frames held between the decoder and the encoder
+DEFAULT_FRAME_BUFFER_MB = 128
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO_RE = re.compile(r"Stream #\S+.*?: Video: (\w+).*?, (\d{2,5})x(\d{2,5})")
+_FPS_RE = re.compile(r"([\d.]+) fps")
+_AUDIO_RE = re.compile(r"Stream #\S+.*?: Audio: (\w+)")
+
+
+def get_ffmpeg_exe() -> str:
+    """Return the ffmpeg binary bundled with imageio-ffmpeg, or the one on PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        exe = shutil.which("ffmpeg")
+        if not exe:
+            raise RuntimeError("ffmpeg not found: install imageio-ffmpeg or ffmpeg")
+        return exe
+
+
+def probe_media(path: str) -> Dict[str, Any]:
+    """Read duration, codecs and frame geometry from ffmpeg's stream summary"""
+    # `ffmpeg -i` without an output exits non-zero but prints the stream info
+    proc = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-i", path],
+        capture_output=True, text=True, errors="replace"
+    )
+    info: Dict[str, Any] = {
+        "duration": None, "video_codec": None, "audio_codec": None,
+        "width": None, "height": None, "fps": None
+    }
+    match = _DURATION_RE.search(proc.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    for line in proc.stderr.splitlines():
+        video = _VIDEO_RE.search(line)
+        if video and info["video_codec"] is None:
+            info["video_codec"] = video.group(1)
+            info["width"], info["height"] = int(video.group(2)), int(video.group(3))
+            fps = _FPS_RE.search(line)
+            if fps:
+                info["fps"] = float(fps.group(1))
+        audio = _AUDIO_RE.search(line)
+        if audio and info["audio_codec"] is None:
+            info["audio_codec"] = audio.group(1)
+    return info
+
+
+def can_stream_copy(video_info: Dict[str, Any]) -> bool:
+    """Return True if the video stream can be copied into an .mp4 without re-encoding"""
+    return video_info.get("video_codec") in MP4_COPY_VIDEO_CODECS and bool(video_info.get("duration"))
+
+
+def mux_video_audio(video_path: str, audio_path: str, output_path: str,
+                    duration: Optional[float] = None, audio_bitrate: str = "192k") -> str:
+    """Copy the video stream and encode the audio alongside it, trimmed to the video length
+
+    Unlike ``-shortest``, ``-t`` keeps the full video when the music is shorter
+    than the clip, matching the moviepy behaviour.
+    """
+    command: List[str] = [
+        get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+        "-i", video_path, "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy", "-c:a", "aac", "-b:a", audio_bitrate,
+    ]
+    if duration:
+        command += ["-t", f"{duration:.3f}"]
+    command += ["-movflags", "+faststart", output_path]
+    proc = subprocess.run(command, capture_output=True, text=True, errors="replace")
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg mux failed: {proc.stderr.strip()}")
+    return output_path
+
+
+def stream_reencode(video_path: str, audio_path: Optional[str], output_path: str,
+                    video_info: Optional[Dict[str, Any]] = None, duration: Optional[float] = None,
+                    buffer_mb: float = DEFAULT_FRAME_BUFFER_MB, audio_bitrate: str = "192k",
+                    audio_pcm: Optional[Iterable[bytes]] = None, sample_rate: int = 48000,
+                    channels: int = 2) -> Dict[str, Any]:
+    """Re-encode the video with libx264 and mux the audio, streaming raw frames between two ffmpeg processes
+
+    Decoded frames pass through a bounded queue holding at most ``buffer_mb`` of
+    frames, so a slow encoder throttles the decoder instead of memory growing
+    with the clip, as it does when moviepy materializes frames and effects.
+    The audio is either a file (``audio_path``) or raw f32le chunks (``audio_pcm``,
+    e.g. from ``AudioFitter.pcm``) fed to the encoder through a second pipe.
+    """
+    if (audio_path is None) == (audio_pcm is None):
+        raise ValueError("Pass exactly one of audio_path and audio_pcm")
+    video_info = video_info or probe_media(video_path)
+    width, height = video_info.get("width"), video_info.get("height")
+    if not width or not height:
+        raise RuntimeError(f"Could not read the frame size of {video_path}")
+    fps = video_info.get("fps") or 24
+    duration = duration or video_info.get("duration")
+    frame_size = width * height * 3
+    max_frames = max(2, int(buffer_mb * 1024 * 1024 // frame_size))
+
+    ffmpeg = get_ffmpeg_exe()
+    decoder = subprocess.Popen(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", video_path, "-an",
+         "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    audio_input = ["-i", audio_path]
+    audio_fds = None
+    if audio_pcm is not None:
+        # stdin carries the frames, so the PCM gets a pipe of its own that the encoder inherits
+        audio_fds = os.pipe()
+        audio_input = ["-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", f"pipe:{audio_fds[0]}"]
+    command = [
+        ffmpeg, "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "pipe:0",
+        *audio_input, "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-b:a", audio_bitrate,
+    ]
+    if duration:
+        command += ["-t", f"{duration:.3f}"]
+    command += ["-movflags", "+faststart", output_path]
+    try:
+        encoder = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   pass_fds=audio_fds[:1] if audio_fds else ())
+    except BaseException:
+        decoder.kill()
+        decoder.wait()
+        if audio_fds:
+            os.close(audio_fds[0])
+            os.close(audio_fds[1])
+        raise
+    audio_errors: List[BaseException] = []
+    if audio_fds:
+        os.close(audio_fds[0])
+
+    frames: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_frames)
+    stop = threading.Event()
+
+    def read_frames():
+        try:
+            while not stop.is_set():
+                frame = decoder.stdout.read(frame_size)
+                if len(frame) < frame_size:
+                    break
+                frames.put(frame)
+        finally:
+            frames.put(None)
+
+    def drain(proc: subprocess.Popen) -> threading.Thread:
+        # Keep stderr from filling its pipe and stalling the process
+        thread = threading.Thread(target=lambda: setattr(proc, "error_output", proc.stderr.read()), daemon=True)
+        thread.start()
+        return thread
+
+    def write_audio(fd: int):
+        try:
+            with open(fd, "wb") as sink:
+                for data in audio_pcm:
+                    sink.write(data)
+        except BrokenPipeError:
+            # The encoder stopped reading (it reached -t or failed); its return code tells which
+            pass
+        except Exception as e:
+            # Closing the pipe early would silently truncate the audio, so surface it after the encode
+            audio_errors.append(e)
+
+    reader = threading.Thread(target=read_frames, daemon=True)
+    threads = [drain(decoder), drain(encoder)]
+    if audio_fds:
+        threads.append(threading.Thread(target=write_audio, args=(audio_fds[1],), daemon=True))
+        threads[-1].start()
+    reader.start()
+    frame_count = 0
+    finished = False
+    try:
+        while True:
+            frame = frames.get()
+            if frame is None:
+                finished = True
+                break
+            encoder.stdin.write(frame)
+            frame_count += 1
+    except BrokenPipeError:
+        # The encoder exited early (e.g. it reached -t); its return code tells us whether that is an error
+        pass
+    finally:
+        stop.set()
+        if not finished:
+            decoder.kill()
+        # Unblock the reader if it is waiting on a full queue
+        while reader.is_alive():
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                reader.join(0.05)
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+        decoder.stdout.close()
+        decoder.wait()
+        encoder.wait()
+        for thread in threads:
+            thread.join()
+
+    # A decoder we killed because the encoder stopped early is not a failure; one that exited on its own is
+    if finished and decoder.returncode != 0:
+        detail = getattr(decoder, "error_output", b"").decode(errors="replace").strip()
+        raise RuntimeError(f"ffmpeg decode failed: {detail}")
+    if encoder.returncode != 0:
+        detail = getattr(encoder, "error_output", b"").decode(errors="replace").strip()
+        raise RuntimeError(f"ffmpeg encode failed: {detail}")
+    if not frame_count:
+        raise RuntimeError(f"ffmpeg decoded no frames from {video_path}")
+    if audio_errors:
+        raise RuntimeError(f"Audio stream failed: {audio_errors[0]}")
+    return {"path": output_path, "frames": frame_count, "buffer_frames": max_frames}
@@ -9,22 +9,89 @@ import argparse
 import os
 import sys
 import time
-import requests
 import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List, Iterator
 from anthropic import Anthropic
+from media_cache import MediaCache, file_digest, DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB, DEFAULT_MAX_AGE_DAYS
+from ffmpeg_tools import probe_media, can_stream_copy, mux_video_audio, stream_reencode, DEFAULT_FRAME_BUFFER_MB
+from hailuo_jobs import HailuoClient, HailuoJobPoller, DEFAULT_DEADLINE_SECONDS, DEFAULT_INITIAL_INTERVAL
+from providers import build_session, VertexAuth, ImagenAdapter, LyriaAdapter, HailuoAdapter, FalImagenAdapter
+from routing import ProviderRouter, Route
+from metrics import stage_span, record, peak_rss_mb, write_prometheus_textfile, export_otel_spans
+from overlay import TextCompositor, OverlayStyle
+from audio_fit import AudioFitter, DEFAULT_CROSSFADE, DEFAULT_TARGET_DBFS
+from phash_index import PerceptualIndex, phash, DEFAULT_MAX_DISTANCE
+from media_server import MediaJobServer, DEFAULT_PORT
+from job_queue import JobQueue, LANES, DEFAULT_QUEUE_PATH, DEFAULT_MAX_ATTEMPTS, run_worker, run_worker_processes
+from renditions import Rendition, PRESETS, parse_renditions, encode_renditions
+from artifact_store import ArtifactStore, DEFAULT_STORE_DIR, DEFAULT_KEEP_LAST, validate_run_id
+from music_pool import MusicPool, DEFAULT_POOL_DIR
 
 # Configuration
 OUTPUT_DIR = Path("output")
 DEFAULT_IMAGE_PROMPT = "A cute fluffy cat sitting peacefully, soft lighting, adorable expression, high quality, photorealistic"
 DEFAULT_TEXT_OVERLAY = "The cat is so cute!"
 DEFAULT_MUSIC_PROMPT = "Gentle healing music for a cute cat video, soft piano melody, calming ambient sounds, peaceful and soothing atmosphere"
+STAGE_ORDER = ("image", "caption", "video", "music", "combine")
+STAGE_FILE_KEYS = {
+    "image": "image",
+    "caption": "captioned_image",
+    "video": "video",
+    "music": "music",
+    "combine": "final_video",
+}
+
+# Image routes --image-routes can choose from; the first is the primary until latency stats say otherwise
+IMAGE_ROUTES = ("imagen3", "imagen4-ultra")
+
+# Maximum number of concurrent calls per remote provider, plus local encodes
+DEFAULT_PROVIDER_LIMITS = {
+    "anthropic": 8,
+    "imagen": 2,
+    "imagen4": 2,
+    "hailuo": 4,
+    "lyria": 2,
+    "encode": 2,
+}
 
 class MediaGenerator:
-    def __init__(self):
-        self.client = Anthropic()
+    def __init__(self, limits: Optional[Dict[str, int]] = None, cache: Optional[MediaCache] = None,
+                 mux_mode: str = "auto", providers: Optional[Dict[str, Any]] = None,
+                 overlay: str = "model", compositor: Optional[TextCompositor] = None,
+                 audio_fitter: Optional[AudioFitter] = None, renditions: Optional[List[Rendition]] = None,
+                 frame_buffer_mb: float = DEFAULT_FRAME_BUFFER_MB, dedup: Optional[PerceptualIndex] = None,
+                 image_router: Optional[ProviderRouter] = None, store: Optional[ArtifactStore] = None,
+                 music_pool: Optional[MusicPool] = None):
+        # Created on first use: with direct dispatch no stage may ever need Claude
+        self._client: Optional[Anthropic] = None
+        self.client_lock = threading.Lock()
+        self.cache = cache
+        self.mux_mode = mux_mode
+        # Stages with a registered provider adapter skip the Claude round trip
+        self.providers = providers or {}
+        # "model" asks Imagen to draw the caption; "local" draws it with Pillow
+        self.overlay = overlay
+        self.compositor = compositor or TextCompositor()
+        # None keeps the raw music track, trimmed but never looped
+        self.audio_fitter = audio_fitter
+        self.renditions = renditions or []
+        self.frame_buffer_mb = frame_buffer_mb
+        # Near-duplicate images reuse an earlier video instead of a new Hailuo render
+        self.dedup = dedup
+        self.image_router = image_router
+        # Finished runs are deduplicated into the content-addressed store and linked into runs/<run_id>/
+        self.store = store
+        # Pre-generated tracks are claimed before asking Lyria for a new one
+        self.music_pool = music_pool
+        limits = {**DEFAULT_PROVIDER_LIMITS, **(limits or {})}
+        self.limits = {name: threading.BoundedSemaphore(max(1, n)) for name, n in limits.items()}
+        self.results_lock = threading.Lock()
         self.setup_output_directory()
         
     def setup_output_directory(self):
@@ -32,39 +99,107 @@ class MediaGenerator:
         OUTPUT_DIR.mkdir(exist_ok=True)
         print(f"✅ Output directory created: {OUTPUT_DIR.absolute()}")
         
+    @contextmanager
+    def provider_slot(self, name: str) -> Iterator[None]:
+        """Hold one of a provider's concurrency slots, recording the time spent waiting for it"""
+        start = time.time()
+        with self.limits[name]:
+            record("queue_seconds", time.time() - start)
+            yield
+    
+    @property
+    def client(self) -> Anthropic:
+        with self.client_lock:
+            if self._client is None:
+                self._client = Anthropic()
+            return self._client
+    
     def generate_with_claude(self, prompt: str, tools: list) -> str:
         """Generate content using Claude with specified tools"""
         try:
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4000,
-                tools=tools,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
+            with self.provider_slot("anthropic"):
+                response = self.client.messages.create(
+                    model="claude-3-sonnet-20240229",
+                    max_tokens=4000,
+                    tools=tools,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ]
+                )
+            usage = getattr(response, "usage", None)
+            if usage:
+                record("input_tokens", usage.input_tokens)
+                record("output_tokens", usage.output_tokens)
             return response.content[0].text
         except Exception as e:
             print(f"❌ Error with Claude generation: {e}")
             return ""
     
-    def generate_cat_image(self, prompt: str, text_overlay: str) -> Optional[str]:
+    def call_provider(self, name: str, *args, **kwargs) -> str:
+        """Call a provider adapter directly with known parameters"""
+        try:
+            return self.providers[name].generate(*args, **kwargs)
+        except Exception as e:
+            print(f"❌ Error with direct {name} dispatch: {e}")
+            return ""
+    
+    def cached_generation(self, stage: str, prompt: str, params: Dict[str, Any],
+                          generate: Callable[[], Optional[str]]) -> Optional[str]:
+        """Serve a stage from the media cache, or generate it and cache the result"""
+        if self.cache:
+            cached_path = self.cache.get(stage, prompt, params)
+            if cached_path:
+                record("cache_hits", 1)
+                print(f"⚡ Using cached {stage}: {cached_path}")
+                return cached_path
+        result = generate()
+        if self.cache and result:
+            self.cache.put(stage, prompt, params, result)
+        return result
+    
+    def generate_cat_image(self, prompt: str, text_overlay: Optional[str]) -> Optional[str]:
         """Generate cat image with text overlay using Imagen 3"""
-        print(f"🎨 Generating cat image with text overlay...")
+        if text_overlay:
+            print("🎨 Generating cat image with text overlay...")
+            # Create the full prompt including text overlay
+            full_prompt = f"{prompt} with the text '{text_overlay}' displayed prominently in the center of the image, beautiful typography"
+        else:
+            # Base image for local captioning: one generation serves every caption
+            print("🎨 Generating cat image...")
+            full_prompt = prompt
+        params = {"aspect_ratio": "1:1", "model": "imagen3"}
+        if self.image_router:
+            params["model"] = "+".join(route.name for route in self.image_router.routes)
         
-        # Create the full prompt including text overlay
-        full_prompt = f"{prompt} with the text '{text_overlay}' displayed prominently in the center of the image, beautiful typography"
+        def generate() -> str:
+            if self.image_router:
+                return self.image_router.call(full_prompt, aspect_ratio=params["aspect_ratio"])
+            return self.generate_imagen3(full_prompt, params["aspect_ratio"])
         
+        result = self.cached_generation("image", full_prompt, params, generate)
+        print(f"✅ Cat image generated: {result}")
+        return result
+    
+    def generate_imagen3(self, prompt: str, aspect_ratio: str, cancel: Optional[threading.Event] = None) -> str:
+        """Generate an image with Imagen 3, directly or through Claude
+
+        cancel (set by the router when another route has already won) is checked before
+        waiting for a slot and again before the request goes out; once the Imagen or
+        Claude request is in flight it can't be interrupted and runs to completion.
+        """
+        cancel = cancel or threading.Event()
+        if cancel.is_set():
+            return ""
         claude_prompt = f"""
-        Generate a cat image with text overlay using the mcp__t2i-google-imagen3__imagen_t2i tool.
+        Generate a cat image using the mcp__t2i-google-imagen3__imagen_t2i tool.
         
-        Prompt: {full_prompt}
+        Prompt: {prompt}
         
         Please use these parameters:
-        - aspect_ratio: "1:1"
+        - aspect_ratio: "{aspect_ratio}"
         - auto_download: true
         - output_directory: "./output/"
         
@@ -78,19 +213,40 @@ class MediaGenerator:
             }
         ]
         
-        result = self.generate_with_claude(claude_prompt, tools)
-        print(f"✅ Cat image generated: {result}")
-        return result
+        with self.provider_slot("imagen"):
+            # The slot may have taken a while, long enough for the other route to win
+            if cancel.is_set():
+                return ""
+            if "imagen" in self.providers:
+                return self.call_provider("imagen", prompt, aspect_ratio=aspect_ratio)
+            return self.generate_with_claude(claude_prompt, tools)
+    
+    def generate_imagen4_ultra(self, prompt: str, aspect_ratio: str, cancel: Optional[threading.Event] = None) -> str:
+        """Generate an image with Imagen 4 Ultra on the fal queue"""
+        with self.provider_slot("imagen4"):
+            return self.providers["imagen4-ultra"].generate(prompt, aspect_ratio=aspect_ratio, cancel=cancel)
+    
+    def caption_image(self, base_path: str, captions: List[str]) -> Dict[str, str]:
+        """Render captioned variants of a base image locally, decoding the base only once"""
+        print(f"🔤 Rendering {len(captions)} caption variant(s) locally...")
+        variants = self.compositor.render_captions(base_path, captions, OUTPUT_DIR)
+        print(f"✅ Captioned images rendered: {len(variants)}")
+        return variants
     
     def generate_video_from_image(self, image_path: str) -> Optional[str]:
         """Generate video from image using Hailuo i2v"""
         print(f"🎬 Generating video from image: {image_path}")
         
+        video_prompt = "A cute cat sitting peacefully, gentle movements, soft lighting, adorable and calming scene"
+        # Key on the image contents rather than its path so re-downloaded images still hit
+        image_key = file_digest(image_path) if os.path.isfile(image_path) else image_path
+        params = {"image": image_key, "prompt_optimizer": True, "model": "hailuo-02-pro"}
+        
         claude_prompt = f"""
         Generate a video from the cat image using the mcp__i2v-fal-hailuo-02-pro__hailuo_02_submit tool.
         
         Use these parameters:
-        - prompt: "A cute cat sitting peacefully, gentle movements, soft lighting, adorable and calming scene"
+        - prompt: "{video_prompt}"
         - image_url: "{image_path}"
         - prompt_optimizer: true
         
@@ -113,7 +269,14 @@ class MediaGenerator:
             }
         ]
         
-        result = self.generate_with_claude(claude_prompt, tools)
+        def generate() -> str:
+            with self.provider_slot("hailuo"):
+                if "hailuo" in self.providers:
+                    return self.call_provider("hailuo", image_path, video_prompt,
+                                              prompt_optimizer=params["prompt_optimizer"])
+                return self.generate_with_claude(claude_prompt, tools)
+        
+        result = self.cached_generation("video", video_prompt, params, generate)
         print(f"✅ Video generated: {result}")
         return result
     
@@ -121,14 +284,16 @@ class MediaGenerator:
         """Generate healing music using Lyria"""
         print(f"🎵 Generating healing music...")
         
+        params = {"style": "ambient", "tempo": "slow", "duration": 30, "model": "lyria"}
+        
         claude_prompt = f"""
         Generate healing music using the mcp__t2m-google-lyria__lyria_generate tool.
         
         Use these parameters:
         - prompt: "{prompt}"
-        - style: "ambient"
-        - tempo: "slow"
-        - duration: 30
+        - style: "{params['style']}"
+        - tempo: "{params['tempo']}"
+        - duration: {params['duration']}
         - auto_download: true
         - output_directory: "./output/"
         
@@ -142,39 +307,73 @@ class MediaGenerator:
             }
         ]
         
-        result = self.generate_with_claude(claude_prompt, tools)
+        if self.music_pool:
+            # Checked before the cache: a cached track would otherwise answer every run and the pool
+            # would never see the claim (no hit, no miss, no demand signal for its refiller)
+            pooled = self.music_pool.claim(prompt, params["style"], params["tempo"], OUTPUT_DIR)
+            if pooled:
+                record("music_pool_hits", 1)
+                print(f"🎵 Claimed a pre-generated track from the music pool: {pooled}")
+                return pooled
+        
+        def generate() -> str:
+            with self.provider_slot("lyria"):
+                if "lyria" in self.providers:
+                    return self.call_provider("lyria", prompt, style=params["style"], tempo=params["tempo"])
+                return self.generate_with_claude(claude_prompt, tools)
+        
+        result = self.cached_generation("music", prompt, params, generate)
         print(f"✅ Music generated: {result}")
         return result
     
-    def combine_video_audio(self, video_path: str, audio_path: str) -> Optional[str]:
-        """Combine video and audio using moviepy"""
+    def combine_video_audio(self, video_path: str, audio_path: str, run_id: Optional[str] = None) -> Optional[str]:
+        """Combine video and audio, copying the video stream when possible"""
         print(f"🎬 Combining video and audio...")
         
         try:
-            from moviepy import VideoFileClip, AudioFileClip
-            
-            # Load video and audio
-            video = VideoFileClip(video_path)
-            audio = AudioFileClip(audio_path)
+            # Create output filename
+            run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = OUTPUT_DIR / f"final_cat_video_{run_id}.mp4"
+            if output_path.exists():
+                # A rerun of this run_id must not rewrite a file hardlinked into the artifact store
+                output_path.unlink()
             
-            # Trim audio to match video duration
-            if audio.duration > video.duration:
-                audio = audio.subclipped(0, video.duration)
+            # Fast path: Hailuo already delivers H.264, so only the audio needs encoding
+            video_info = probe_media(video_path)
+            copy_video = self.mux_mode == "auto" and can_stream_copy(video_info)
             
-            # Combine video and audio
-            final_video = video.with_audio(audio)
+            if self.audio_fitter and video_info["duration"]:
+                # Loop short music to the video length and pipe it straight into ffmpeg
+                try:
+                    if copy_video:
+                        self.audio_fitter.mux(video_path, audio_path, str(output_path), video_info["duration"])
+                    else:
+                        with self.provider_slot("encode"):
+                            self.audio_fitter.mux(video_path, audio_path, str(output_path), video_info["duration"],
+                                                  copy_video=False, video_info=video_info,
+                                                  buffer_mb=self.frame_buffer_mb)
+                    mode = "stream copy" if copy_video else "re-encoded"
+                    print(f"✅ Final video created ({mode}, fitted audio): {output_path}")
+                    return str(output_path)
+                except RuntimeError as e:
+                    print(f"⚠️ Audio fitting failed, using the raw music track: {e}")
             
-            # Create output filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = OUTPUT_DIR / f"final_cat_video_{timestamp}.mp4"
+            if self.mux_mode == "auto":
+                if copy_video:
+                    try:
+                        mux_video_audio(video_path, audio_path, str(output_path), duration=video_info["duration"])
+                        print(f"✅ Final video created (stream copy): {output_path}")
+                        return str(output_path)
+                    except RuntimeError as e:
+                        print(f"⚠️ Stream copy failed, re-encoding instead: {e}")
+                else:
+                    print(f"⚠️ Video codec {video_info['video_codec']} can't be stream copied, re-encoding...")
             
-            # Write final video
-            final_video.write_videofile(str(output_path), codec='libx264', audio_codec='aac')
-            
-            # Cleanup
-            video.close()
-            audio.close()
-            final_video.close()
+            # Local encodes are CPU bound, so bound how many run at once
+            with self.provider_slot("encode"):
+                # Frames stream decoder -> bounded buffer -> encoder, so memory doesn't grow with the clip
+                stream_reencode(video_path, audio_path, str(output_path), video_info=video_info,
+                                buffer_mb=self.frame_buffer_mb)
             
             print(f"✅ Final video created: {output_path}")
             return str(output_path)
@@ -183,52 +382,348 @@ class MediaGenerator:
             print(f"❌ Error combining video and audio: {e}")
             return None
     
-    def generate_media_workflow(self, image_prompt: str, text_overlay: str, music_prompt: str) -> Dict[str, Any]:
+    def render_renditions(self, final_path: str, run_id: str) -> List[Dict[str, Any]]:
+        """Encode every configured platform rendition of the final video from a single decode
+
+        This is a second pass over the finished video, not part of the combine encode;
+        see the renditions module for why.
+        """
+        print(f"📐 Encoding {len(self.renditions)} rendition(s)...")
+        with self.provider_slot("encode"):
+            outputs = encode_renditions(final_path, self.renditions, OUTPUT_DIR, f"final_cat_video_{run_id}")
+        for output in outputs:
+            record("output_bytes", output["size"])
+            print(f"✅ Rendition {output['name']}: {output['path']}")
+        return outputs
+    
+    def run_stage(self, stages: Dict[str, Dict[str, Any]], name: str, func: Callable, *args,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[str]:
+        """Run a single workflow stage and record its start/end timestamps"""
+        start = time.time()
+        stages[name] = {"start": datetime.fromtimestamp(start).isoformat()}
+        if progress:
+            progress({"event": "stage_started", "stage": name})
+        result = None
+        try:
+            with stage_span(name) as span:
+                result = func(*args)
+                if result and os.path.isfile(result):
+                    record("output_bytes", os.path.getsize(result))
+            return result
+        finally:
+            end = time.time()
+            stages[name]["end"] = datetime.fromtimestamp(end).isoformat()
+            stages[name]["duration_seconds"] = round(end - start, 3)
+            stages[name]["metrics"] = span.to_dict()
+            if progress:
+                progress({"event": "stage_finished", "stage": name, "ok": bool(result),
+                          "duration_seconds": stages[name]["duration_seconds"]})
+    
+    def collect_results(self, results: Dict[str, Any], stages: Dict[str, Dict[str, Any]]):
+        """Fill generated_files and stages in workflow order from the per-stage records"""
+        with self.results_lock:
+            results["generated_files"] = {
+                STAGE_FILE_KEYS[name]: stages[name]["output"]
+                for name in STAGE_ORDER if name in stages and stages[name].get("output")
+            }
+            # Copy each record so a stage finishing on another thread can't change it mid-dump
+            results["stages"] = {name: dict(stages[name]) for name in STAGE_ORDER if name in stages}
+            # Process-wide (including ffmpeg children), so it sizes the runner rather than this run alone
+            results["peak_rss_mb"] = peak_rss_mb()
+    
+    def write_results(self, results_path: Path, results: Dict[str, Any], stages: Dict[str, Dict[str, Any]]):
+        """Atomically write the run manifest"""
+        self.collect_results(results, stages)
+        with self.results_lock:
+            tmp_path = results_path.with_suffix(".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(results, f, indent=2)
+            os.replace(tmp_path, results_path)
+    
+    def generate_media_workflow(self, image_prompt: str, text_overlay: str, music_prompt: str,
+                                run_id: Optional[str] = None, save_results: bool = True,
+                                progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                resume: Optional[Dict[str, Any]] = None,
+                                caption_variants: Optional[List[str]] = None) -> Dict[str, Any]:
         """Run the complete media generation workflow"""
         print("🚀 Starting automated media generation workflow...")
         
+        # The run ID names output files and the store's runs/<run_id>/, so it must not be a path
+        run_id = validate_run_id(run_id or datetime.now().strftime("%Y%m%d_%H%M%S"))
+        resume = resume or {}
         results = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": resume.get("timestamp", datetime.now().isoformat()),
+            "run_id": run_id,
             "image_prompt": image_prompt,
             "text_overlay": text_overlay,
             "music_prompt": music_prompt,
             "generated_files": {}
         }
+        if resume:
+            results["resumed_at"] = datetime.now().isoformat()
+        results_path = OUTPUT_DIR / f"generation_results_{run_id}.json"
+        stages: Dict[str, Dict[str, Any]] = {}
+        completed = {name: entry for name, entry in resume.get("stages", {}).items() if verify_checkpoint(entry)}
+        
+        def stage(name: str, params: Dict[str, Any], func: Callable, *args) -> Optional[str]:
+            previous = completed.get(name)
+            if previous and previous.get("params") == params:
+                print(f"⏭️ Reusing checkpointed {name}: {previous['output']}")
+                stages[name] = {**previous, "resumed": True}
+                return previous["output"]
+            
+            output = self.run_stage(stages, name, func, *args, progress=progress)
+            stages[name]["params"] = params
+            if output:
+                stages[name]["output"] = output
+                if os.path.isfile(output):
+                    stages[name]["size"] = os.path.getsize(output)
+                    stages[name]["sha256"] = file_digest(output)
+            # Checkpoint as soon as the stage finishes so a later failure can't lose it
+            if save_results:
+                self.write_results(results_path, results, stages)
+            return output
+        
+        local_overlay = self.overlay == "local" or bool(caption_variants)
+        captions = [text_overlay] + list(caption_variants or [])
+        if local_overlay:
+            results["caption_variants"] = list(caption_variants or [])
         
-        # Step 1: Generate cat image with text
-        image_path = self.generate_cat_image(image_prompt, text_overlay)
-        if image_path:
-            results["generated_files"]["image"] = image_path
+        def render_captions(base_path: str) -> Optional[str]:
+            variants = self.caption_image(base_path, captions)
+            stages["caption"]["variants"] = variants
+            return variants.get(text_overlay)
         
-        # Step 2: Generate video from image
-        if image_path:
+        def render_video(image_path: str) -> Optional[str]:
+            if not self.dedup or not os.path.isfile(image_path):
+                return self.generate_video_from_image(image_path)
+            try:
+                image_hash = phash(image_path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Cannot hash {image_path} for dedup, generating without it: {e}")
+                return self.generate_video_from_image(image_path)
+            match = self.dedup.find_video(image_hash, text_overlay)
+            if match:
+                print(f"♻️ Image is a near-duplicate of {match['image']} (distance {match['distance']}), "
+                      f"reusing its video: {match['video']}")
+                record("cache_hits", 1)
+                stages["video"]["dedup"] = {"image": match["image"], "distance": match["distance"]}
+                return match["video"]
             video_path = self.generate_video_from_image(image_path)
             if video_path:
-                results["generated_files"]["video"] = video_path
+                self.dedup.add(image_hash, image_path, video_path, image_prompt, text_overlay)
+            return video_path
+        
+        def image_video_chain():
+            # Step 1: Generate cat image with text
+            if local_overlay:
+                # Generate the image without text and draw every caption locally
+                base_path = stage("image", {"image_prompt": image_prompt, "text_overlay": None},
+                                  self.generate_cat_image, image_prompt, None)
+                image_path = None
+                if base_path:
+                    image_path = stage("caption", {"image": base_path, "captions": captions,
+                                                  "style": self.compositor.style.to_dict()},
+                                       render_captions, base_path)
+            else:
+                image_path = stage("image", {"image_prompt": image_prompt, "text_overlay": text_overlay},
+                                   self.generate_cat_image, image_prompt, text_overlay)
+            
+            # Step 2: Generate video from image
+            video_path = None
+            if image_path:
+                video_path = stage("video", {"image": image_path}, render_video, image_path)
+            return image_path, video_path
         
         # Step 3: Generate healing music
-        music_path = self.generate_music(music_prompt)
-        if music_path:
-            results["generated_files"]["music"] = music_path
+        # Music does not depend on the image or the video, so it runs alongside
+        # the image -> video chain and the workflow takes max(image + video, music).
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            chain_future = executor.submit(image_video_chain)
+            music_future = executor.submit(stage, "music", {"music_prompt": music_prompt},
+                                           self.generate_music, music_prompt)
+            image_path, video_path = chain_future.result()
+            music_path = music_future.result()
         
         # Step 4: Combine video and audio
-        if results["generated_files"].get("video") and results["generated_files"].get("music"):
-            final_video_path = self.combine_video_audio(
-                results["generated_files"]["video"],
-                results["generated_files"]["music"]
+        def combine() -> Optional[str]:
+            final_path = self.combine_video_audio(video_path, music_path, run_id)
+            if final_path and self.renditions:
+                try:
+                    stages["combine"]["renditions"] = self.render_renditions(final_path, run_id)
+                except RuntimeError as e:
+                    print(f"❌ Error encoding renditions: {e}")
+            return final_path
+        
+        if video_path and music_path:
+            combine_params: Dict[str, Any] = {"video": video_path, "music": music_path}
+            if self.renditions:
+                combine_params["renditions"] = [rendition.to_dict() for rendition in self.renditions]
+            stage("combine", combine_params, combine)
+        
+        self.collect_results(results, stages)
+        
+        if save_results:
+            if self.store:
+                results["artifact_dir"] = str(self.store.run_dir / run_id)
+            # Save results to JSON
+            self.write_results(results_path, results, stages)
+            self.store_run(run_id, results, stages, results_path)
+            
+            print(f"✅ Workflow completed! Results saved to: {results_path}")
+        return results
+    
+    def store_run(self, run_id: str, results: Dict[str, Any], stages: Dict[str, Dict[str, Any]], results_path: Path):
+        """Add every file the run produced, including caption variants and renditions, to the artifact store"""
+        if not self.store:
+            return
+        files = list(results["generated_files"].values())
+        files += stages.get("caption", {}).get("variants", {}).values()
+        files += [rendition["path"] for rendition in stages.get("combine", {}).get("renditions", [])]
+        try:
+            self.store.add_run(run_id, files, str(results_path))
+        except (OSError, sqlite3.Error) as e:
+            # The run's outputs are all still in OUTPUT_DIR; only the deduplicated copy is missing
+            print(f"⚠️ Could not add run {run_id} to the artifact store: {e}")
+    
+    def run_batch(self, jobs: List[Dict[str, Any]], workers: int = 4) -> Dict[str, Any]:
+        """Run many workflow jobs through a bounded worker pool and save one consolidated results file"""
+        batch_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        total = len(jobs)
+        print(f"🚀 Starting batch {batch_id}: {total} jobs on {workers} workers...")
+        
+        batch = {
+            "batch_id": batch_id,
+            "started": datetime.now().isoformat(),
+            "jobs": [None] * total
+        }
+        started_at = time.time()
+        done = 0
+        done_lock = threading.Lock()
+        
+        def run_job(index: int, job: Dict[str, Any]) -> Dict[str, Any]:
+            job_id = str(job.get("id") or f"job{index:04d}")
+            
+            def progress(event: Dict[str, Any]):
+                status = "✅" if event.get("ok", True) else "❌"
+                if event["event"] == "stage_started":
+                    print(f"  [{job_id}] ▶️ {event['stage']}", flush=True)
+                else:
+                    print(f"  [{job_id}] {status} {event['stage']} ({event['duration_seconds']:.1f}s)", flush=True)
+            
+            results = self.generate_media_workflow(
+                job.get("image_prompt", DEFAULT_IMAGE_PROMPT),
+                job.get("text_overlay", DEFAULT_TEXT_OVERLAY),
+                job.get("music_prompt", DEFAULT_MUSIC_PROMPT),
+                run_id=f"{batch_id}_{job_id}",
+                progress=progress,
+                caption_variants=job.get("caption_variants")
             )
-            if final_video_path:
-                results["generated_files"]["final_video"] = final_video_path
+            results["id"] = job_id
+            return results
         
-        # Save results to JSON
-        results_path = OUTPUT_DIR / f"generation_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(run_job, index, job): index for index, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results = future.result()
+                    ok = "final_video" in results["generated_files"]
+                except Exception as e:
+                    results = {"id": str(jobs[index].get("id") or f"job{index:04d}"), "error": str(e)}
+                    ok = False
+                batch["jobs"][index] = results
+                with done_lock:
+                    done += 1
+                    elapsed = time.time() - started_at
+                    print(f"[{done}/{total}] {'✅' if ok else '❌'} {results['id']} "
+                          f"({done / elapsed:.2f} jobs/s)", flush=True)
+        
+        elapsed = time.time() - started_at
+        completed = sum(1 for job in batch["jobs"] if "final_video" in job.get("generated_files", {}))
+        batch["finished"] = datetime.now().isoformat()
+        batch["summary"] = {
+            "total": total,
+            "completed": completed,
+            "failed": total - completed,
+            "elapsed_seconds": round(elapsed, 3),
+            "jobs_per_second": round(total / elapsed, 4) if elapsed else None,
+            "peak_rss_mb": peak_rss_mb()
+        }
+        
+        results_path = OUTPUT_DIR / f"batch_results_{batch_id}.json"
         with open(results_path, 'w') as f:
-            json.dump(results, f, indent=2)
+            json.dump(batch, f, indent=2)
         
-        print(f"✅ Workflow completed! Results saved to: {results_path}")
-        return results
+        print(f"✅ Batch completed! {completed}/{total} jobs succeeded. Results saved to: {results_path}")
+        return batch
+
+def verify_checkpoint(entry: Dict[str, Any]) -> bool:
+    """Check that a checkpointed stage output still exists and is intact"""
+    output = entry.get("output")
+    if not output or not entry.get("sha256") or not os.path.isfile(output):
+        return False
+    if os.path.getsize(output) != entry.get("size"):
+        return False
+    return file_digest(output) == entry["sha256"]
 
-def main():
+def load_run_manifest(run_id: str) -> Dict[str, Any]:
+    """Load the generation_results_<run_id>.json manifest of an earlier run"""
+    with open(OUTPUT_DIR / f"generation_results_{run_id}.json") as f:
+        return json.load(f)
+
+def load_batch_jobs(path: str) -> List[Dict[str, Any]]:
+    """Load batch jobs from a JSONL file, one prompt set per line"""
+    jobs = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                jobs.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from e
+    return jobs
+
+def run_queued_job(generator: MediaGenerator, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one job claimed from the durable queue; a retry resumes from the previous attempt's checkpoints"""
+    payload = job["payload"]
+    run_id = f"queue_{job['id']}"
+    try:
+        manifest = load_run_manifest(run_id)
+    except FileNotFoundError:
+        manifest = None
+    results = generator.generate_media_workflow(
+        payload.get("image_prompt", DEFAULT_IMAGE_PROMPT),
+        payload.get("text_overlay", DEFAULT_TEXT_OVERLAY),
+        payload.get("music_prompt", DEFAULT_MUSIC_PROMPT),
+        run_id=run_id,
+        resume=manifest,
+        caption_variants=payload.get("caption_variants")
+    )
+    if "final_video" not in results["generated_files"]:
+        raise RuntimeError(f"Run {run_id} did not produce a final video")
+    return {"run_id": run_id, "generated_files": results["generated_files"]}
+
+def run_id_arg(value: str) -> str:
+    """argparse type for run IDs"""
+    try:
+        return validate_run_id(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def collect_store_garbage(generator: MediaGenerator, args: argparse.Namespace):
+    """Apply the --store-max-* retention policies once the run's outputs are stored"""
+    if not generator.store or (args.store_max_size_mb is None and args.store_max_age_days is None):
+        return
+    summary = generator.store.gc(args.store_max_size_mb, args.store_max_age_days, keep_last=DEFAULT_KEEP_LAST)
+    if summary["runs_removed"]:
+        print(f"🧹 Removed {summary['runs_removed']} old run(s) from the artifact store, "
+              f"freed {summary['bytes_freed'] / 1024 / 1024:.1f} MB")
+
+def main(argv: Optional[List[str]] = None):
     """Main function to run the media generation workflow"""
     parser = argparse.ArgumentParser(description='Automated Media Generation with Claude Code SDK')
     parser.add_argument('--image-prompt', default=DEFAULT_IMAGE_PROMPT,
@@ -239,15 +734,132 @@ def main():
                       help='Prompt for music generation')
     parser.add_argument('--output-dir', default='output',
                       help='Output directory for generated files')
+    parser.add_argument('--overlay', choices=['model', 'local'], default='model',
+                      help='model: ask Imagen to draw the text; local: draw it onto a text-free image with Pillow')
+    parser.add_argument('--caption-variants', nargs='+', metavar='CAPTION',
+                      help='Extra captions rendered locally from the same base image (implies --overlay local)')
+    parser.add_argument('--font', help='TrueType font for local text overlays')
+    parser.add_argument('--fallback-font',
+                      help='Font for captions the main font has no glyphs for, e.g. a Noto Sans CJK .ttc')
+    parser.add_argument('--text-position', choices=['top', 'center', 'bottom'], default='center',
+                      help='Where local text overlays are placed')
+    parser.add_argument('--no-audio-fit', action='store_true',
+                      help='Only trim the music; do not loop, fade or normalize it to the video length')
+    parser.add_argument('--crossfade', type=float, default=DEFAULT_CROSSFADE,
+                      help='Crossfade in seconds when looping short music (default: %(default)s)')
+    parser.add_argument('--target-loudness', type=float, default=DEFAULT_TARGET_DBFS,
+                      help='Music RMS level in dBFS (default: %(default)s)')
+    parser.add_argument('--renditions', nargs='+', metavar='SPEC',
+                      help=f'Extra platform encodes of the final video: a preset ({", ".join(PRESETS)}) '
+                           'or [name=]W:H@WIDTHxHEIGHT:BITRATE, e.g. tiktok=9:16@1080x1920:6M')
+    parser.add_argument('--frame-buffer-mb', type=float, default=DEFAULT_FRAME_BUFFER_MB,
+                      help='Memory ceiling for decoded frames buffered during a re-encode (default: %(default)s)')
+    parser.add_argument('--no-dedup', action='store_true',
+                      help='Render a video even when the image nearly matches one already rendered')
+    parser.add_argument('--dedup-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                      help='Max perceptual-hash distance (of 64 bits) for a near-duplicate (default: %(default)s)')
+    parser.add_argument('--resume', metavar='RUN_ID', type=run_id_arg,
+                      help='Resume an earlier run, skipping stages whose checkpointed outputs are intact')
+    parser.add_argument('--batch', metavar='JOBS_JSONL',
+                      help='Run every job in a JSONL file (image_prompt/text_overlay/music_prompt/id per line)')
+    parser.add_argument('--workers', type=int, default=4,
+                      help='Number of batch (or --serve) jobs to run concurrently')
+    parser.add_argument('--serve', nargs='?', const=f'127.0.0.1:{DEFAULT_PORT}', metavar='[HOST:]PORT',
+                      help=f'Keep a warm generator running and accept jobs over HTTP (default: 127.0.0.1:{DEFAULT_PORT})')
+    parser.add_argument('--socket', metavar='PATH',
+                      help='Serve the job API on a Unix socket instead of a TCP port')
+    parser.add_argument('--enqueue', action='store_true',
+                      help='Add this job to the durable job queue instead of running it')
+    parser.add_argument('--lane', choices=list(LANES), default='adhoc',
+                      help='Queue priority lane; earlier lanes are claimed first (default: %(default)s)')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                      help='Attempts before a queued job is dead-lettered (default: %(default)s)')
+    parser.add_argument('--queue-worker', action='store_true',
+                      help='Claim and run jobs from the durable job queue')
+    parser.add_argument('--processes', type=int, default=1,
+                      help='Queue worker processes to run (default: %(default)s)')
+    parser.add_argument('--drain', action='store_true',
+                      help='Queue workers exit once no job is runnable')
+    parser.add_argument('--queue-db', default=DEFAULT_QUEUE_PATH,
+                      help='Path to the SQLite job queue (default: %(default)s)')
+    for provider in DEFAULT_PROVIDER_LIMITS:
+        parser.add_argument(f'--{provider}-limit', type=int, default=DEFAULT_PROVIDER_LIMITS[provider],
+                          help=f'Maximum concurrent {provider} calls (default: {DEFAULT_PROVIDER_LIMITS[provider]})')
+    parser.add_argument('--mux-mode', choices=['auto', 'reencode'], default='auto',
+                      help='auto: copy the video stream when codecs allow; reencode: always re-encode with libx264')
+    parser.add_argument('--image-routes', default='imagen3',
+                      help=f'Comma-separated image providers to route between ({", ".join(IMAGE_ROUTES)}); '
+                           'with more than one, slow requests are hedged and failed ones fail over')
+    parser.add_argument('--hedge-after', type=float,
+                      help='Seconds before hedging an image request (default: the route\'s rolling p95 latency)')
+    parser.add_argument('--dispatch', choices=['claude', 'direct'], default='claude',
+                      help='claude: ask Claude to call each MCP tool; direct: call Imagen/Hailuo/Lyria APIs directly')
+    parser.add_argument('--poll-video', action='store_true',
+                      help='Submit and poll Hailuo jobs on the fal queue directly instead of via Claude')
+    parser.add_argument('--video-deadline', type=float, default=DEFAULT_DEADLINE_SECONDS,
+                      help='Seconds to wait for a Hailuo render before cancelling it')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_INITIAL_INTERVAL,
+                      help='Initial Hailuo status polling interval in seconds (backs off exponentially)')
+    parser.add_argument('--reattach-jobs', action='store_true',
+                      help='Finish Hailuo jobs left in flight by a crashed run, then exit')
+    parser.add_argument('--metrics-textfile', metavar='PATH',
+                      help='Write per-stage metrics in Prometheus textfile collector format')
+    parser.add_argument('--otel', action='store_true',
+                      help='Export per-stage spans through the configured OpenTelemetry tracer')
+    parser.add_argument('--music-pool', nargs='?', const='', metavar='DIR',
+                      help='Claim music from a pre-generated pool (see music_pool.py) before calling Lyria '
+                           f'(default DIR: <output-dir>/{DEFAULT_POOL_DIR})')
+    parser.add_argument('--run-id', type=run_id_arg,
+                      help='Name for this run\'s outputs and artifact directory (default: a timestamp)')
+    parser.add_argument('--no-store', action='store_true',
+                      help='Do not add run outputs to the content-addressed artifact store')
+    parser.add_argument('--store-max-size-mb', type=float,
+                      help='After the run, garbage-collect the oldest stored runs above this total size')
+    parser.add_argument('--store-max-age-days', type=float,
+                      help='After the run, garbage-collect stored runs older than this')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Disable the generated media cache')
+    parser.add_argument('--refresh', action='store_true',
+                      help='Ignore cached media and regenerate, updating the cache')
+    parser.add_argument('--cache-max-size-mb', type=float, default=DEFAULT_MAX_SIZE_MB,
+                      help='Evict least recently used cache entries above this size')
+    parser.add_argument('--cache-max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                      help='Evict cache entries older than this')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    
+    try:
+        renditions = parse_renditions(args.renditions or [])
+    except ValueError as e:
+        parser.error(str(e))
+    image_routes = [name.strip() for name in args.image_routes.split(",") if name.strip()]
+    unknown_routes = [name for name in image_routes if name not in IMAGE_ROUTES]
+    if unknown_routes or not image_routes:
+        parser.error(f"--image-routes must list some of: {', '.join(IMAGE_ROUTES)}")
     
     # Update output directory if specified
     global OUTPUT_DIR
     OUTPUT_DIR = Path(args.output_dir)
     
+    if args.enqueue:
+        job_id = JobQueue(args.queue_db).enqueue("media", {
+            "image_prompt": args.image_prompt,
+            "text_overlay": args.text_overlay,
+            "music_prompt": args.music_prompt,
+            "caption_variants": args.caption_variants,
+        }, lane=args.lane, max_attempts=args.max_attempts)
+        print(f"📥 Enqueued job {job_id} in lane {args.lane} ({args.queue_db})")
+        return
+    
+    if args.queue_worker and args.processes > 1:
+        # Each process builds its own generator; encodes then spread across CPU cores
+        child_argv = list(sys.argv[1:] if argv is None else argv) + ["--processes", "1"]
+        run_worker_processes(args.processes, main, (child_argv,))
+        return
+    
     # Check required environment variables
-    required_env_vars = ['ANTHROPIC_API_KEY', 'FAL_KEY']
+    # ANTHROPIC_API_KEY is checked below, once it's known whether any stage still goes through Claude
+    required_env_vars = ['FAL_KEY']
     # For Google credentials, check either file path or JSON content
     google_creds_file = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
     google_creds_json = os.getenv('GOOGLE_APPLICATION_CREDENTIALS_JSON')
@@ -262,12 +874,128 @@ def main():
         sys.exit(1)
     
     # Initialize generator and run workflow
-    generator = MediaGenerator()
-    results = generator.generate_media_workflow(
-        args.image_prompt,
-        args.text_overlay,
-        args.music_prompt
+    limits = {provider: getattr(args, f"{provider}_limit") for provider in DEFAULT_PROVIDER_LIMITS}
+    cache = MediaCache(
+        OUTPUT_DIR / DEFAULT_CACHE_DIR,
+        max_size_mb=args.cache_max_size_mb,
+        max_age_days=args.cache_max_age_days,
+        enabled=not args.no_cache,
+        refresh=args.refresh
     )
+    providers = {}
+    video_poller = None
+    session = build_session(pool_size=sum(limits.values()))
+    if args.dispatch == 'direct' or args.poll_video or args.reattach_jobs:
+        video_poller = HailuoJobPoller(
+            HailuoClient(session=session),
+            OUTPUT_DIR,
+            deadline=args.video_deadline,
+            initial_interval=args.poll_interval
+        )
+        providers["hailuo"] = HailuoAdapter(video_poller)
+    if args.dispatch == 'direct':
+        vertex_auth = VertexAuth()
+        providers["imagen"] = ImagenAdapter(session, vertex_auth, OUTPUT_DIR)
+        providers["lyria"] = LyriaAdapter(session, vertex_auth, OUTPUT_DIR)
+    if "imagen4-ultra" in image_routes:
+        providers["imagen4-ultra"] = FalImagenAdapter(session, OUTPUT_DIR)
+    claude_stages = [stage for stage, used in (("imagen", "imagen3" in image_routes), ("hailuo", True),
+                                               ("lyria", True)) if used and stage not in providers]
+    if claude_stages and not args.reattach_jobs and not os.getenv('ANTHROPIC_API_KEY'):
+        print(f"❌ Missing required environment variables: ANTHROPIC_API_KEY "
+              f"({', '.join(claude_stages)} go through Claude; use --dispatch direct to call them directly)")
+        sys.exit(1)
+    music_pool = None
+    if args.music_pool is not None:
+        music_pool = MusicPool(Path(args.music_pool) if args.music_pool else OUTPUT_DIR / DEFAULT_POOL_DIR)
+    compositor = TextCompositor(OverlayStyle(font_path=args.font, position=args.text_position,
+                                            fallback_font_path=args.fallback_font))
+    dedup = None if args.no_dedup else PerceptualIndex(OUTPUT_DIR / "phash_index.jsonl", args.dedup_distance)
+    audio_fitter = None if args.no_audio_fit else AudioFitter(crossfade=args.crossfade,
+                                                              target_dbfs=args.target_loudness)
+    generator = MediaGenerator(limits=limits, cache=cache, mux_mode=args.mux_mode, providers=providers,
+                               overlay=args.overlay, compositor=compositor, audio_fitter=audio_fitter,
+                               renditions=renditions, frame_buffer_mb=args.frame_buffer_mb, dedup=dedup,
+                               store=None if args.no_store else ArtifactStore(OUTPUT_DIR / DEFAULT_STORE_DIR,
+                                                                                protected_dirs=[cache.root]),
+                               music_pool=music_pool)
+    if image_routes != ["imagen3"]:
+        route_calls = {"imagen3": generator.generate_imagen3, "imagen4-ultra": generator.generate_imagen4_ultra}
+        generator.image_router = ProviderRouter(
+            "image",
+            [Route(name, route_calls[name]) for name in image_routes],
+            hedge_after=args.hedge_after,
+            stats_path=OUTPUT_DIR / "routing_stats.json"
+        )
+    
+    if args.reattach_jobs:
+        outputs = video_poller.reattach_all()
+        print(f"🔁 Reattached to {len(outputs)} in-flight Hailuo jobs")
+        for request_id, output in outputs.items():
+            status = "❌" if isinstance(output, Exception) else "✅"
+            print(f"  {status} {request_id}: {output}")
+        return
+    
+    if args.queue_worker:
+        run_worker(JobQueue(args.queue_db), ["media"], lambda job: run_queued_job(generator, job),
+                   exit_when_empty=args.drain)
+        return
+    
+    if args.serve or args.socket:
+        host, _, port = (args.serve or "").rpartition(":")
+        server = MediaJobServer(generator, defaults={
+            "image_prompt": args.image_prompt,
+            "text_overlay": args.text_overlay,
+            "music_prompt": args.music_prompt,
+            "caption_variants": args.caption_variants,
+        }, workers=args.workers)
+        server.serve(host=host or "127.0.0.1", port=int(port or DEFAULT_PORT), socket_path=args.socket)
+        return
+    
+    if args.batch:
+        batch = generator.run_batch(load_batch_jobs(args.batch), workers=args.workers)
+        runs = [job for job in batch["jobs"] if "stages" in job]
+        if args.metrics_textfile:
+            write_prometheus_textfile(args.metrics_textfile, runs)
+        if args.otel:
+            for results in runs:
+                export_otel_spans(results)
+        collect_store_garbage(generator, args)
+        if batch["summary"]["failed"]:
+            sys.exit(1)
+        return
+    
+    if args.resume:
+        try:
+            manifest = load_run_manifest(args.resume)
+        except FileNotFoundError:
+            print(f"❌ No results manifest found for run {args.resume} in {OUTPUT_DIR}")
+            sys.exit(1)
+        if "caption_variants" in manifest:
+            # The original run captioned locally; keep doing so to reuse its base image
+            generator.overlay = "local"
+        results = generator.generate_media_workflow(
+            manifest["image_prompt"],
+            manifest["text_overlay"],
+            manifest["music_prompt"],
+            run_id=args.resume,
+            resume=manifest,
+            caption_variants=manifest.get("caption_variants")
+        )
+    else:
+        results = generator.generate_media_workflow(
+            args.image_prompt,
+            args.text_overlay,
+            args.music_prompt,
+            run_id=args.run_id,
+            caption_variants=args.caption_variants
+        )
+    
+    if args.metrics_textfile:
+        write_prometheus_textfile(args.metrics_textfile, [results])
+    if args.otel:
+        export_otel_spans(results)
+    collect_store_garbage(generator, args)
     
     print("\n🎉 Media generation completed successfully!")
     print(f"📁 Generated files: {len(results['generated_files'])}")
@@ -4,147 +4,335 @@ Automated Protein Media Generation Workflow
 Generates protein product images with text, converts to video, adds music, and combines all media.
 """
 
+import argparse
 import os
 import sys
 import time
-import requests
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+from overlay import TextCompositor
+from audio_fit import AudioFitter
+from ffmpeg_tools import probe_media, can_stream_copy
+from hailuo_jobs import HailuoClient, HailuoJobPoller
+from providers import build_session, VertexAuth, LyriaAdapter, HailuoAdapter, FalImagenAdapter
+from music_pool import MusicPool
+from job_queue import JobQueue, LANES, DEFAULT_QUEUE_PATH, DEFAULT_MAX_ATTEMPTS, run_worker, run_worker_processes
+
+DEFAULT_IMAGE_PROMPT = "High quality protein powder and supplements, professional product photography, clean white background, various protein containers including powder jars, protein bars, and shaker bottles, vibrant and appetizing presentation, studio lighting, commercial food photography style"
+DEFAULT_TEXT_OVERLAY = "Protein is good"
+
+def build_providers(output_dir):
+    """Create the Imagen4 Ultra, Hailuo and Lyria clients once, sharing one pooled HTTP session"""
+    session = build_session()
+    return {
+        "imagen4-ultra": FalImagenAdapter(session, output_dir),
+        "hailuo": HailuoAdapter(HailuoJobPoller(HailuoClient(session=session), output_dir)),
+        "lyria": LyriaAdapter(session, VertexAuth(), output_dir),
+    }
+
+def prune_runs(output_dir, max_age_days):
+    """Delete the files of runs older than max_age_days, as listed in their manifests in output_dir
+
+    Only files inside output_dir are removed, so a manifest can never point the
+    cleanup at anything else in the checkout. Returns the number of files deleted.
+    """
+    output_dir = Path(output_dir).resolve()
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for manifest_path in sorted(output_dir.glob("protein_results_*.json")):
+        if manifest_path.stat().st_mtime >= cutoff:
+            continue
+        try:
+            with open(manifest_path) as f:
+                files = json.load(f).get("files") or {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping unreadable manifest {manifest_path}: {e}")
+            continue
+        for path in files.values():
+            target = Path(path).resolve()
+            if output_dir in target.parents and target.is_file():
+                target.unlink()
+                removed += 1
+        manifest_path.unlink()
+        removed += 1
+    return removed
+
 class MediaGenerator:
-    def __init__(self):
-        self.base_dir = Path.cwd()
+    def __init__(self, output_dir=None, providers=None, image_prompt=DEFAULT_IMAGE_PROMPT,
+                 text_overlay=DEFAULT_TEXT_OVERLAY, dry_run=False, music_pool=None):
+        self.base_dir = Path(output_dir) if output_dir else Path.cwd()
+        self.base_dir.mkdir(parents=True, exist_ok=True)
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
+        # Runs in the same process can start within the same second, so filenames get a suffix too
+        self.run_id = f"{self.timestamp}_{uuid.uuid4().hex[:6]}"
+        self.image_prompt = image_prompt
+        self.text_overlay = text_overlay
+        # Dry runs only log what each stage would do
+        self.dry_run = dry_run
+        self.providers = providers if providers is not None or dry_run else build_providers(self.base_dir)
+        self.stages = {}
+        # Pre-generated tracks are claimed before asking Lyria for a new one
+        self.music_pool = music_pool
+
     def log(self, message):
         """Log messages with timestamp"""
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
-        
+
+    def timed(self, stage, func, *args):
+        """Run one stage and record how long it took"""
+        start = time.time()
+        result = func(*args)
+        self.stages[stage] = {"output": result, "duration_seconds": round(time.time() - start, 3)}
+        return result
+
     def generate_protein_image(self):
         """Generate protein product image using Imagen4 Ultra"""
         self.log("Starting protein image generation...")
-        
-        # This would use MCP tools in actual implementation
-        # For demonstration, we'll create a placeholder workflow
-        prompt = "High quality protein powder and supplements, professional product photography, clean white background, various protein containers including powder jars, protein bars, and shaker bottles, vibrant and appetizing presentation, studio lighting, commercial food photography style"
-        
+
+        prompt = self.image_prompt
+
         self.log(f"Image generation prompt: {prompt}")
-        
-        # In actual implementation, this would call the MCP imagen4_ultra tools
-        # For now, we'll simulate the process
-        image_filename = f"protein_image_{self.timestamp}.png"
-        self.log(f"Generated image would be saved as: {image_filename}")
-        
+
+        if self.dry_run:
+            image_filename = str(self.base_dir / f"protein_image_{self.run_id}.png")
+            self.log(f"Generated image would be saved as: {image_filename}")
+            return image_filename
+
+        image_filename = self.providers["imagen4-ultra"].generate(prompt, aspect_ratio="1:1")
+        self.log(f"Generated image saved as: {image_filename}")
+
         return image_filename
-    
+
     def add_text_to_image(self, image_path):
-        """Add 'Protein is good' text to the image using Kontext"""
+        """Add the overlay text to the image with the local text compositor"""
         self.log("Adding text to image...")
-        
-        prompt = 'Add the text "Protein is good" in the center of the image with bold, professional typography that complements the product photography style'
-        
-        self.log(f"Text addition prompt: {prompt}")
-        
-        # In actual implementation, this would call the MCP kontext tools
-        text_image_filename = f"protein_with_text_{self.timestamp}.jpg"
-        self.log(f"Text-enhanced image would be saved as: {text_image_filename}")
-        
+
+        text_image_filename = str(self.base_dir / f"protein_with_text_{self.run_id}.jpg")
+        if self.dry_run:
+            self.log(f"Text-enhanced image would be saved as: {text_image_filename}")
+            return text_image_filename
+        if not image_path or not os.path.isfile(image_path):
+            raise FileNotFoundError(f"Image step produced no file to add text to: {image_path!r}")
+
+        # Drawn locally instead of a Kontext edit: no extra model call, and the
+        # text always comes out exactly as written
+        TextCompositor().render_file(image_path, self.text_overlay, text_image_filename)
+        self.log(f"Text-enhanced image saved as: {text_image_filename}")
+
         return text_image_filename
-    
+
     def create_video_from_image(self, image_path):
         """Convert image to video using Hailuo i2v"""
         self.log("Converting image to video...")
-        
+
         prompt = "Transform this protein product image into a dynamic video with smooth camera movement, gentle product rotation, and professional lighting effects"
-        
+
         self.log(f"Video generation prompt: {prompt}")
-        
-        # In actual implementation, this would call the MCP hailuo_02 tools
-        video_filename = f"protein_video_{self.timestamp}.mp4"
-        self.log(f"Generated video would be saved as: {video_filename}")
-        
+
+        if self.dry_run:
+            video_filename = str(self.base_dir / f"protein_video_{self.run_id}.mp4")
+            self.log(f"Generated video would be saved as: {video_filename}")
+            return video_filename
+
+        video_filename = self.providers["hailuo"].generate(image_path, prompt)
+        self.log(f"Generated video saved as: {video_filename}")
+
         return video_filename
-    
+
     def generate_background_music(self):
         """Generate background music using Lyria"""
         self.log("Generating background music...")
-        
+
         prompt = "Cheerful instrumental melody with light percussion"
         style = "folk"
         tempo = "medium"
         duration = 10
-        
+
         self.log(f"Music generation - Prompt: {prompt}, Style: {style}, Tempo: {tempo}, Duration: {duration}s")
-        
-        # In actual implementation, this would call the MCP lyria tools
-        music_filename = f"protein_music_{self.timestamp}.wav"
-        self.log(f"Generated music would be saved as: {music_filename}")
-        
+
+        if self.dry_run:
+            music_filename = str(self.base_dir / f"protein_music_{self.run_id}.wav")
+            self.log(f"Generated music would be saved as: {music_filename}")
+            return music_filename
+
+        if self.music_pool:
+            music_filename = self.music_pool.claim(prompt, style, tempo, self.base_dir)
+            if music_filename:
+                self.log(f"Claimed pre-generated music from the pool: {music_filename}")
+                return music_filename
+
+        music_filename = self.providers["lyria"].generate(prompt, style, tempo)
+        self.log(f"Generated music saved as: {music_filename}")
+
         return music_filename
-    
+
     def combine_video_and_music(self, video_path, music_path):
         """Combine video and music using ffmpeg"""
         self.log("Combining video and music...")
-        
-        output_filename = f"final_protein_video_with_music_{self.timestamp}.mp4"
-        
-        # FFmpeg command for combining video and audio
-        ffmpeg_command = f"ffmpeg -i {video_path} -i {music_path} -c:v copy -c:a aac -shortest {output_filename}"
-        
-        self.log(f"FFmpeg command: {ffmpeg_command}")
-        
-        # In actual implementation, this would execute the command
-        # os.system(ffmpeg_command)
-        
+
+        output_filename = str(self.base_dir / f"final_protein_video_with_music_{self.run_id}.mp4")
+
+        if self.dry_run:
+            self.log(f"Final video would be saved as: {output_filename}")
+            return output_filename
+        for kind, path in (("video", video_path), ("music", music_path)):
+            if not path or not os.path.isfile(path):
+                raise FileNotFoundError(f"The {kind} step produced no file to combine: {path!r}")
+
+        # The 10s music clip is looped with crossfades to cover the whole video
+        # instead of cutting the soundtrack short with -shortest
+        video_info = probe_media(video_path)
+        AudioFitter().mux(video_path, music_path, output_filename, video_info["duration"],
+                          copy_video=can_stream_copy(video_info))
+
         self.log(f"Final video created: {output_filename}")
-        
+
         return output_filename
-    
-    def run_workflow(self):
+
+    def image_to_video(self):
+        """Steps 1-3: image, text overlay and video depend on each other, so they run in order"""
+        image_path = self.timed("image", self.generate_protein_image)
+        text_image_path = self.timed("text_image", self.add_text_to_image, image_path)
+        return self.timed("video", self.create_video_from_image, text_image_path)
+
+    def write_manifest(self, manifest_path=None):
+        """Save every artifact path so later steps read them instead of searching the checkout"""
+        manifest_path = Path(manifest_path or self.base_dir / f"protein_results_{self.run_id}.json")
+        files = {stage: entry["output"] for stage, entry in self.stages.items() if entry.get("output")}
+        final_video = files.get("final_video")
+        manifest = {
+            "timestamp": self.timestamp,
+            "run_id": self.run_id,
+            "image_prompt": self.image_prompt,
+            "text_overlay": self.text_overlay,
+            "files": files,
+            "stages": self.stages,
+            "final_video_size": os.path.getsize(final_video) if final_video and os.path.isfile(final_video) else None,
+        }
+        tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+        self.log(f"Manifest saved to: {manifest_path}")
+        return manifest
+
+    def run_workflow(self, manifest_path=None):
         """Execute the complete media generation workflow"""
         self.log("=== Starting Protein Media Generation Workflow ===")
-        
+
         try:
-            # Step 1: Generate protein image
-            image_path = self.generate_protein_image()
-            
-            # Step 2: Add text to image
-            text_image_path = self.add_text_to_image(image_path)
-            
-            # Step 3: Convert image to video
-            video_path = self.create_video_from_image(text_image_path)
-            
-            # Step 4: Generate background music
-            music_path = self.generate_background_music()
-            
+            # Step 4 (music) needs nothing from steps 1-3, so it runs alongside them
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                chain_future = executor.submit(self.image_to_video)
+                music_future = executor.submit(self.timed, "music", self.generate_background_music)
+                video_path = chain_future.result()
+                music_path = music_future.result()
+
             # Step 5: Combine video and music
-            final_video_path = self.combine_video_and_music(video_path, music_path)
-            
+            final_video_path = self.timed("final_video", self.combine_video_and_music, video_path, music_path)
+
+            self.write_manifest(manifest_path)
             self.log("=== Workflow completed successfully! ===")
             self.log(f"Final output: {final_video_path}")
-            
+
             return final_video_path
-            
+
         except Exception as e:
             self.log(f"Error in workflow: {str(e)}")
-            sys.exit(1)
+            self.write_manifest(manifest_path)
+            # Re-raised, not sys.exit(1), so queue workers record the real error
+            raise
 
-def main():
+def main(argv=None):
     """Main function to run the media generation workflow"""
-    generator = MediaGenerator()
-    final_video = generator.run_workflow()
-    
+    parser = argparse.ArgumentParser(description='Automated Protein Media Generation')
+    parser.add_argument('--image-prompt', default=DEFAULT_IMAGE_PROMPT,
+                      help='Prompt for the protein product image')
+    parser.add_argument('--text-overlay', default=DEFAULT_TEXT_OVERLAY,
+                      help='Text to overlay on the image')
+    parser.add_argument('--output-dir', default='.',
+                      help='Directory for generated files')
+    parser.add_argument('--manifest', metavar='PATH',
+                      help='Where to write the JSON manifest of generated files '
+                           '(default: protein_results_<run id>.json in the output directory)')
+    parser.add_argument('--prune-days', type=float, metavar='DAYS',
+                      help='Instead of generating, delete the files of runs older than DAYS, '
+                           'as listed in their manifests in the output directory')
+    parser.add_argument('--music-pool', metavar='DIR',
+                      help='Claim music from this pre-generated pool (see music_pool.py) before calling Lyria')
+    parser.add_argument('--dry-run', action='store_true',
+                      help='Log what each stage would do without calling any provider')
+    parser.add_argument('--enqueue', action='store_true',
+                      help='Add a protein workflow job to the durable job queue instead of running it')
+    parser.add_argument('--lane', choices=list(LANES), default='adhoc',
+                      help='Queue priority lane; earlier lanes are claimed first (default: %(default)s)')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                      help='Attempts before a queued job is dead-lettered (default: %(default)s)')
+    parser.add_argument('--queue-worker', action='store_true',
+                      help='Claim and run protein jobs from the durable job queue')
+    parser.add_argument('--processes', type=int, default=1,
+                      help='Queue worker processes to run (default: %(default)s)')
+    parser.add_argument('--drain', action='store_true',
+                      help='Queue workers exit once no job is runnable')
+    parser.add_argument('--queue-db', default=DEFAULT_QUEUE_PATH,
+                      help='Path to the SQLite job queue (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.prune_days is not None:
+        removed = prune_runs(args.output_dir, args.prune_days)
+        print(f"🧹 Removed {removed} file(s) from runs older than {args.prune_days:g} days in {args.output_dir}")
+        return
+
+    if args.enqueue:
+        job_id = JobQueue(args.queue_db).enqueue("protein", {
+            "image_prompt": args.image_prompt,
+            "text_overlay": args.text_overlay,
+        }, lane=args.lane, max_attempts=args.max_attempts)
+        print(f"📥 Enqueued protein job {job_id} in lane {args.lane} ({args.queue_db})")
+        return
+
+    if args.queue_worker:
+        if args.processes > 1:
+            child_argv = list(sys.argv[1:] if argv is None else argv) + ["--processes", "1"]
+            run_worker_processes(args.processes, main, (child_argv,))
+            return
+
+        # Clients are built once per worker process and reused by every job it runs
+        providers = None if args.dry_run else build_providers(Path(args.output_dir))
+        music_pool = MusicPool(Path(args.music_pool)) if args.music_pool else None
+
+        def run_queued_job(job):
+            """Run one protein workflow claimed from the durable job queue"""
+            # A fresh generator per job gives every run its own timestamped filenames
+            generator = MediaGenerator(args.output_dir, providers, dry_run=args.dry_run, music_pool=music_pool,
+                                       image_prompt=job["payload"].get("image_prompt", DEFAULT_IMAGE_PROMPT),
+                                       text_overlay=job["payload"].get("text_overlay", DEFAULT_TEXT_OVERLAY))
+            final_video = generator.run_workflow()
+            return {"final_video": final_video,
+                    "files": {stage: entry["output"] for stage, entry in generator.stages.items()}}
+
+        run_worker(JobQueue(args.queue_db), ["protein"], run_queued_job, exit_when_empty=args.drain)
+        return
+
+    generator = MediaGenerator(args.output_dir, image_prompt=args.image_prompt, text_overlay=args.text_overlay,
+                               dry_run=args.dry_run,
+                               music_pool=MusicPool(Path(args.music_pool)) if args.music_pool else None)
+    try:
+        final_video = generator.run_workflow(args.manifest)
+    except Exception:
+        sys.exit(1)
+
     print(f"✅ Media generation completed successfully!")
     print(f"📹 Final video: {final_video}")
-    
+
     # Print file information
     print("\n📁 Generated files:")
-    print(f"   - Protein image: protein_image_{generator.timestamp}.png")
-    print(f"   - Text-enhanced image: protein_with_text_{generator.timestamp}.jpg")
-    print(f"   - Video: protein_video_{generator.timestamp}.mp4")
-    print(f"   - Music: protein_music_{generator.timestamp}.wav")
-    print(f"   - Final video: final_protein_video_with_music_{generator.timestamp}.mp4")
+    for stage, entry in generator.stages.items():
+        print(f"   - {stage}: {entry['output']}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
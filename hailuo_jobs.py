@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Async job-polling engine for Hailuo image-to-video renders on the fal queue
+Jobs are submitted, polled with exponential backoff and jitter (see
+fal_queue), and their results downloaded by a single background event loop,
+so many renders can be in flight at once. Job IDs are persisted so a crashed
+run can reattach.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+import requests
+
+from fal_queue import FalQueueClient, FalJobError, FAL_QUEUE_URL, PENDING_STATES, backoff
+from media_cache import file_lock
+from metrics import record
+
+HAILUO_APP_ID = "fal-ai/minimax/hailuo-02/pro/image-to-video"
+DEFAULT_DEADLINE_SECONDS = 900.0
+DEFAULT_INITIAL_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 30.0
+JOB_STORE_FILENAME = "hailuo_jobs.json"
+
+
+class HailuoJobError(FalJobError):
+    """Raised when a Hailuo job fails, is cancelled or misses its deadline"""
+
+
+def to_image_url(image_path: str) -> str:
+    """Pass URLs through and inline local files as data URIs"""
+    if image_path.startswith(("http://", "https://", "data:")):
+        return image_path
+    mime_type = mimetypes.guess_type(image_path)[0] or "image/png"
+    with open(image_path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("ascii")
+    return f"data:{mime_type};base64,{encoded}"
+
+
+def job_input_key(image_path: str, prompt: str, prompt_optimizer: bool) -> str:
+    """Identify a render by its inputs so a rerun can find the job it already submitted"""
+    digest = hashlib.sha256()
+    if os.path.isfile(image_path):
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    else:
+        digest.update(image_path.encode("utf-8"))
+    digest.update(json.dumps([prompt, prompt_optimizer]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class HailuoClient(FalQueueClient):
+    """fal queue client for the Hailuo image-to-video app"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = FAL_QUEUE_URL,
+                 app_id: str = HAILUO_APP_ID, session: Optional[requests.Session] = None):
+        super().__init__(app_id, api_key=api_key, base_url=base_url, session=session)
+
+    def submit(self, image_path: str, prompt: str, prompt_optimizer: bool = True) -> Dict[str, Any]:
+        return self.submit_payload(
+            {"prompt": prompt, "image_url": to_image_url(image_path), "prompt_optimizer": prompt_optimizer}
+        )
+
+
+class JobStore:
+    """JSON file of submitted jobs, keyed by request ID, shared by every worker using the output directory"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.lock = threading.Lock()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._reload()
+
+    def _reload(self):
+        # Other processes rewrite the file, so read it fresh rather than trusting memory
+        if self.path.exists():
+            with open(self.path) as f:
+                self.jobs = json.load(f)
+
+    def save(self, job: Dict[str, Any]):
+        with self.lock, file_lock(self.lock_path):
+            # Merge into the current file so concurrent workers don't drop each other's jobs
+            self._reload()
+            self.jobs[job["request_id"]] = job
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.jobs, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def find(self, input_key: str) -> Optional[Dict[str, Any]]:
+        """Return the newest job for these inputs that is still in flight or has a usable output"""
+        with self.lock:
+            self._reload()
+            for job in sorted(self.jobs.values(), key=lambda j: j["submitted_at"], reverse=True):
+                if job.get("input_key") != input_key:
+                    continue
+                if job["state"] == "submitted":
+                    return dict(job)
+                if job["state"] == "completed" and os.path.isfile(job.get("output", "")):
+                    return dict(job)
+            return None
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            self._reload()
+            return [dict(job) for job in self.jobs.values() if job["state"] == "submitted"]
+
+
+class HailuoJobPoller:
+    """Runs every Hailuo job on one background event loop"""
+
+    def __init__(self, client: HailuoClient, output_dir: Path,
+                 deadline: float = DEFAULT_DEADLINE_SECONDS,
+                 initial_interval: float = DEFAULT_INITIAL_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_INTERVAL):
+        self.client = client
+        self.output_dir = Path(output_dir)
+        self.store = JobStore(self.output_dir / JOB_STORE_FILENAME)
+        self.deadline = deadline
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        # One render per input_key at a time, with how many coroutines hold or await each lock;
+        # only touched on the loop thread, so plain dicts are enough
+        self.render_locks: Dict[str, asyncio.Lock] = {}
+        self.render_lock_users: Dict[str, int] = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="hailuo-poller", daemon=True)
+        self.thread.start()
+
+    def backoff(self, attempt: int) -> float:
+        return backoff(attempt, self.initial_interval, self.max_interval)
+
+    async def wait(self, job: Dict[str, Any], deadline: Optional[float] = None) -> str:
+        """Poll a submitted job until it completes, then download its video"""
+        deadline_at = job["submitted_at"] + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            status = await asyncio.to_thread(self.client.poll, job)
+            if status["status"] == "COMPLETED":
+                break
+            if status["status"] not in PENDING_STATES:
+                job["state"] = "failed"
+                job["error"] = f"unexpected status {status['status']}"
+                await asyncio.to_thread(self.store.save, job)
+                raise HailuoJobError(f"Hailuo job {job['request_id']} failed: {status}")
+            if time.time() > deadline_at:
+                await asyncio.to_thread(self.client.cancel, job)
+                job["state"] = "failed"
+                job["error"] = "deadline exceeded"
+                await asyncio.to_thread(self.store.save, job)
+                raise HailuoJobError(f"Hailuo job {job['request_id']} exceeded its deadline")
+            await asyncio.sleep(min(self.backoff(attempt), max(0.0, deadline_at - time.time())))
+            attempt += 1
+
+        result = await asyncio.to_thread(self.client.result, job)
+        video = result["video"]
+        dest = self.output_dir / f"hailuo_02_{job['request_id']}.mp4"
+        download = await asyncio.to_thread(self.client.download, video["url"], dest, video.get("file_size"))
+        job["output"] = download["path"]
+        job["sha256"] = download["sha256"]
+        job["bytes"] = download["bytes_transferred"]
+        job["retries"] = job.get("retries", 0) + download["retries"]
+        job["state"] = "completed"
+        job["completed_at"] = time.time()
+        await asyncio.to_thread(self.store.save, job)
+        return job["output"]
+
+    async def render(self, image_path: str, prompt: str, prompt_optimizer: bool = True,
+                     deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Submit a render, or reattach to one already submitted for the same inputs
+
+        Renders of the same inputs are serialized: without that, two callers could both
+        miss in the store and submit (and pay for) the same job twice. The later caller
+        waits and then finds the earlier one's completed job.
+        """
+        input_key = await asyncio.to_thread(job_input_key, image_path, prompt, prompt_optimizer)
+        lock = self.render_locks.setdefault(input_key, asyncio.Lock())
+        self.render_lock_users[input_key] = self.render_lock_users.get(input_key, 0) + 1
+        try:
+            async with lock:
+                # The store reads and rewrites a shared JSON file under a file lock, so keep it off the loop
+                job = await asyncio.to_thread(self.store.find, input_key)
+                if job and job["state"] == "completed":
+                    return job
+                if job:
+                    print(f"🔁 Reattaching to in-flight Hailuo job {job['request_id']}")
+                else:
+                    job = await asyncio.to_thread(self.client.submit, image_path, prompt, prompt_optimizer)
+                    job.update({"input_key": input_key, "image": image_path, "state": "submitted",
+                                "submitted_at": time.time()})
+                    await asyncio.to_thread(self.store.save, job)
+                await self.wait(job, deadline)
+                return job
+        finally:
+            self.render_lock_users[input_key] -= 1
+            if not self.render_lock_users[input_key]:
+                del self.render_lock_users[input_key]
+                del self.render_locks[input_key]
+
+    def render_sync(self, image_path: str, prompt: str, prompt_optimizer: bool = True,
+                    deadline: Optional[float] = None) -> str:
+        """Run a render on the shared loop and block the calling thread until it finishes"""
+        started_at = time.time()
+        future = asyncio.run_coroutine_threadsafe(
+            self.render(image_path, prompt, prompt_optimizer, deadline), self.loop
+        )
+        job = future.result()
+        # Record on the calling thread, where the stage's metrics span is current
+        if job.get("completed_at", 0) >= started_at:
+            record("poll_seconds", job["completed_at"] - job["submitted_at"])
+            record("retries", job.get("retries", 0))
+            record("bytes_downloaded", job.get("bytes", 0))
+        return job["output"]
+
+    def reattach_all(self) -> Dict[str, Any]:
+        """Finish every job left in flight by a previous run"""
+        async def wait_all():
+            jobs = await asyncio.to_thread(self.store.pending)
+            outputs = await asyncio.gather(*(self.wait(job) for job in jobs), return_exceptions=True)
+            return {job["request_id"]: output for job, output in zip(jobs, outputs)}
+
+        return asyncio.run_coroutine_threadsafe(wait_all(), self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
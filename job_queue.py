@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Durable local job queue for the media workflows
+Jobs live in a SQLite database in WAL mode, so any number of processes can
+enqueue and work concurrently. Workers claim a job under a time-limited lease
+and keep renewing it while the job runs; when a worker dies its lease simply
+expires and another worker picks the job up. Failed jobs are retried with
+exponential backoff and moved to a dead-letter state after max_attempts.
+Lanes are priorities: ad-hoc requests are claimed before scheduled bulk work.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Callable, Iterator
+
+DEFAULT_QUEUE_PATH = os.getenv("MEDIA_QUEUE_DB", "job_queue.sqlite3")
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 2.0
+RETRY_BASE_SECONDS = 30
+
+# Lower runs first
+LANES = {"urgent": 0, "adhoc": 10, "scheduled": 20, "bulk": 30}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, kind, priority, available_at, id);
+"""
+
+
+class JobQueue:
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        self.path = str(path)
+        with self.connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per operation keeps this safe across threads and processes
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Take the write lock up front so concurrent claims can't pick the same job"""
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], lane: str = "adhoc",
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}', expected one of {', '.join(LANES)}")
+        now = time.time()
+        with self.connect() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (kind, lane, priority, payload, max_attempts, available_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, lane, LANES[lane], json.dumps(payload), max_attempts, now, now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_id: str, kinds: List[str], lanes: Optional[List[str]] = None,
+              lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Lease the most urgent runnable job of the given kinds, or return None"""
+        now = time.time()
+        kind_marks = ",".join("?" * len(kinds))
+        lane_filter = f" AND lane IN ({','.join('?' * len(lanes))})" if lanes else ""
+        with self.transaction() as db:
+            # Jobs whose worker died on the last allowed attempt are dead-lettered, not retried again
+            db.execute(
+                "UPDATE jobs SET status = 'dead', last_error = 'lease expired', lease_owner = NULL, updated_at = ?"
+                " WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            row = db.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({kind_marks}){lane_filter}"
+                " AND ((status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?))"
+                " ORDER BY priority, available_at, id LIMIT 1",
+                (*kinds, *(lanes or []), now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?,"
+                " updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row["id"])
+            )
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend a lease; False means the lease was lost to another worker"""
+        now = time.time()
+        with self.connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: Dict[str, Any]):
+        with self.connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE id = ? AND lease_owner = ?",
+                (json.dumps(result), time.time(), job_id, worker_id)
+            )
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> str:
+        """Schedule a retry with exponential backoff, or dead-letter the job; returns the new status"""
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?",
+                             (job_id, worker_id)).fetchone()
+            if row is None:
+                return "lost"
+            status = "dead" if row["attempts"] >= row["max_attempts"] else "queued"
+            retry_at = now + RETRY_BASE_SECONDS * 2 ** (row["attempts"] - 1)
+            db.execute(
+                "UPDATE jobs SET status = ?, last_error = ?, available_at = ?, lease_owner = NULL,"
+                " lease_expires = NULL, updated_at = ? WHERE id = ?",
+                (status, error, retry_at, now, job_id)
+            )
+        return status
+
+    def requeue_dead(self, job_ids: Optional[List[int]] = None) -> int:
+        """Give dead-lettered jobs a fresh set of attempts"""
+        now = time.time()
+        query = "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? WHERE status = 'dead'"
+        params: List[Any] = [now, now]
+        if job_ids:
+            query += f" AND id IN ({','.join('?' * len(job_ids))})"
+            params += job_ids
+        with self.connect() as db:
+            return db.execute(query, params).rowcount
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Job counts by status and lane"""
+        with self.connect() as db:
+            rows = db.execute("SELECT status, lane, COUNT(*) AS count FROM jobs GROUP BY status, lane").fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            counts.setdefault(row["status"], {})[row["lane"]] = row["count"]
+        return counts
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self.connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(queue: JobQueue, kinds: List[str], handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+               lanes: Optional[List[str]] = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+               poll_interval: float = DEFAULT_POLL_INTERVAL, exit_when_empty: bool = False) -> int:
+    """Claim and run jobs until interrupted (or the queue is drained); returns the number of jobs run
+
+    handler receives the claimed job and returns a JSON-serializable result,
+    or raises to fail the attempt.
+    """
+    worker_id = worker_name()
+    processed = 0
+    print(f"👷 Worker {worker_id} waiting for {'/'.join(kinds)} jobs...", flush=True)
+    while True:
+        job = queue.claim(worker_id, kinds, lanes=lanes, lease_seconds=lease_seconds)
+        if job is None:
+            if exit_when_empty:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        print(f"▶️ Job {job['id']} ({job['kind']}, {job['lane']}, attempt {job['attempts']}/{job['max_attempts']})",
+              flush=True)
+        stop = threading.Event()
+
+        def keep_leased():
+            while not stop.wait(lease_seconds / 3):
+                if not queue.heartbeat(job["id"], worker_id, lease_seconds):
+                    print(f"⚠️ Lost the lease on job {job['id']}", flush=True)
+                    return
+
+        heartbeat = threading.Thread(target=keep_leased, daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(job)
+        except BaseException as e:
+            stop.set()
+            if isinstance(e, KeyboardInterrupt):
+                # Leave the job leased; it is retried once the lease expires
+                raise
+            # A handler that exits on error hides the cause behind SystemExit; record the cause instead
+            cause = e.__context__ if isinstance(e, SystemExit) and e.__context__ else e
+            status = queue.fail(job["id"], worker_id, f"{type(cause).__name__}: {cause}")
+            print(f"❌ Job {job['id']} failed ({cause}), now {status}", flush=True)
+        else:
+            stop.set()
+            queue.complete(job["id"], worker_id, result)
+            print(f"✅ Job {job['id']} done", flush=True)
+        heartbeat.join()
+        processed += 1
+
+
+def run_worker_processes(processes: int, target: Callable, args: tuple):
+    """Run target(*args) in several worker processes and wait for them"""
+    # spawn, not fork: workers hold threads, sockets and SQLite handles that don't survive a fork
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=target, args=args, name=f"media-worker-{i}") for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+
+
+def main():
+    """Inspect and manage the job queue"""
+    parser = argparse.ArgumentParser(description='Media job queue administration')
+    parser.add_argument('--queue-db', default=DEFAULT_QUEUE_PATH, help='Path to the SQLite job queue')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='Show job counts by status and lane')
+    show = commands.add_parser('show', help='Show one job')
+    show.add_argument('job_id', type=int)
+    requeue = commands.add_parser('requeue', help='Retry dead-lettered jobs')
+    requeue.add_argument('job_ids', type=int, nargs='*', help='Jobs to requeue (default: all dead jobs)')
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue_db)
+    if args.command == 'stats':
+        print(json.dumps(queue.stats(), indent=2))
+    elif args.command == 'show':
+        print(json.dumps(queue.get(args.job_id), indent=2))
+    elif args.command == 'requeue':
+        print(f"🔁 Requeued {queue.requeue_dead(args.job_ids)} job(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for generated media
+Images, videos and music are stored under a hash of the stage name, the
+normalized prompt and the generation parameters, so repeated requests are
+served from disk instead of calling the remote model again.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator
+
+DEFAULT_CACHE_DIR = "cache"
+DEFAULT_MAX_SIZE_MB = 5 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+INDEX_FILENAME = "index.json"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so cosmetic prompt differences share a cache entry"""
+    return " ".join(prompt.split())
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock shared by every process that uses the same lock file"""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): callers' thread locks still serialize this process
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def cache_key(stage: str, prompt: str, params: Dict[str, Any]) -> str:
+    """Hash the stage, normalized prompt and parameters into a cache key"""
+    payload = json.dumps(
+        {"stage": stage, "prompt": normalize_prompt(prompt), "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MediaCache:
+    def __init__(self, root: Path, max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS, enabled: bool = True, refresh: bool = False):
+        self.root = Path(root)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.enabled = enabled
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.index: Dict[str, Dict[str, Any]] = {}
+        if self.enabled:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self.index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        index_path = self.root / INDEX_FILENAME
+        if not index_path.exists():
+            return {}
+        try:
+            with open(index_path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Ignoring unreadable cache index {index_path}: {e}")
+            return {}
+
+    def _save_index(self):
+        index_path = self.root / INDEX_FILENAME
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, index_path)
+
+    @contextmanager
+    def locked_index(self) -> Iterator[None]:
+        """Reload the index under a cross-process lock, let the caller change it, then save it"""
+        # Workers sharing the cache directory would otherwise overwrite each other's entries
+        with self.lock, file_lock(self.root / f"{INDEX_FILENAME}.lock"):
+            self.index = self._load_index()
+            yield
+            self._save_index()
+
+    def _remove(self, key: str):
+        entry = self.index.pop(key, None)
+        if entry:
+            try:
+                (self.root / entry["file"]).unlink()
+            except FileNotFoundError:
+                pass
+
+    def get(self, stage: str, prompt: str, params: Dict[str, Any]) -> Optional[str]:
+        """Return the cached artifact path for this request, or None on a miss"""
+        if not self.enabled or self.refresh:
+            return None
+        key = cache_key(stage, prompt, params)
+        with self.locked_index():
+            entry = self.index.get(key)
+            if not entry:
+                return None
+            path = self.root / entry["file"]
+            if not path.is_file() or time.time() - entry["created"] > self.max_age_seconds:
+                self._remove(key)
+                return None
+            entry["last_access"] = time.time()
+            return str(path)
+
+    def put(self, stage: str, prompt: str, params: Dict[str, Any], path: str) -> Optional[str]:
+        """Store a generated artifact and return its cached path"""
+        if not self.enabled or not path or not os.path.isfile(path):
+            return None
+        key = cache_key(stage, prompt, params)
+        cached_path = self.root / f"{key}{Path(path).suffix}"
+        with self.locked_index():
+            self._remove(key)
+            tmp_path = cached_path.with_name(cached_path.name + ".tmp")
+            try:
+                # Hardlink when possible so caching a large video costs no copy
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copy2(path, tmp_path)
+            os.replace(tmp_path, cached_path)
+            now = time.time()
+            self.index[key] = {
+                "file": cached_path.name,
+                "stage": stage,
+                "size": cached_path.stat().st_size,
+                "created": now,
+                "last_access": now,
+            }
+            self._evict()
+        return str(cached_path)
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under the size limit"""
+        now = time.time()
+        for key in [k for k, e in self.index.items() if now - e["created"] > self.max_age_seconds]:
+            self._remove(key)
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["last_access"]):
+            if total <= self.max_size_bytes:
+                break
+            total -= self.index[key]["size"]
+            self._remove(key)
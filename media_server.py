@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Local job API for a warm MediaGenerator
+Keeps one generator (clients, HTTP pools, provider pollers, caches and the
+ffmpeg binary) alive across jobs and accepts work over HTTP on a local port
+or a Unix socket, so a job starts without interpreter or client startup and
+its progress streams back as each stage starts and finishes.
+
+Endpoints:
+    POST /jobs                 submit {"image_prompt", "text_overlay", "music_prompt", "caption_variants", "id"}
+    GET  /jobs                 list jobs
+    GET  /jobs/<id>            job status and stage events so far
+    GET  /jobs/<id>/result     workflow results once the job has finished
+    GET  /jobs/<id>/events     server-sent events, from the first event until the job finishes
+    GET  /health               liveness
+"""
+
+import json
+import os
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List
+
+from artifact_store import validate_run_id
+from ffmpeg_tools import get_ffmpeg_exe
+
+DEFAULT_PORT = 8765
+# Finished jobs are forgotten after this long, or sooner once more than DEFAULT_MAX_FINISHED pile up
+DEFAULT_FINISHED_TTL = 3600.0
+DEFAULT_MAX_FINISHED = 200
+
+# Fields a submitted job may set; everything else falls back to the server defaults
+JOB_FIELDS = ("image_prompt", "text_overlay", "music_prompt", "caption_variants")
+PROMPT_FIELDS = ("image_prompt", "text_overlay", "music_prompt")
+
+
+class JobConflictError(ValueError):
+    """Raised when a job ID is submitted while a job with that ID is still running"""
+
+
+class Job:
+    def __init__(self, job_id: str, params: Dict[str, Any]):
+        self.id = job_id
+        self.params = params
+        self.status = "queued"
+        self.submitted = datetime.now().isoformat()
+        self.events: List[Dict[str, Any]] = []
+        self.results: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        self.changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def emit(self, event: Dict[str, Any], status: Optional[str] = None):
+        # Status and event change together, so a listener never sees "done" without the final event
+        with self.changed:
+            if status:
+                self.status = status
+                if self.done:
+                    self.finished_at = time.time()
+            self.events.append({**event, "time": datetime.now().isoformat()})
+            self.changed.notify_all()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.changed:
+            return {"id": self.id, "status": self.status, "submitted": self.submitted,
+                    "params": self.params, "events": list(self.events), "error": self.error}
+
+
+class MediaJobServer:
+    def __init__(self, generator, defaults: Dict[str, Any], workers: int = 2,
+                 finished_ttl: float = DEFAULT_FINISHED_TTL, max_finished: int = DEFAULT_MAX_FINISHED):
+        self.generator = generator
+        self.defaults = defaults
+        self.jobs: Dict[str, Job] = {}
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-job")
+        # Resolve ffmpeg now rather than inside the first job
+        get_ffmpeg_exe()
+
+    def submit(self, body: Dict[str, Any]) -> Job:
+        """Queue a job; raises ValueError for a malformed job, JobConflictError for a running ID"""
+        if not isinstance(body, dict):
+            raise ValueError("A job must be a JSON object")
+        params = {field: body.get(field, self.defaults.get(field)) for field in JOB_FIELDS}
+        for field in PROMPT_FIELDS:
+            if params[field] is not None and not isinstance(params[field], str):
+                raise ValueError(f"{field} must be a string")
+        variants = params["caption_variants"]
+        if variants is not None and not (isinstance(variants, list)
+                                         and all(isinstance(caption, str) for caption in variants)):
+            raise ValueError("caption_variants must be a list of strings")
+        if body.get("id") is not None and not isinstance(body["id"], str):
+            raise ValueError("id must be a string")
+        # The ID names the job's output files and store directory, so it can't be a path
+        job_id = body.get("id") or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        validate_run_id(job_id)
+        job = Job(job_id, params)
+        with self.lock:
+            if job_id in self.jobs and not self.jobs[job_id].done:
+                raise JobConflictError(f"Job {job_id} is already running")
+            self._evict()
+            self.jobs[job_id] = job
+        job.emit({"event": "job_queued"})
+        self.executor.submit(self.run, job)
+        return job
+
+    def run(self, job: Job):
+        job.emit({"event": "job_started"}, status="running")
+        try:
+            job.results = self.generator.generate_media_workflow(
+                job.params["image_prompt"],
+                job.params["text_overlay"],
+                job.params["music_prompt"],
+                run_id=job.id,
+                progress=job.emit,
+                caption_variants=job.params.get("caption_variants")
+            )
+            ok = "final_video" in job.results.get("generated_files", {})
+        except Exception as e:
+            job.error = str(e)
+            ok = False
+        status = "succeeded" if ok else "failed"
+        job.emit({"event": "job_finished", "status": status}, status=status)
+
+    def _evict(self):
+        """Drop finished jobs past their TTL, then the oldest beyond max_finished; call with self.lock held"""
+        cutoff = time.time() - self.finished_ttl
+        finished = sorted((job for job in self.jobs.values() if job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        excess = len(finished) - self.max_finished
+        for index, job in enumerate(finished):
+            if index < excess or job.finished_at < cutoff:
+                del self.jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            self._evict()
+            jobs = list(self.jobs.values())
+        return [{"id": job.id, "status": job.status, "submitted": job.submitted} for job in jobs]
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def address_string(self) -> str:
+                # Unix socket peers have no host/port
+                return self.client_address[0] if self.client_address else "unix"
+
+            def send_json(self, body: Any, status: int = 200):
+                payload = json.dumps(body, indent=2).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_error_json(self, status: int, message: str):
+                self.send_json({"error": message}, status)
+
+            def read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def stream_events(self, job: Job):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                sent = 0
+                while True:
+                    with job.changed:
+                        if sent == len(job.events) and not job.done:
+                            job.changed.wait(timeout=15)
+                        pending = job.events[sent:]
+                        finished = job.done
+                    try:
+                        if not pending and not finished:
+                            # Keep idle connections alive through proxies during long renders
+                            self.wfile.write(b": keep-alive\n\n")
+                        for event in pending:
+                            self.wfile.write(f"event: {event['event']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The client went away; the job keeps running and can be polled later
+                        return
+                    sent += len(pending)
+                    if finished:
+                        return
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/jobs":
+                    return self.send_error_json(404, f"No such endpoint: {self.path}")
+                try:
+                    job = server.submit(self.read_json())
+                except json.JSONDecodeError as e:
+                    return self.send_error_json(400, f"Invalid JSON: {e}")
+                except JobConflictError as e:
+                    return self.send_error_json(409, str(e))
+                except ValueError as e:
+                    return self.send_error_json(400, str(e))
+                self.send_json({"id": job.id, "status": job.status,
+                                "status_url": f"/jobs/{job.id}", "events_url": f"/jobs/{job.id}/events",
+                                "result_url": f"/jobs/{job.id}/result"}, 202)
+
+            def do_GET(self):
+                parts = [part for part in self.path.split("?")[0].split("/") if part]
+                if parts == ["health"]:
+                    return self.send_json({"status": "ok"})
+                if parts == ["jobs"]:
+                    return self.send_json(server.list())
+                if len(parts) < 2 or parts[0] != "jobs":
+                    return self.send_error_json(404, f"No such endpoint: {self.path}")
+                job = server.get(parts[1])
+                if job is None:
+                    return self.send_error_json(404, f"No such job: {parts[1]}")
+                if len(parts) == 2:
+                    return self.send_json(job.to_dict())
+                if parts[2:] == ["events"]:
+                    return self.stream_events(job)
+                if parts[2:] == ["result"]:
+                    if not job.done:
+                        return self.send_error_json(409, f"Job {job.id} is {job.status}")
+                    return self.send_json(job.results or {"error": job.error})
+                self.send_error_json(404, f"No such endpoint: {self.path}")
+
+        return Handler
+
+    def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, socket_path: Optional[str] = None):
+        """Serve the job API until interrupted"""
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            httpd = ThreadingUnixHTTPServer(socket_path, self.handler())
+            where = f"unix:{socket_path}"
+        else:
+            httpd = ThreadingHTTPServer((host, port), self.handler())
+            where = f"http://{host}:{httpd.server_port}"
+        httpd.daemon_threads = True
+        print(f"🛰️ Media job server listening on {where}", flush=True)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\n🛑 Shutting down media job server...")
+        finally:
+            httpd.server_close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Per-stage performance metrics for the media generation workflow
+Each stage runs inside a span that collects wall, queue and poll time, bytes
+downloaded, output size, Anthropic token usage and retry counts. Spans end up
+in the results JSON and can be exported to a Prometheus textfile or to
+OpenTelemetry.
+"""
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator
+
+SPAN_FIELDS = (
+    "queue_seconds",
+    "poll_seconds",
+    "bytes_downloaded",
+    "output_bytes",
+    "input_tokens",
+    "output_tokens",
+    "retries",
+    "cache_hits",
+    "hedged_requests",
+    "music_pool_hits",
+)
+
+_local = threading.local()
+
+
+class StageSpan:
+    def __init__(self, name: str):
+        self.name = name
+        self.values: Dict[str, float] = dict.fromkeys(SPAN_FIELDS, 0)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {field: round(value, 3) if isinstance(value, float) else value
+                for field, value in self.values.items()}
+
+
+@contextmanager
+def stage_span(name: str) -> Iterator[StageSpan]:
+    """Make a span current for the calling thread while a stage runs"""
+    span = StageSpan(name)
+    previous = getattr(_local, "span", None)
+    _local.span = span
+    try:
+        yield span
+    finally:
+        _local.span = previous
+
+
+def current_span() -> Optional[StageSpan]:
+    return getattr(_local, "span", None)
+
+
+@contextmanager
+def bind_span(span: Optional[StageSpan]) -> Iterator[Optional[StageSpan]]:
+    """Attribute work on a helper thread to the span of the stage that started it"""
+    previous = getattr(_local, "span", None)
+    _local.span = span
+    try:
+        yield span
+    finally:
+        _local.span = previous
+
+
+def record(field: str, amount: float):
+    """Add to a field of the current thread's span; a no-op outside a stage"""
+    span: Optional[StageSpan] = getattr(_local, "span", None)
+    if span is not None:
+        span.values[field] = span.values.get(field, 0) + amount
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process or any waited-for child (e.g. ffmpeg), in MB"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def write_prometheus_textfile(path: str, runs: List[Dict[str, Any]]):
+    """Write stage metrics for one or more runs in node_exporter textfile format"""
+    totals: Dict[str, Dict[str, float]] = {}
+    counts: Dict[str, int] = {}
+    for results in runs:
+        for stage, entry in results.get("stages", {}).items():
+            if entry.get("resumed"):
+                continue
+            counts[stage] = counts.get(stage, 0) + 1
+            stage_totals = totals.setdefault(stage, {"duration_seconds": 0.0})
+            stage_totals["duration_seconds"] += entry.get("duration_seconds", 0)
+            for field, value in entry.get("metrics", {}).items():
+                stage_totals[field] = stage_totals.get(field, 0) + value
+
+    lines = [
+        "# HELP media_runs_total Workflow runs covered by this file.",
+        "# TYPE media_runs_total gauge",
+        f"media_runs_total {len(runs)}",
+        "# HELP media_runs_failed_total Workflow runs that did not produce a final video.",
+        "# TYPE media_runs_failed_total gauge",
+        f"media_runs_failed_total {sum(1 for r in runs if 'final_video' not in r.get('generated_files', {}))}",
+        "# HELP media_stage_runs_total Stage executions covered by this file.",
+        "# TYPE media_stage_runs_total gauge",
+    ]
+    lines += [f'media_stage_runs_total{{stage="{stage}"}} {count}' for stage, count in counts.items()]
+    for field in ("duration_seconds",) + SPAN_FIELDS:
+        name = f"media_stage_{field}_sum"
+        lines.append(f"# HELP {name} Sum of {field.replace('_', ' ')} per stage.")
+        lines.append(f"# TYPE {name} gauge")
+        for stage, stage_totals in totals.items():
+            lines.append(f'{name}{{stage="{stage}"}} {stage_totals.get(field, 0)}')
+
+    # Write then rename so the collector never reads a partial file
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+def export_otel_spans(results: Dict[str, Any]) -> bool:
+    """Emit the run's stages as OpenTelemetry spans on the globally configured tracer"""
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        print("⚠️ opentelemetry-api is not installed, skipping OpenTelemetry export")
+        return False
+
+    def to_ns(timestamp: str) -> int:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1e9)
+
+    tracer = trace.get_tracer("generate_media")
+    # Stages reused from a checkpoint were already exported by the run that produced them
+    exported = {name: entry for name, entry in results.get("stages", {}).items()
+                if "end" in entry and not entry.get("resumed")}
+    if not exported:
+        return False
+    stages = list(exported.values())
+    root = tracer.start_span(
+        "media_workflow",
+        start_time=min(to_ns(entry["start"]) for entry in stages),
+        attributes={"run_id": results.get("run_id", "")}
+    )
+    context = trace.set_span_in_context(root)
+    for name, entry in exported.items():
+        attributes = {f"media.{field}": value for field, value in entry.get("metrics", {}).items()}
+        span = tracer.start_span(f"stage.{name}", context=context, start_time=to_ns(entry["start"]),
+                                 attributes=attributes)
+        span.end(end_time=to_ns(entry["end"]))
+    root.end(end_time=max(to_ns(entry["end"]) for entry in stages))
+    return True
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Warm pool of pre-generated music tracks
+Music prompts come from a small set of moods, so tracks can be generated
+ahead of time. The pool keeps a target number of ready tracks per
+mood/style/tempo bucket; a workflow claims one instantly instead of waiting
+on Lyria and falls back to generating only when its bucket is empty. A miss
+registers its bucket, so the refiller learns which moods are in demand.
+
+The refiller tops buckets back up to their target during an off-peak window
+(an empty bucket is refilled at any hour) and records refill lag: how long a
+bucket stayed below target after a claim drained it. `stats` reports the hit
+rate and refill lag per bucket.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Iterator, Tuple
+
+from media_cache import normalize_prompt
+
+DEFAULT_POOL_DIR = "music_pool"
+DEFAULT_TARGET = 2
+DEFAULT_REFILL_INTERVAL = 300.0
+INDEX_FILENAME = "pool.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    style TEXT NOT NULL,
+    tempo TEXT NOT NULL,
+    target INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    deficit_since REAL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bucket TEXT NOT NULL,
+    file TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'ready',
+    created REAL NOT NULL,
+    claimed_at REAL,
+    claimed_by TEXT
+);
+CREATE INDEX IF NOT EXISTS tracks_ready ON tracks (bucket, status, created);
+CREATE TABLE IF NOT EXISTS refills (
+    bucket TEXT NOT NULL,
+    lag_seconds REAL NOT NULL,
+    finished REAL NOT NULL
+);
+"""
+
+
+def bucket_key(prompt: str, style: str = "", tempo: str = "") -> str:
+    """Prompts differing only in case or whitespace share a bucket"""
+    payload = json.dumps([normalize_prompt(prompt).lower(), style.lower(), tempo.lower()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_hours(spec: str) -> Tuple[int, int]:
+    """Parse an off-peak window such as 22-6 (wraps past midnight)"""
+    try:
+        start, end = (int(part) for part in spec.split("-"))
+    except ValueError:
+        raise ValueError(f"Off-peak window must look like START-END in hours, e.g. 22-6: {spec}")
+    if not (0 <= start < 24 and 0 <= end <= 24):
+        raise ValueError(f"Off-peak hours must be between 0 and 24: {spec}")
+    return start, end
+
+
+def in_window(window: Optional[Tuple[int, int]], hour: Optional[int] = None) -> bool:
+    if window is None:
+        return True
+    hour = datetime.now().hour if hour is None else hour
+    start, end = window
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+class MusicPool:
+    def __init__(self, root: Path, default_target: int = DEFAULT_TARGET):
+        self.root = Path(root)
+        self.track_dir = self.root / "tracks"
+        self.track_dir.mkdir(parents=True, exist_ok=True)
+        self.default_target = default_target
+        with self.connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.root / INDEX_FILENAME, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Take the write lock up front so two claims can't hand out the same track"""
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _ensure_bucket(self, db: sqlite3.Connection, prompt: str, style: str, tempo: str,
+                       target: Optional[int] = None) -> str:
+        bucket = bucket_key(prompt, style, tempo)
+        db.execute(
+            "INSERT INTO buckets (bucket, prompt, style, tempo, target, created) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(bucket) DO NOTHING",
+            (bucket, normalize_prompt(prompt), style, tempo,
+             self.default_target if target is None else target, time.time())
+        )
+        if target is not None:
+            db.execute("UPDATE buckets SET target = ? WHERE bucket = ?", (target, bucket))
+        return bucket
+
+    @staticmethod
+    def _ready(db: sqlite3.Connection, bucket: str) -> int:
+        return db.execute("SELECT COUNT(*) FROM tracks WHERE bucket = ? AND status = 'ready'",
+                          (bucket,)).fetchone()[0]
+
+    def add_bucket(self, prompt: str, style: str = "", tempo: str = "", target: int = DEFAULT_TARGET) -> str:
+        """Create a bucket, or change its target"""
+        with self.transaction() as db:
+            bucket = self._ensure_bucket(db, prompt, style, tempo, target)
+            if self._ready(db, bucket) < target:
+                db.execute("UPDATE buckets SET deficit_since = COALESCE(deficit_since, ?) WHERE bucket = ?",
+                           (time.time(), bucket))
+        return bucket
+
+    def claim(self, prompt: str, style: str, tempo: str, destination_dir: Path,
+              claimer: str = "") -> Optional[str]:
+        """Move the oldest ready track of this bucket into destination_dir and return its path, or None"""
+        now = time.time()
+        with self.transaction() as db:
+            bucket = self._ensure_bucket(db, prompt, style, tempo)
+            row = None
+            for candidate in db.execute("SELECT id, file FROM tracks WHERE bucket = ? AND status = 'ready'"
+                                        " ORDER BY created, id", (bucket,)).fetchall():
+                if (self.root / candidate["file"]).is_file():
+                    row = candidate
+                    break
+                db.execute("UPDATE tracks SET status = 'lost' WHERE id = ?", (candidate["id"],))
+            if row is not None:
+                db.execute("UPDATE tracks SET status = 'claimed', claimed_at = ?, claimed_by = ? WHERE id = ?",
+                           (now, claimer or None, row["id"]))
+            db.execute(f"UPDATE buckets SET {'hits = hits' if row else 'misses = misses'} + 1 WHERE bucket = ?",
+                       (bucket,))
+            # The refill lag clock starts when the bucket first drops below its target
+            db.execute("UPDATE buckets SET deficit_since = COALESCE(deficit_since, ?)"
+                       " WHERE bucket = ? AND target > ?", (now, bucket, self._ready(db, bucket)))
+        if row is None:
+            return None
+        source = self.root / row["file"]
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        destination = Path(destination_dir) / f"lyria_pool_{stamp}_{source.name}"
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(source, destination)
+        except OSError:
+            # Another filesystem: copy, then drop the pool's copy
+            shutil.copy2(source, destination)
+            source.unlink()
+        return str(destination)
+
+    def deposit(self, prompt: str, style: str, tempo: str, path: str) -> int:
+        """Move a freshly generated track into the pool as ready; returns the bucket's ready count"""
+        bucket = bucket_key(prompt, style, tempo)
+        file = Path("tracks") / f"{bucket}_{uuid.uuid4().hex[:8]}{Path(path).suffix}"
+        try:
+            os.replace(path, self.root / file)
+        except OSError:
+            shutil.copy2(path, self.root / file)
+            os.unlink(path)
+        now = time.time()
+        with self.transaction() as db:
+            bucket = self._ensure_bucket(db, prompt, style, tempo)
+            db.execute("INSERT INTO tracks (bucket, file, created) VALUES (?, ?, ?)", (bucket, str(file), now))
+            ready = self._ready(db, bucket)
+            row = db.execute("SELECT target, deficit_since FROM buckets WHERE bucket = ?", (bucket,)).fetchone()
+            if row["deficit_since"] is not None and ready >= row["target"]:
+                db.execute("INSERT INTO refills (bucket, lag_seconds, finished) VALUES (?, ?, ?)",
+                           (bucket, now - row["deficit_since"], now))
+                db.execute("UPDATE buckets SET deficit_since = NULL WHERE bucket = ?", (bucket,))
+        return ready
+
+    def deficits(self) -> List[Dict[str, Any]]:
+        """Buckets below target, emptiest first, with how many tracks each needs"""
+        with self.connect() as db:
+            rows = db.execute(
+                "SELECT b.*, (SELECT COUNT(*) FROM tracks t WHERE t.bucket = b.bucket AND t.status = 'ready')"
+                " AS ready FROM buckets b"
+            ).fetchall()
+        short = [{**dict(row), "needed": row["target"] - row["ready"]}
+                 for row in rows if row["ready"] < row["target"]]
+        return sorted(short, key=lambda bucket: (bucket["ready"], -bucket["needed"]))
+
+    def refill(self, generate: Callable[[str, str, str], str], workers: int = 2,
+               off_peak: Optional[Tuple[int, int]] = None) -> int:
+        """Generate tracks for buckets below target; outside off_peak only empty buckets are refilled"""
+        peak = not in_window(off_peak)
+        jobs = []
+        for bucket in self.deficits():
+            if peak and bucket["ready"] > 0:
+                continue
+            # At peak an empty bucket gets one track, enough to turn the next miss into a hit
+            needed = 1 if peak else bucket["needed"]
+            jobs += [(bucket["prompt"], bucket["style"], bucket["tempo"])] * needed
+        if not jobs:
+            return 0
+
+        def make(job: Tuple[str, str, str]) -> bool:
+            prompt, style, tempo = job
+            try:
+                path = generate(prompt, style, tempo)
+            except Exception as e:
+                print(f"❌ Could not generate a pool track for '{prompt[:40]}': {e}", flush=True)
+                return False
+            ready = self.deposit(prompt, style, tempo, path)
+            print(f"🎵 Pooled a track for '{prompt[:40]}' ({style or '-'}/{tempo or '-'}), {ready} ready",
+                  flush=True)
+            return True
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            return sum(executor.map(make, jobs))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and refill lag, overall and per bucket"""
+        now = time.time()
+        with self.connect() as db:
+            buckets = db.execute(
+                "SELECT b.*, (SELECT COUNT(*) FROM tracks t WHERE t.bucket = b.bucket AND t.status = 'ready')"
+                " AS ready FROM buckets b ORDER BY b.created"
+            ).fetchall()
+            lags: Dict[str, List[float]] = {}
+            for row in db.execute("SELECT bucket, lag_seconds FROM refills ORDER BY finished"):
+                lags.setdefault(row["bucket"], []).append(row["lag_seconds"])
+
+        def lag_summary(values: List[float]) -> Dict[str, Any]:
+            values = sorted(values)
+            if not values:
+                return {"refills": 0, "p50_seconds": None, "p95_seconds": None, "max_seconds": None}
+            def rank(p: float) -> float:
+                return round(values[max(0, min(len(values) - 1, int(round(p / 100 * len(values))) - 1))], 1)
+            return {"refills": len(values), "p50_seconds": rank(50), "p95_seconds": rank(95),
+                    "max_seconds": round(values[-1], 1)}
+
+        per_bucket = []
+        for row in buckets:
+            claims = row["hits"] + row["misses"]
+            per_bucket.append({
+                "bucket": row["bucket"], "prompt": row["prompt"], "style": row["style"], "tempo": row["tempo"],
+                "target": row["target"], "ready": row["ready"], "hits": row["hits"], "misses": row["misses"],
+                "hit_rate": round(row["hits"] / claims, 3) if claims else None,
+                # How long the bucket has currently been below target, if it is
+                "deficit_seconds": round(now - row["deficit_since"], 1) if row["deficit_since"] else None,
+                "refill_lag": lag_summary(lags.get(row["bucket"], [])),
+            })
+        hits = sum(bucket["hits"] for bucket in per_bucket)
+        claims = hits + sum(bucket["misses"] for bucket in per_bucket)
+        return {
+            "hit_rate": round(hits / claims, 3) if claims else None,
+            "hits": hits,
+            "misses": claims - hits,
+            "ready": sum(bucket["ready"] for bucket in per_bucket),
+            "refill_lag": lag_summary([lag for values in lags.values() for lag in values]),
+            "buckets": per_bucket,
+        }
+
+
+def lyria_generator(output_dir: Path) -> Callable[[str, str, str], str]:
+    """Generate pool tracks straight from Vertex AI Lyria"""
+    from providers import build_session, VertexAuth, LyriaAdapter
+    adapter = LyriaAdapter(build_session(), VertexAuth(), output_dir)
+    return adapter.generate
+
+
+def main():
+    """Manage and refill the pre-generated music pool"""
+    parser = argparse.ArgumentParser(description='Pre-generated music pool')
+    parser.add_argument('--root', default=os.path.join('output', DEFAULT_POOL_DIR),
+                      help='Pool directory (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='Show hit rate, refill lag and ready tracks per bucket')
+    add = commands.add_parser('add-bucket', help='Keep tracks ready for a mood/style/tempo, or change its target')
+    add.add_argument('prompt')
+    add.add_argument('--style', default='')
+    add.add_argument('--tempo', default='')
+    add.add_argument('--target', type=int, default=DEFAULT_TARGET,
+                     help='Ready tracks to keep (default: %(default)s)')
+    refill = commands.add_parser('refill', help='Generate tracks for buckets below target')
+    refill.add_argument('--loop', action='store_true', help='Keep refilling every --interval seconds')
+    refill.add_argument('--interval', type=float, default=DEFAULT_REFILL_INTERVAL,
+                        help='Seconds between refill passes with --loop (default: %(default)s)')
+    refill.add_argument('--off-peak', metavar='START-END',
+                        help='Local hours for topping buckets up, e.g. 22-6; empty buckets are refilled anytime')
+    refill.add_argument('--workers', type=int, default=2,
+                        help='Concurrent Lyria requests (default: %(default)s)')
+    args = parser.parse_args()
+
+    pool = MusicPool(Path(args.root))
+    if args.command == 'stats':
+        print(json.dumps(pool.stats(), indent=2))
+    elif args.command == 'add-bucket':
+        bucket = pool.add_bucket(args.prompt, args.style, args.tempo, args.target)
+        print(f"🎵 Bucket {bucket} keeps {args.target} track(s) ready")
+    elif args.command == 'refill':
+        try:
+            off_peak = parse_hours(args.off_peak) if args.off_peak else None
+        except ValueError as e:
+            parser.error(str(e))
+        (pool.root / "incoming").mkdir(exist_ok=True)
+        generate = lyria_generator(pool.root / "incoming")
+        while True:
+            made = pool.refill(generate, workers=args.workers, off_peak=off_peak)
+            stats = pool.stats()
+            print(f"🔁 Refill pass: {made} track(s) generated, {stats['ready']} ready, "
+                  f"hit rate {stats['hit_rate']}, refill lag p95 {stats['refill_lag']['p95_seconds']}s", flush=True)
+            if not args.loop:
+                break
+            try:
+                time.sleep(args.interval)
+            except KeyboardInterrupt:
+                break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Local text overlay compositor
+Draws captions onto generated images with Pillow instead of asking an image
+model to render the text, so a caption change costs milliseconds rather than
+a new remote generation. One base image can be fanned out into many captioned
+variants in a single pass.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+# Tried in order when no font is given; the last resort is Pillow's built-in font
+DEFAULT_FONTS = (
+    "DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+    "arialbd.ttf",
+)
+
+# Tried in order when the main font has no glyphs for a caption (Japanese, Chinese, Korean);
+# on Linux, install fonts-noto-cjk (or fonts-ipaexfont) to provide one
+FALLBACK_FONTS = (
+    "NotoSansCJK-Bold.ttc",
+    "NotoSansCJKjp-Bold.otf",
+    "NotoSansJP-Bold.ttf",
+    "ipaexg.ttf",
+    "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc",
+    "/System/Library/Fonts/Hiragino Sans GB.ttc",
+    "YuGothB.ttc",
+    "msgothic.ttc",
+)
+
+# A private-use code point no font draws, so it renders as the font's missing-glyph box
+_NO_GLYPH = "\U0010fffd"
+
+
+@lru_cache(maxsize=32)
+def load_font(font_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+    for candidate in ((font_path,) if font_path else DEFAULT_FONTS):
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    if font_path:
+        raise OSError(f"Cannot load font {font_path}")
+    return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=32)
+def load_fallback_font(font_path: Optional[str], size: int) -> Optional[ImageFont.FreeTypeFont]:
+    for candidate in ((font_path,) if font_path else FALLBACK_FONTS):
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    if font_path:
+        raise OSError(f"Cannot load fallback font {font_path}")
+    return None
+
+
+def _glyph(font: ImageFont.FreeTypeFont, char: str) -> Tuple[Tuple[int, int], List[int]]:
+    mask = font.getmask(char)
+    return mask.size, list(mask)
+
+
+def missing_glyphs(font: ImageFont.FreeTypeFont, text: str) -> List[str]:
+    """Characters of text that font would draw as its missing-glyph box"""
+    tofu = _glyph(font, _NO_GLYPH)
+    return [char for char in dict.fromkeys(text) if not char.isspace() and _glyph(font, char) == tofu]
+
+
+def select_font(text: str, font_path: Optional[str], fallback_path: Optional[str],
+                size: int) -> ImageFont.FreeTypeFont:
+    """The main font, or the fallback font when the main one can't draw every character"""
+    font = load_font(font_path, size)
+    missing = missing_glyphs(font, text)
+    if not missing:
+        return font
+    fallback = load_fallback_font(fallback_path, size)
+    if fallback is not None and not missing_glyphs(fallback, "".join(missing)):
+        return fallback
+    print(f"⚠️ No installed font can draw {''.join(missing[:10])!r}; install fonts-noto-cjk or pass --fallback-font")
+    return font
+
+
+def caption_filename(prefix: str, caption: str, suffix: str = ".png",
+                     style: Optional["OverlayStyle"] = None) -> str:
+    """Build a stable, filesystem-safe name for a caption variant in a given style"""
+    slug = re.sub(r"[^a-z0-9]+", "_", caption.lower()).strip("_")[:40] or "caption"
+    key = caption if style is None else json.dumps([caption, style.to_dict()], sort_keys=True)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+    position = f"_{style.position}" if style is not None else ""
+    return f"{prefix}_{slug}{position}_{digest}{suffix}"
+
+
+class OverlayStyle:
+    def __init__(self, font_path: Optional[str] = None, font_scale: float = 0.08,
+                 position: str = "center", margin: float = 0.06, max_width: float = 0.86,
+                 fill: Tuple[int, ...] = (255, 255, 255, 255), stroke_width: float = 0.08,
+                 stroke_fill: Tuple[int, ...] = (0, 0, 0, 255), shadow_offset: Tuple[float, float] = (0.04, 0.06),
+                 shadow_fill: Tuple[int, ...] = (0, 0, 0, 160), shadow_blur: float = 0.05,
+                 line_spacing: float = 0.2, fallback_font_path: Optional[str] = None):
+        """Sizes are fractions: font_scale and margin of the image height, the rest of the font size"""
+        if position not in ("top", "center", "bottom"):
+            raise ValueError(f"Unknown text position: {position}")
+        self.font_path = font_path
+        self.font_scale = font_scale
+        self.position = position
+        self.margin = margin
+        self.max_width = max_width
+        self.fill = fill
+        self.stroke_width = stroke_width
+        self.stroke_fill = stroke_fill
+        self.shadow_offset = shadow_offset
+        self.shadow_fill = shadow_fill
+        self.shadow_blur = shadow_blur
+        self.line_spacing = line_spacing
+        self.fallback_font_path = fallback_font_path
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Everything that changes the rendered pixels, for file names and checkpoint params"""
+        return {key: list(value) if isinstance(value, tuple) else value
+                for key, value in sorted(vars(self).items())}
+
+
+class TextCompositor:
+    def __init__(self, style: Optional[OverlayStyle] = None):
+        self.style = style or OverlayStyle()
+
+    def _wrap(self, draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, max_width: float) -> str:
+        lines: List[str] = []
+        for paragraph in text.splitlines() or [""]:
+            line = ""
+            for word in paragraph.split():
+                candidate = f"{line} {word}".strip()
+                if line and draw.textlength(candidate, font=font) > max_width:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = candidate
+                # CJK captions have no spaces to break at, so break an overlong word between characters
+                while len(line) > 1 and draw.textlength(line, font=font) > max_width:
+                    cut = len(line) - 1
+                    while cut > 1 and draw.textlength(line[:cut], font=font) > max_width:
+                        cut -= 1
+                    lines.append(line[:cut])
+                    line = line[cut:]
+            lines.append(line)
+        return "\n".join(lines)
+
+    def render(self, base: Image.Image, caption: str) -> Image.Image:
+        """Return a captioned copy of an already decoded RGBA base image"""
+        style = self.style
+        width, height = base.size
+        font_size = max(8, int(height * style.font_scale))
+        font = select_font(caption, style.font_path, style.fallback_font_path, font_size)
+        stroke = int(round(font_size * style.stroke_width))
+        spacing = int(font_size * style.line_spacing)
+
+        measure = ImageDraw.Draw(base)
+        text = self._wrap(measure, caption, font, width * style.max_width)
+        left, top, right, bottom = measure.multiline_textbbox(
+            (0, 0), text, font=font, spacing=spacing, align="center", stroke_width=stroke
+        )
+        x = (width - (right - left)) / 2 - left
+        margin = height * style.margin
+        if style.position == "top":
+            y = margin - top
+        elif style.position == "bottom":
+            y = height - margin - bottom
+        else:
+            y = (height - (bottom - top)) / 2 - top
+
+        # Draw into a layer that only covers the text (plus room for the shadow),
+        # so blurring and compositing cost scales with the caption, not the image
+        shadow_dx = font_size * style.shadow_offset[0]
+        shadow_dy = font_size * style.shadow_offset[1]
+        pad = int(font_size * style.shadow_blur * 3 + max(abs(shadow_dx), abs(shadow_dy))) + 2
+        origin = (int(x + left) - pad, int(y + top) - pad)
+        layer_size = (math.ceil(right - left) + 2 * pad, math.ceil(bottom - top) + 2 * pad)
+        text_xy = (x - origin[0], y - origin[1])
+
+        layer = Image.new("RGBA", layer_size, (0, 0, 0, 0))
+        if style.shadow_fill[3]:
+            ImageDraw.Draw(layer).multiline_text(
+                (text_xy[0] + shadow_dx, text_xy[1] + shadow_dy),
+                text, font=font, fill=style.shadow_fill, spacing=spacing, align="center", stroke_width=stroke
+            )
+            if style.shadow_blur:
+                layer = layer.filter(ImageFilter.GaussianBlur(font_size * style.shadow_blur))
+        ImageDraw.Draw(layer).multiline_text(
+            text_xy, text, font=font, fill=style.fill, spacing=spacing, align="center",
+            stroke_width=stroke, stroke_fill=style.stroke_fill
+        )
+
+        image = base.copy()
+        # alpha_composite needs the layer inside the image, so clip it at the edges
+        crop_left, crop_top = max(0, -origin[0]), max(0, -origin[1])
+        layer = layer.crop((crop_left, crop_top,
+                            min(layer_size[0], width - origin[0]), min(layer_size[1], height - origin[1])))
+        image.alpha_composite(layer, dest=(origin[0] + crop_left, origin[1] + crop_top))
+        return image
+
+    def render_file(self, base_path: str, caption: str, output_path: str) -> str:
+        """Caption a single image file"""
+        with Image.open(base_path) as source:
+            base = source.convert("RGBA")
+        self.save(self.render(base, caption), output_path)
+        return output_path
+
+    def render_captions(self, base_path: str, captions: List[str], output_dir: Path,
+                        prefix: str = "captioned") -> Dict[str, str]:
+        """Decode the base image once and render every caption onto a copy of it"""
+        output_dir = Path(output_dir)
+        with Image.open(base_path) as source:
+            base = source.convert("RGBA")
+        # Name variants after the base too, so different bases never collide
+        base_id = hashlib.sha256(base.tobytes()).hexdigest()[:8]
+        outputs = {}
+        for caption in dict.fromkeys(captions):
+            path = output_dir / caption_filename(f"{prefix}_{base_id}", caption, style=self.style)
+            self.save(self.render(base, caption), str(path))
+            outputs[caption] = str(path)
+        return outputs
+
+    def save(self, image: Image.Image, path: str):
+        """Write to a temporary file and swap it in: the old file may be hardlinked into the artifact store"""
+        target = Path(path)
+        tmp_path = target.with_name(f"{target.stem}.{os.getpid()}.tmp{target.suffix}")
+        try:
+            if target.suffix.lower() in (".jpg", ".jpeg"):
+                image.convert("RGB").save(tmp_path, quality=92)
+            else:
+                # Fast zlib level: captions are re-rendered on demand, size matters less than speed
+                image.save(tmp_path, compress_level=1)
+            os.replace(tmp_path, target)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
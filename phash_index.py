@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash index of generated images
+Every image that went on to a video render is recorded with its 64-bit DCT
+perceptual hash. A new image within a small Hamming distance of an indexed
+one, with the same caption, reuses that image's video instead of paying for
+another render. Lookups go through a multi-index hash table, so they stay
+fast as the index grows to tens of thousands of images.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from media_cache import normalize_prompt, file_lock
+
+DEFAULT_MAX_DISTANCE = 6
+HASH_SIZE = 8
+HIGHFREQ_FACTOR = 4
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(HASH_SIZE * HIGHFREQ_FACTOR)
+
+
+def phash(image_path: str) -> int:
+    """64-bit perceptual hash: low-frequency DCT coefficients of a 32x32 greyscale thumbnail vs their median"""
+    size = HASH_SIZE * HIGHFREQ_FACTOR
+    with Image.open(image_path) as image:
+        pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = low > np.median(low)
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHash:
+    """Exact-radius Hamming search over 64-bit hashes by pigeonhole band lookup
+
+    The hash is split into radius + 1 bands; any hash within ``radius`` bits of
+    a query differs in at most ``radius`` bands, so it matches the query exactly
+    in at least one. A query is radius + 1 dict lookups plus a distance check on
+    the few candidates, instead of a scan. (A BK-tree prunes poorly at this radius
+    over 64 bits and ends up slower than a linear scan.)
+    """
+
+    def __init__(self, radius: int, bits: int = HASH_SIZE * HASH_SIZE):
+        self.radius = radius
+        bands = radius + 1
+        edges = [bits * i // bands for i in range(bands + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in self.bands]
+        self.values: List[int] = []
+        self.items: List[Any] = []
+
+    def add(self, value: int, item: Any):
+        position = len(self.values)
+        self.values.append(value)
+        self.items.append(item)
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            table.setdefault((value >> shift) & mask, []).append(position)
+
+    def search(self, value: int) -> List[Tuple[int, Any]]:
+        """Return (distance, item) for every item within the radius, nearest first"""
+        candidates = set()
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        found = []
+        for position in candidates:
+            distance = hamming(value, self.values[position])
+            if distance <= self.radius:
+                found.append((distance, position))
+        # Nearest first, newest first among equals
+        found.sort(key=lambda match: (match[0], -match[1]))
+        return [(distance, self.items[position]) for distance, position in found]
+
+
+class PerceptualIndex:
+    def __init__(self, path: Path, max_distance: int = DEFAULT_MAX_DISTANCE):
+        """Entries are appended to a JSON Lines file, so recording one never rewrites the index"""
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.table = MultiIndexHash(max_distance)
+        # Bytes of the file already loaded; other workers append past it
+        self.offset = 0
+        self.line_number = 0
+        with self.lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Load entries appended since the last read, including other processes' (call with self.lock held)"""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        # A line still being appended has no newline yet; pick it up next time
+        complete = data[:data.rfind(b"\n") + 1]
+        self.offset += len(complete)
+        for line in complete.decode("utf-8", errors="replace").splitlines():
+            self.line_number += 1
+            try:
+                entry = json.loads(line)
+                self.table.add(int(entry["phash"], 16), entry)
+            except (ValueError, KeyError) as e:
+                print(f"⚠️ Skipping bad line {self.line_number} in {self.path}: {e}")
+
+    def find_video(self, image_hash: int, caption: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the nearest indexed entry with the same caption whose video still exists"""
+        caption_key = normalize_prompt(caption or "")
+        with self.lock:
+            self._refresh()
+            matches = self.table.search(image_hash)
+        for distance, entry in matches:
+            # A caption change is only a few pixels at hash resolution, so it must match exactly
+            if entry.get("caption", "") == caption_key and os.path.isfile(entry["video"]):
+                return {**entry, "distance": distance}
+        return None
+
+    def add(self, image_hash: int, image_path: str, video_path: str, prompt: str, caption: Optional[str]):
+        entry = {
+            "phash": f"{image_hash:016x}",
+            "image": image_path,
+            "video": video_path,
+            "prompt": normalize_prompt(prompt),
+            "caption": normalize_prompt(caption or ""),
+            "created": time.time(),
+        }
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Locked so lines from concurrent workers never interleave
+            with file_lock(self.path.with_name(self.path.name + ".lock")):
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+            # Loads this entry along with any other worker's since the last read
+            self._refresh()
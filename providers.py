@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Direct provider adapters for the media generation pipeline
+Calls Imagen, Hailuo and Lyria over a pooled HTTP session with known
+parameters, instead of asking Claude to call the equivalent MCP tool and
+parsing a file path back out of its reply.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fal_queue import FalQueueClient, FalJobError, FAL_QUEUE_URL, PENDING_STATES, backoff
+from hailuo_jobs import HailuoJobPoller, DEFAULT_MAX_INTERVAL
+from metrics import record
+
+VERTEX_LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
+VERTEX_API_URL = os.getenv("VERTEX_API_URL", f"https://{VERTEX_LOCATION}-aiplatform.googleapis.com/v1")
+IMAGEN_MODEL = "imagen-3.0-generate-002"
+LYRIA_MODEL = "lyria-002"
+IMAGEN4_ULTRA_APP_ID = "fal-ai/imagen4/preview/ultra"
+GOOGLE_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+def build_session(pool_size: int = 16) -> requests.Session:
+    """Create a keep-alive session whose connection pool fits every concurrent stage"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def unique_filename(prefix: str, suffix: str) -> str:
+    return f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{suffix}"
+
+
+class VertexAuth:
+    """Access tokens for Vertex AI from GOOGLE_APPLICATION_CREDENTIALS(_JSON)"""
+
+    def __init__(self, project: Optional[str] = None):
+        try:
+            import google.auth
+            from google.auth.transport.requests import Request
+            from google.oauth2 import service_account
+        except ImportError as e:
+            raise RuntimeError("Direct Imagen/Lyria dispatch requires google-auth (pip install google-auth)") from e
+
+        creds_json = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+        if creds_json and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+            info = json.loads(creds_json)
+            self.credentials = service_account.Credentials.from_service_account_info(info, scopes=GOOGLE_SCOPES)
+            default_project = info.get("project_id")
+        else:
+            self.credentials, default_project = google.auth.default(scopes=GOOGLE_SCOPES)
+        self.project = project or os.getenv("GOOGLE_CLOUD_PROJECT") or default_project
+        if not self.project:
+            raise RuntimeError("Set GOOGLE_CLOUD_PROJECT or use credentials that include a project_id")
+        self.request = Request()
+        self.lock = threading.Lock()
+
+    def headers(self) -> Dict[str, str]:
+        with self.lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(self.request)
+            return {"Authorization": f"Bearer {self.credentials.token}"}
+
+
+class VertexPredictAdapter:
+    """Base adapter for Vertex AI publisher model :predict endpoints"""
+
+    model = ""
+
+    def __init__(self, session: requests.Session, auth: VertexAuth, output_dir: Path,
+                 base_url: str = VERTEX_API_URL, location: str = VERTEX_LOCATION):
+        self.session = session
+        self.auth = auth
+        self.output_dir = Path(output_dir)
+        self.url = (f"{base_url.rstrip('/')}/projects/{auth.project}/locations/{location}"
+                    f"/publishers/google/models/{self.model}:predict")
+
+    def predict(self, instance: Dict[str, Any], parameters: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.post(
+            self.url,
+            json={"instances": [instance], "parameters": parameters},
+            headers=self.auth.headers(),
+            timeout=300
+        )
+        response.raise_for_status()
+        record("bytes_downloaded", len(response.content))
+        predictions = response.json().get("predictions") or []
+        if not predictions:
+            raise RuntimeError(f"{self.model} returned no predictions")
+        return predictions[0]
+
+    def save(self, prediction: Dict[str, Any], prefix: str, suffix: str) -> str:
+        encoded = prediction.get("bytesBase64Encoded") or prediction.get("audioContent")
+        if not encoded:
+            raise RuntimeError(f"{self.model} prediction has no media payload")
+        path = self.output_dir / unique_filename(prefix, suffix)
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(encoded))
+        return str(path)
+
+
+class ImagenAdapter(VertexPredictAdapter):
+    model = IMAGEN_MODEL
+
+    def generate(self, prompt: str, aspect_ratio: str = "1:1") -> str:
+        prediction = self.predict({"prompt": prompt}, {"sampleCount": 1, "aspectRatio": aspect_ratio})
+        return self.save(prediction, "imagen3", ".png")
+
+
+class LyriaAdapter(VertexPredictAdapter):
+    model = LYRIA_MODEL
+
+    def generate(self, prompt: str, style: str, tempo: str) -> str:
+        # Lyria takes a single text prompt and always returns a ~30s clip,
+        # so style and tempo are folded into the prompt.
+        prediction = self.predict({"prompt": f"{prompt}. Style: {style}. Tempo: {tempo}."}, {"sample_count": 1})
+        return self.save(prediction, "lyria_output", ".wav")
+
+
+class FalImagenAdapter:
+    """Imagen 4 Ultra on the fal queue; polling stops and the request is cancelled when cancel is set"""
+
+    def __init__(self, session: requests.Session, output_dir: Path, app_id: str = IMAGEN4_ULTRA_APP_ID,
+                 base_url: str = FAL_QUEUE_URL, initial_interval: float = 1.0,
+                 max_interval: float = DEFAULT_MAX_INTERVAL, timeout: float = 300):
+        self.client = FalQueueClient(app_id, session=session, base_url=base_url)
+        self.output_dir = Path(output_dir)
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+
+    def generate(self, prompt: str, aspect_ratio: str = "1:1", cancel: Optional[threading.Event] = None) -> str:
+        cancel = cancel or threading.Event()
+        job = self.client.submit_payload({"prompt": prompt, "aspect_ratio": aspect_ratio, "num_images": 1})
+        deadline = time.time() + self.timeout
+        attempt = 0
+        while True:
+            status = self.client.poll(job)
+            if status["status"] == "COMPLETED":
+                break
+            if status["status"] not in PENDING_STATES:
+                raise FalJobError(f"Imagen 4 request {job['request_id']} failed: {status}")
+            if cancel.is_set() or time.time() > deadline:
+                self.client.cancel(job)
+                reason = "cancelled" if cancel.is_set() else "exceeded its deadline"
+                raise FalJobError(f"Imagen 4 request {job['request_id']} {reason}")
+            cancel.wait(min(backoff(attempt, self.initial_interval, self.max_interval),
+                            max(0.0, deadline - time.time())))
+            attempt += 1
+        record("retries", job.get("retries", 0))
+        images = self.client.result(job).get("images") or []
+        if not images:
+            raise RuntimeError("Imagen 4 returned no images")
+        download = self.client.download(images[0]["url"], self.output_dir / unique_filename("imagen4_ultra", ".png"))
+        record("bytes_downloaded", download["bytes_transferred"])
+        return download["path"]
+
+
+class HailuoAdapter:
+    def __init__(self, poller: HailuoJobPoller):
+        self.poller = poller
+
+    def generate(self, image_path: str, prompt: str, prompt_optimizer: bool = True) -> str:
+        return self.poller.render_sync(image_path, prompt, prompt_optimizer=prompt_optimizer)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Multi-rendition output for finished videos
+Every platform gets its own aspect ratio, resolution and bitrate, but the
+source is decoded only once: a single ffmpeg process splits the decoded
+frames into one crop/scale/encode branch per rendition.
+
+Renditions are encoded from the finished video in a pass of their own rather
+than as extra branches of the combine encode. The combine step usually copies
+the video stream without decoding it, so there is no decode to share, and the
+music fitting feeds that step through pipes whose audio a split graph would
+have to duplicate. The cost is one extra decode of the final video.
+"""
+
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from ffmpeg_tools import get_ffmpeg_exe
+
+# Named shortcuts for the specs we post most often
+PRESETS = {
+    "landscape": "16:9@1920x1080:8M",
+    "portrait": "9:16@1080x1920:8M",
+    "square": "1:1@1080x1080:6M",
+}
+
+_SPEC_RE = re.compile(
+    r"^(?:(?P<name>[\w-]+)=)?(?P<aw>\d+):(?P<ah>\d+)@(?P<width>\d+)x(?P<height>\d+):(?P<bitrate>\d+(?:\.\d+)?[kKmM]?)$"
+)
+
+
+class Rendition:
+    def __init__(self, aspect_width: int, aspect_height: int, width: int, height: int, bitrate: str,
+                 name: Optional[str] = None):
+        if width % 2 or height % 2:
+            raise ValueError(f"Rendition size must be even for yuv420p: {width}x{height}")
+        self.aspect_width = aspect_width
+        self.aspect_height = aspect_height
+        self.width = width
+        self.height = height
+        self.bitrate = bitrate
+        self.name = name or f"{aspect_width}x{aspect_height}_{height}p_{bitrate}"
+
+    def crop_filter(self) -> str:
+        """Center-crop to the target aspect ratio"""
+        # Multiply before dividing: ffmpeg reads iw/16/9 as iw/144, not iw*9/16
+        w, h = self.aspect_width, self.aspect_height
+        return f"crop='min(iw,ih*{w}/{h})':'min(ih,iw*{h}/{w})'"
+
+    def filter(self) -> str:
+        """Center-crop to the target aspect ratio, then scale to the target size"""
+        return f"{self.crop_filter()},scale={self.width}:{self.height},setsar=1"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "aspect": f"{self.aspect_width}:{self.aspect_height}",
+                "width": self.width, "height": self.height, "bitrate": self.bitrate}
+
+
+def parse_rendition(spec: str) -> Rendition:
+    """Parse a preset name or [name=]W:H@WIDTHxHEIGHT:BITRATE, e.g. tiktok=9:16@1080x1920:6M"""
+    named = PRESETS.get(spec)
+    match = _SPEC_RE.match(f"{spec}={named}" if named else spec)
+    if not match:
+        raise ValueError(f"Invalid rendition '{spec}', expected a preset ({', '.join(PRESETS)}) "
+                         f"or [name=]W:H@WIDTHxHEIGHT:BITRATE")
+    return Rendition(int(match["aw"]), int(match["ah"]), int(match["width"]), int(match["height"]),
+                     match["bitrate"], name=match["name"])
+
+
+def parse_renditions(specs: List[str]) -> List[Rendition]:
+    """Parse several specs; two renditions with one name would write the same file"""
+    renditions = [parse_rendition(spec) for spec in specs]
+    check_unique(renditions)
+    return renditions
+
+
+def check_unique(renditions: List[Rendition]):
+    seen = set()
+    for rendition in renditions:
+        if rendition.name in seen:
+            raise ValueError(f"Duplicate rendition name '{rendition.name}'; name one of them with name=SPEC")
+        seen.add(rendition.name)
+
+
+def encode_renditions(source_path: str, renditions: List[Rendition], output_dir: Path,
+                      prefix: str, preset: str = "veryfast") -> List[Dict[str, Any]]:
+    """Encode every rendition of source_path with one decode and one ffmpeg process"""
+    check_unique(renditions)
+    output_dir = Path(output_dir)
+    labels = [f"[s{i}]" for i in range(len(renditions))]
+    graph = [f"[0:v]split={len(renditions)}{''.join(labels)}"]
+    graph += [f"{label}{rendition.filter()}[v{i}]" for i, (label, rendition) in enumerate(zip(labels, renditions))]
+
+    command: List[str] = [get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+                          "-i", source_path, "-filter_complex", ";".join(graph)]
+    outputs = []
+    for i, rendition in enumerate(renditions):
+        path = output_dir / f"{prefix}_{rendition.name}.mp4"
+        if path.exists():
+            # Never rewrite in place: the old file may be hardlinked into the artifact store
+            path.unlink()
+        # The audio is already AAC, so every rendition shares it untouched
+        command += ["-map", f"[v{i}]", "-map", "0:a?",
+                    "-c:v", "libx264", "-preset", preset, "-pix_fmt", "yuv420p",
+                    "-b:v", rendition.bitrate, "-maxrate", rendition.bitrate,
+                    "-bufsize", _double(rendition.bitrate),
+                    "-c:a", "copy", "-movflags", "+faststart", str(path)]
+        outputs.append({**rendition.to_dict(), "path": str(path)})
+
+    proc = subprocess.run(command, capture_output=True, text=True, errors="replace")
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg rendition encode failed: {proc.stderr.strip()}")
+    for output in outputs:
+        output["size"] = os.path.getsize(output["path"])
+    return outputs
+
+
+def _double(bitrate: str) -> str:
+    """Twice a bitrate, for a VBV buffer of two seconds"""
+    number, unit = re.match(r"(\d+(?:\.\d+)?)(\D*)", bitrate).groups()
+    return f"{float(number) * 2:g}{unit}"
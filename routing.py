@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Latency-aware provider routing with hedged requests
+Each route (a provider and model) keeps a rolling window of latencies and
+errors. Calls go to the healthiest, fastest route first; if it hasn't
+answered by its own p95 latency a hedged backup goes to the next route, the
+first success wins and the loser is told to cancel. A failed route fails
+over to the next one straight away instead of stalling the run.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, Future
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from metrics import current_span, bind_span, record
+
+DEFAULT_WINDOW = 50
+DEFAULT_MIN_SAMPLES = 5
+DEFAULT_HEDGE_SECONDS = 45.0
+DEFAULT_MAX_ERROR_RATE = 0.5
+
+
+class RouteStats:
+    """Rolling window of (seconds, ok) samples for one route"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.samples: deque = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self.lock:
+            self.samples.append((round(seconds, 3), ok))
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Nearest-rank percentile over successful calls, or None without any"""
+        with self.lock:
+            latencies = sorted(seconds for seconds, ok in self.samples if ok)
+        if not latencies:
+            return None
+        rank = max(0, min(len(latencies) - 1, int(round(percentile / 100 * len(latencies))) - 1))
+        return latencies[rank]
+
+    def error_rate(self) -> float:
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"samples": len(self), "error_rate": round(self.error_rate(), 3),
+                "p50_seconds": self.latency_percentile(50), "p95_seconds": self.latency_percentile(95)}
+
+
+class Route:
+    def __init__(self, name: str, call: Callable[..., str], window: int = DEFAULT_WINDOW):
+        """call(*args, cancel=threading.Event, **kwargs) returns an output path, or "" / raises on failure"""
+        self.name = name
+        self.call = call
+        self.stats = RouteStats(window)
+
+
+class ProviderRouter:
+    def __init__(self, name: str, routes: List[Route], hedge_after: Optional[float] = None,
+                 default_hedge_seconds: float = DEFAULT_HEDGE_SECONDS, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 max_error_rate: float = DEFAULT_MAX_ERROR_RATE, stats_path: Optional[Path] = None):
+        """hedge_after fixes the hedge delay; by default it is each route's own p95 latency"""
+        if not routes:
+            raise ValueError(f"Router {name} needs at least one route")
+        self.name = name
+        self.routes = routes
+        self.hedge_after = hedge_after
+        self.default_hedge_seconds = default_hedge_seconds
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.stats_path = Path(stats_path) if stats_path else None
+        self.lock = threading.Lock()
+        # Losers keep running until they notice the cancel event, so leave room for them
+        self.executor = ThreadPoolExecutor(max_workers=4 * len(routes), thread_name_prefix=f"route-{name}")
+        self._load_stats()
+
+    def _load_stats(self):
+        if not self.stats_path or not self.stats_path.exists():
+            return
+        try:
+            with open(self.stats_path) as f:
+                saved = json.load(f).get(self.name, {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable routing stats {self.stats_path}: {e}")
+            return
+        for route in self.routes:
+            route.stats.samples.extend(tuple(sample) for sample in saved.get(route.name, []))
+
+    def _save_stats(self):
+        if not self.stats_path:
+            return
+        with self.lock:
+            saved = {}
+            if self.stats_path.exists():
+                try:
+                    with open(self.stats_path) as f:
+                        saved = json.load(f)
+                except (OSError, ValueError):
+                    saved = {}
+            saved[self.name] = {route.name: list(route.stats.samples) for route in self.routes}
+            tmp_path = self.stats_path.with_name(self.stats_path.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, self.stats_path)
+
+    def ranked(self) -> List[Route]:
+        """Healthy routes before erroring ones, then fastest median first; unmeasured routes keep their order"""
+        def score(indexed: Tuple[int, Route]) -> Tuple[bool, float, int]:
+            index, route = indexed
+            unhealthy = len(route.stats) >= self.min_samples and route.stats.error_rate() > self.max_error_rate
+            median = route.stats.latency_percentile(50) if len(route.stats) >= self.min_samples else None
+            return unhealthy, median if median is not None else 0.0, index
+        return [route for _, route in sorted(enumerate(self.routes), key=score)]
+
+    def hedge_delay(self, route: Route) -> float:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        p95 = route.stats.latency_percentile(95) if len(route.stats) >= self.min_samples else None
+        return p95 if p95 is not None else self.default_hedge_seconds
+
+    def _attempt(self, route: Route, cancel: threading.Event, span, args, kwargs) -> str:
+        started = time.time()
+        result = ""
+        try:
+            with bind_span(span):
+                result = route.call(*args, cancel=cancel, **kwargs) or ""
+        except Exception as e:
+            if not cancel.is_set():
+                print(f"❌ {self.name} route {route.name} failed: {e}")
+        # A cancelled loser says nothing about the route's health, but it was at least this slow,
+        # so count it as a success at that latency; otherwise a stalled primary is never demoted
+        route.stats.record(time.time() - started, bool(result) or cancel.is_set())
+        return result
+
+    def call(self, *args, **kwargs) -> str:
+        """Run the request on the best route, hedging and failing over as needed; "" if every route fails"""
+        ranked = self.ranked()
+        span = current_span()
+        pending: Dict[Future, Tuple[Route, threading.Event, float]] = {}
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            route = ranked[launched]
+            launched += 1
+            cancel = threading.Event()
+            future = self.executor.submit(self._attempt, route, cancel, span, args, kwargs)
+            pending[future] = (route, cancel, time.time())
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if launched < len(ranked):
+                    # Hedge again only once the newest attempt is also past its route's p95
+                    route, _, started = max(pending.values(), key=lambda attempt: attempt[2])
+                    timeout = max(0.0, started + self.hedge_delay(route) - time.time())
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    print(f"⏱️ {self.name}: {route.name} is past {self.hedge_delay(route):.1f}s, "
+                          f"hedging on {ranked[launched].name}")
+                    record("hedged_requests", 1)
+                    launch()
+                    continue
+                for future in done:
+                    route, _, _ = pending.pop(future)
+                    result = future.result()
+                    if result:
+                        for _, cancel, _ in pending.values():
+                            cancel.set()
+                        return result
+                    if not pending and launched < len(ranked):
+                        print(f"🔀 {self.name}: {route.name} failed, failing over to {ranked[launched].name}")
+                        launch()
+            return ""
+        finally:
+            self._save_stats()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {route.name: route.stats.to_dict() for route in self.routes}
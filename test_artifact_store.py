@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Check the artifact store: deduplication, link fallbacks, retention and garbage collection
+"""
+import os
+import time
+
+import pytest
+
+import artifact_store
+from artifact_store import ArtifactStore, place, validate_run_id
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    path = tmp_path / "output"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def store(output_dir):
+    return ArtifactStore(output_dir / "store")
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def age_run(store, run_id, days):
+    with store.connect() as db:
+        db.execute("UPDATE runs SET created = ? WHERE run_id = ?", (time.time() - days * 86400, run_id))
+
+
+def test_identical_outputs_are_stored_once(store, output_dir):
+    first = write(output_dir / "a.mp4", b"video" * 100)
+    second = write(output_dir / "b.mp4", b"video" * 100)
+    store.add_run("run-1", [first])
+    store.add_run("run-2", [second])
+    stats = store.stats()
+    assert stats["blobs"] == 1 and stats["logical_bytes"] == 2 * stats["stored_bytes"]
+    assert (store.run_dir / "run-2" / "b.mp4").read_bytes() == b"video" * 100
+
+
+def test_place_falls_back_to_hardlink_then_copy(tmp_path, monkeypatch):
+    source = write(tmp_path / "src.bin", b"data")
+
+    def no_reflink(src, dst):
+        raise OSError("not supported")
+
+    monkeypatch.setattr(artifact_store, "reflink", no_reflink)
+    assert place(source, str(tmp_path / "linked.bin")) == "hardlink"
+    assert os.path.samefile(source, tmp_path / "linked.bin")
+
+    def no_link(src, dst):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(artifact_store.os, "link", no_link)
+    assert place(source, str(tmp_path / "copied.bin")) == "copy"
+    assert not os.path.samefile(source, tmp_path / "copied.bin")
+    assert (tmp_path / "copied.bin").read_bytes() == b"data"
+
+
+def test_select_expired_by_age_keeps_the_newest(store, output_dir):
+    for index in range(3):
+        store.add_run(f"run-{index}", [write(output_dir / f"{index}.png", bytes([index]) * 10)])
+        age_run(store, f"run-{index}", 30 - index)
+    with store.connect() as db:
+        assert sorted(store.select_expired(db, None, 7, keep_last=1)) == ["run-0", "run-1"]
+        assert store.select_expired(db, None, 7, keep_last=3) == []
+
+
+def test_select_expired_by_size_counts_shared_blobs_once(store, output_dir):
+    shared = b"s" * 1024 * 600
+    for index in range(3):
+        files = [write(output_dir / f"shared{index}.mp4", shared),
+                 write(output_dir / f"own{index}.png", bytes([index]) * 1024 * 300)]
+        store.add_run(f"run-{index}", files)
+        age_run(store, f"run-{index}", 3 - index)
+    with store.connect() as db:
+        # The newest run costs 900 KB; each older one only adds its own 300 KB
+        assert store.select_expired(db, 1.2, None, keep_last=1) == ["run-0"]
+        assert store.select_expired(db, 0.5, None, keep_last=1) == ["run-1", "run-0"]
+
+
+def test_gc_removes_runs_outputs_and_orphan_blobs(store, output_dir):
+    old = write(output_dir / "old.mp4", b"old" * 100)
+    new = write(output_dir / "new.mp4", b"new" * 100)
+    store.add_run("old-run", [old])
+    age_run(store, "old-run", 30)
+    store.add_run("new-run", [new])
+
+    assert store.gc(max_age_days=7, dry_run=True)["removed_runs"] == ["old-run"]
+    assert os.path.exists(old)
+    result = store.gc(max_age_days=7)
+    assert result["runs_removed"] == 1 and result["blobs_removed"] == 1
+    assert not os.path.exists(old) and not (store.run_dir / "old-run").exists()
+    assert os.path.exists(new) and store.verify() == []
+
+
+def test_gc_never_deletes_protected_cache_files(store, output_dir):
+    cache_dir = output_dir / "cache"
+    cache_dir.mkdir()
+    cached = write(cache_dir / "entry.png", b"cached")
+    store.add_run("old-run", [cached])
+    age_run(store, "old-run", 30)
+    store.add_run("new-run", [write(output_dir / "new.png", b"new")])
+    store.gc(max_age_days=7)
+    assert os.path.exists(cached)
+
+
+@pytest.mark.parametrize("run_id", ["../escape", "a/b", "..", "", "x" * 129, "ok\n"])
+def test_unsafe_run_ids_are_rejected(run_id):
+    with pytest.raises(ValueError):
+        validate_run_id(run_id)
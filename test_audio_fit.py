@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Check music fitting: seamless loops, fades, loudness and bounded memory
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from audio_fit import AudioFitter, db_to_gain
+from ffmpeg_tools import probe_media
+from test_ffmpeg_tools import media  # noqa: F401 (fixture)
+
+RATE = 8000
+
+
+def tone(seconds, channels=2):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return np.repeat((0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)[:, None], channels, axis=1)
+
+
+def test_loop_matches_the_crossfade_definition():
+    fitter = AudioFitter(crossfade=0.5, sample_rate=RATE, chunk_seconds=0.1)
+    samples = np.random.default_rng(0).standard_normal((RATE * 2, 2)).astype(np.float32)
+    out = fitter.loop(samples, RATE * 7)
+    overlap, period = RATE // 2, RATE * 2 - RATE // 2
+    t = np.arange(len(out))
+    offset = t % period
+    expected = samples[offset]
+    seam = (offset < overlap) & (t >= period)
+    theta = (offset[seam] / overlap * (np.pi / 2)).astype(np.float32)[:, None]
+    expected[seam] = samples[offset[seam]] * np.sin(theta) + samples[offset[seam] + period] * np.cos(theta)
+    np.testing.assert_allclose(out, expected, atol=1e-6)
+
+
+def test_fit_fades_and_normalizes():
+    fitter = AudioFitter(sample_rate=RATE, target_dbfs=-20.0, chunk_seconds=0.25)
+    out = fitter.fit(tone(1.0), 6.0)
+    assert out.shape == (RATE * 6, 2)
+    assert out[0].max() == 0 and out[-1].max() == 0
+    rms = float(np.sqrt(np.mean(np.square(out, dtype=np.float64))))
+    assert rms == pytest.approx(db_to_gain(-20.0), rel=0.01)
+    assert float(np.max(np.abs(out))) <= db_to_gain(fitter.peak_dbfs) + 1e-6
+
+
+def test_stream_memory_does_not_grow_with_duration():
+    fitter = AudioFitter()
+    samples = np.zeros((48000 * 5, 2), dtype=np.float32) + 0.1
+    tracemalloc.start()
+    try:
+        for _ in fitter.stream(samples, 600.0):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Ten minutes of stereo float32 would be 230 MB
+    assert peak < 20 * 1024 * 1024
+
+
+def test_mux_covers_the_whole_video(media, tmp_path):
+    video, audio = media
+    output = AudioFitter().mux(video, audio, str(tmp_path / "out.mp4"), 2.0)
+    info = probe_media(output)
+    assert info["audio_codec"] == "aac"
+    assert info["duration"] == pytest.approx(2.0, abs=0.1)
+
+
+def test_reencode_goes_through_the_bounded_frame_buffer(media, tmp_path, monkeypatch):
+    import audio_fit
+    calls = []
+    real = audio_fit.stream_reencode
+    monkeypatch.setattr(audio_fit, "stream_reencode", lambda *a, **kw: calls.append(kw) or real(*a, **kw))
+    video, audio = media
+    output = AudioFitter().mux(video, audio, str(tmp_path / "out.mp4"), 2.0, copy_video=False, buffer_mb=1)
+    assert calls and calls[0]["buffer_mb"] == 1
+    info = probe_media(output)
+    assert info["video_codec"] == "h264" and info["audio_codec"] == "aac"
+    assert info["duration"] == pytest.approx(2.0, abs=0.1)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Check fal queue polling: transient errors are retried, cancellation stops the request
+"""
+import threading
+
+import pytest
+import requests
+
+from fal_queue import FalQueueClient, FalJobError, backoff
+from providers import FalImagenAdapter
+
+JOB = {"request_id": "req-1", "status_url": "http://q/status", "response_url": "http://q/result",
+       "cancel_url": "http://q/cancel"}
+
+
+class Reply:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        return self.body
+
+
+class QueueSession:
+    """Answers status polls from a script; anything else in the script is raised"""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.cancelled = False
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        return Reply(body={**JOB})
+
+    def get(self, url, headers=None, timeout=None):
+        reply = self.statuses.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def put(self, url, headers=None, timeout=None):
+        self.cancelled = True
+        return Reply()
+
+
+def test_poll_turns_transient_failures_into_retries():
+    session = QueueSession([Reply(503), requests.ConnectionError("reset"), Reply(body={"status": "IN_QUEUE"})])
+    client = FalQueueClient("app", session=session)
+    job = dict(JOB)
+    assert [client.poll(job)["status"] for _ in range(3)] == ["RETRY", "RETRY", "IN_QUEUE"]
+    assert job["retries"] == 2 and job["polls"] == 3
+
+
+def test_poll_raises_client_errors():
+    client = FalQueueClient("app", session=QueueSession([Reply(401)]))
+    with pytest.raises(requests.HTTPError):
+        client.poll(dict(JOB))
+
+
+def test_backoff_is_jittered_and_capped():
+    for attempt in range(10):
+        interval = min(8.0, 1.0 * 2 ** attempt)
+        assert interval / 2 <= backoff(attempt, 1.0, 8.0) <= interval
+
+
+def test_imagen_adapter_cancels_the_request(tmp_path):
+    session = QueueSession([Reply(502)])
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(FalJobError, match="cancelled"):
+        FalImagenAdapter(session, tmp_path).generate("a cat", cancel=cancel)
+    assert session.cancelled
+
+
+def test_imagen_adapter_fails_on_an_error_status(tmp_path):
+    adapter = FalImagenAdapter(QueueSession([Reply(body={"status": "FAILED"})]), tmp_path)
+    with pytest.raises(FalJobError, match="failed"):
+        adapter.generate("a cat")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Check resumable downloads against an in-memory server that honours Range requests
+"""
+import hashlib
+import io
+
+import pytest
+import requests
+
+from fetcher import ArtifactFetcher, ArtifactVerificationError
+
+DATA = bytes(range(256)) * 40
+
+
+class FakeSession:
+    """Serves body for every GET, honouring Range; drop_after cuts the first response short"""
+
+    def __init__(self, body: bytes, drop_after: int = 0, size_header: int = None):
+        self.body = body
+        self.drop_after = drop_after
+        self.size_header = size_header
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        headers = headers or {}
+        self.requests.append(headers.get("Range"))
+        response = requests.Response()
+        response.url = url
+        total = len(self.body) if self.size_header is None else self.size_header
+        start = int(headers["Range"][6:-1]) if "Range" in headers else 0
+        if start >= len(self.body) and "Range" in headers:
+            response.status_code = 416
+            response.headers["Content-Range"] = f"bytes */{total}"
+            response.raw = io.BytesIO(b"")
+            return response
+        body = self.body[start:]
+        response.status_code = 206 if start else 200
+        if start:
+            response.headers["Content-Range"] = f"bytes {start}-{len(self.body) - 1}/{total}"
+        response.headers["Content-Length"] = str(len(body) if self.size_header is None else total - start)
+        if self.drop_after:
+            drop, self.drop_after = self.drop_after, 0
+            response.raw = BrokenStream(body[:drop])
+        else:
+            response.raw = io.BytesIO(body)
+        return response
+
+
+class BrokenStream(io.BytesIO):
+    def read(self, *args, **kwargs):
+        data = super().read(*args, **kwargs)
+        if not data:
+            raise requests.ConnectionError("connection reset")
+        return data
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr("fetcher.time.sleep", lambda seconds: None)
+
+
+def test_interrupted_download_resumes_with_a_range_request(tmp_path):
+    session = FakeSession(DATA, drop_after=1000)
+    result = ArtifactFetcher(session, chunk_size=256).fetch(
+        "http://x/a.bin", tmp_path / "a.bin", expected_sha256=hashlib.sha256(DATA).hexdigest(),
+        expected_size=len(DATA))
+    assert (tmp_path / "a.bin").read_bytes() == DATA
+    assert session.requests == [None, "bytes=1000-"]
+    assert result["retries"] == 1 and result["size"] == len(DATA)
+
+
+def test_server_size_that_contradicts_the_expected_size_fails(tmp_path):
+    session = FakeSession(DATA, size_header=len(DATA) + 5)
+    with pytest.raises(ArtifactVerificationError, match="server reports"):
+        ArtifactFetcher(session).fetch("http://x/a.bin", tmp_path / "a.bin", expected_size=len(DATA))
+    assert not (tmp_path / "a.bin").exists()
+
+
+def test_short_body_is_not_renamed_into_place(tmp_path):
+    session = FakeSession(DATA[:100], size_header=len(DATA))
+    with pytest.raises(ArtifactVerificationError, match="got 100"):
+        ArtifactFetcher(session).fetch("http://x/a.bin", tmp_path / "a.bin", expected_size=len(DATA))
+    assert not (tmp_path / "a.bin").exists()
+
+
+def test_complete_partial_is_accepted_on_416(tmp_path):
+    (tmp_path / "a.bin.part").write_bytes(DATA)
+    session = FakeSession(DATA)
+    result = ArtifactFetcher(session).fetch("http://x/a.bin", tmp_path / "a.bin")
+    assert result["bytes_transferred"] == 0 and (tmp_path / "a.bin").read_bytes() == DATA
+
+
+def test_oversized_partial_is_discarded_on_416(tmp_path):
+    (tmp_path / "a.bin.part").write_bytes(DATA + b"stale tail")
+    session = FakeSession(DATA)
+    result = ArtifactFetcher(session).fetch("http://x/a.bin", tmp_path / "a.bin")
+    assert session.requests == [f"bytes={len(DATA) + 10}-", None]
+    assert result["size"] == len(DATA) and (tmp_path / "a.bin").read_bytes() == DATA
+
+
+def test_fetch_many_reports_failures_per_item(tmp_path):
+    fetcher = ArtifactFetcher(FakeSession(DATA))
+    results = fetcher.fetch_many([
+        {"url": "http://x/a.bin", "dest": tmp_path / "a.bin"},
+        {"url": "http://x/b.bin", "dest": tmp_path / "b.bin", "expected_sha256": "0" * 64},
+    ])
+    assert results[0]["size"] == len(DATA)
+    assert "SHA-256" in results[1]["error"] and not (tmp_path / "b.bin.part").exists()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Check the streaming re-encode on synthetic clips
+"""
+import subprocess
+
+import pytest
+
+from ffmpeg_tools import get_ffmpeg_exe, probe_media, stream_reencode
+
+
+def make_media(path, source, codec_args):
+    subprocess.run([get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+                    "-f", "lavfi", "-i", source, *codec_args, str(path)], check=True)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def media(tmp_path_factory):
+    root = tmp_path_factory.mktemp("ffmpeg_tools")
+    video = make_media(root / "clip.mp4", "testsrc=size=160x120:rate=10:duration=2",
+                       ["-c:v", "libx264", "-pix_fmt", "yuv420p"])
+    audio = make_media(root / "music.wav", "sine=duration=1", [])
+    return video, audio
+
+
+def test_reencode_streams_every_frame(media, tmp_path):
+    video, audio = media
+    result = stream_reencode(video, audio, str(tmp_path / "out.mp4"), buffer_mb=1)
+    assert result["frames"] == 20
+    info = probe_media(result["path"])
+    assert info["video_codec"] == "h264" and info["audio_codec"] == "aac"
+
+
+def test_missing_input_fails_instead_of_writing_audio_only(media, tmp_path):
+    _, audio = media
+    with pytest.raises(RuntimeError, match="decode failed"):
+        stream_reencode(str(tmp_path / "missing.mp4"), audio, str(tmp_path / "out.mp4"),
+                        video_info={"width": 160, "height": 120, "fps": 10, "duration": 2})
+
+
+def test_reencode_takes_raw_pcm_audio(media, tmp_path):
+    video, _ = media
+    # One second of stereo f32le at 8 kHz, in several chunks, for a two second clip
+    chunks = (bytes(8000 * 2 * 4 // 4) for _ in range(4))
+    result = stream_reencode(video, None, str(tmp_path / "out.mp4"), duration=2.0,
+                             audio_pcm=chunks, sample_rate=8000, channels=2)
+    info = probe_media(result["path"])
+    assert result["frames"] == 20 and info["audio_codec"] == "aac"
+
+
+def test_failing_pcm_source_fails_the_encode(media, tmp_path):
+    video, _ = media
+
+    def chunks():
+        yield bytes(1024)
+        raise ValueError("bad chunk")
+
+    with pytest.raises(RuntimeError, match="bad chunk"):
+        stream_reencode(video, None, str(tmp_path / "out.mp4"), audio_pcm=chunks())
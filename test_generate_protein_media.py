@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Check that pruning old protein runs only deletes what their manifests list inside the output directory
+"""
+import json
+import os
+import time
+
+from generate_protein_media import prune_runs
+
+
+def write_run(output_dir, run_id, files, age_days):
+    manifest = output_dir / f"protein_results_{run_id}.json"
+    manifest.write_text(json.dumps({"run_id": run_id, "files": {stage: str(path) for stage, path in files.items()}}))
+    stamp = time.time() - age_days * 86400
+    os.utime(manifest, (stamp, stamp))
+    return manifest
+
+
+def test_prune_removes_only_old_runs_inside_the_output_dir(tmp_path):
+    output_dir = tmp_path / "protein_output"
+    output_dir.mkdir()
+    old_video = output_dir / "final_protein_video_with_music_old.mp4"
+    new_video = output_dir / "final_protein_video_with_music_new.mp4"
+    unlisted = output_dir / "hailuo_jobs.json"
+    outside = tmp_path / "README.md"
+    for path in (old_video, new_video, unlisted, outside):
+        path.write_text("keep")
+    old_manifest = write_run(output_dir, "old", {"final_video": old_video, "image": outside}, age_days=8)
+    new_manifest = write_run(output_dir, "new", {"final_video": new_video}, age_days=1)
+
+    assert prune_runs(output_dir, 7) == 2
+    assert not old_video.exists() and not old_manifest.exists()
+    assert new_video.exists() and new_manifest.exists()
+    assert unlisted.exists() and outside.exists()
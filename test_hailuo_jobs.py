@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Check the Hailuo poller: concurrent renders of the same inputs share one submitted job
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from hailuo_jobs import HailuoJobPoller, HailuoJobError
+
+
+class FakeClient:
+    """Completes each job after a few polls and "downloads" a small file"""
+
+    def __init__(self, polls_until_done=3, final_status="COMPLETED"):
+        self.polls_until_done = polls_until_done
+        self.final_status = final_status
+        self.submitted = []
+        self.cancelled = []
+        self.lock = threading.Lock()
+
+    def submit(self, image_path, prompt, prompt_optimizer=True):
+        with self.lock:
+            self.submitted.append(prompt)
+            request_id = f"req-{len(self.submitted)}"
+        time.sleep(0.05)
+        return {"request_id": request_id, "status_url": "", "response_url": "", "cancel_url": ""}
+
+    def poll(self, job):
+        job["polls"] = job.get("polls", 0) + 1
+        return {"status": self.final_status if job["polls"] >= self.polls_until_done else "IN_PROGRESS"}
+
+    def result(self, job):
+        return {"video": {"url": f"http://x/{job['request_id']}.mp4"}}
+
+    def download(self, url, dest, expected_size=None):
+        dest.write_bytes(b"video")
+        return {"path": str(dest), "sha256": "0" * 64, "bytes_transferred": 5, "retries": 0}
+
+    def cancel(self, job):
+        self.cancelled.append(job["request_id"])
+
+
+@pytest.fixture
+def poller_factory(tmp_path):
+    pollers = []
+
+    def make(client):
+        poller = HailuoJobPoller(client, tmp_path, initial_interval=0.01, max_interval=0.02)
+        pollers.append(poller)
+        return poller
+
+    yield make
+    for poller in pollers:
+        poller.close()
+
+
+def test_concurrent_renders_of_the_same_inputs_submit_once(poller_factory, tmp_path):
+    client = FakeClient()
+    poller = poller_factory(client)
+    image = tmp_path / "cat.png"
+    image.write_bytes(b"png")
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        outputs = list(executor.map(lambda _: poller.render_sync(str(image), "a cat walks"), range(3)))
+    assert client.submitted == ["a cat walks"]
+    assert len(set(outputs)) == 1
+    assert poller.render_locks == {} and poller.render_lock_users == {}
+
+
+def test_different_inputs_render_in_parallel(poller_factory, tmp_path):
+    client = FakeClient()
+    poller = poller_factory(client)
+    image = tmp_path / "cat.png"
+    image.write_bytes(b"png")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        outputs = list(executor.map(lambda prompt: poller.render_sync(str(image), prompt), ["walks", "jumps"]))
+    assert sorted(client.submitted) == ["jumps", "walks"] and len(set(outputs)) == 2
+
+
+def test_failed_job_is_recorded_and_not_reused(poller_factory, tmp_path):
+    client = FakeClient(polls_until_done=1, final_status="FAILED")
+    poller = poller_factory(client)
+    with pytest.raises(HailuoJobError):
+        poller.render_sync("http://x/cat.png", "a cat")
+    assert poller.store.find(next(iter(poller.store.jobs.values()))["input_key"]) is None
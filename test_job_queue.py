@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Check the SQLite job queue: priorities, lease expiry and reclaim, retries and dead-lettering
+"""
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, run_worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "queue.sqlite3")
+
+
+def test_lanes_are_claimed_by_priority_then_age(queue):
+    bulk = queue.enqueue("media", {"n": 1}, lane="bulk")
+    adhoc_first = queue.enqueue("media", {"n": 2}, lane="adhoc")
+    urgent = queue.enqueue("media", {"n": 3}, lane="urgent")
+    adhoc_second = queue.enqueue("media", {"n": 4}, lane="adhoc")
+    queue.enqueue("protein", {"n": 5}, lane="urgent")
+
+    claimed = [queue.claim("w", ["media"])["id"] for _ in range(4)]
+    assert claimed == [urgent, adhoc_first, adhoc_second, bulk]
+    assert queue.claim("w", ["media"]) is None
+
+
+def test_unknown_lane_is_rejected(queue):
+    with pytest.raises(ValueError, match="Unknown lane"):
+        queue.enqueue("media", {}, lane="whenever")
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue):
+    job_id = queue.enqueue("media", {})
+    first = queue.claim("dead-worker", ["media"], lease_seconds=0.05)
+    assert first["attempts"] == 1
+    assert queue.claim("live-worker", ["media"]) is None
+    time.sleep(0.1)
+
+    second = queue.claim("live-worker", ["media"])
+    assert second["id"] == job_id and second["attempts"] == 2
+    # The first worker lost its lease, so it can neither extend it nor settle the job
+    assert not queue.heartbeat(job_id, "dead-worker")
+    assert queue.fail(job_id, "dead-worker", "late") == "lost"
+    queue.complete(job_id, "live-worker", {"ok": True})
+    assert queue.get(job_id)["status"] == "done"
+
+
+def test_failures_back_off_then_dead_letter(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "RETRY_BASE_SECONDS", 0)
+    job_id = queue.enqueue("media", {}, max_attempts=2)
+    assert queue.fail(queue.claim("w", ["media"])["id"], "w", "boom") == "queued"
+    assert queue.fail(queue.claim("w", ["media"])["id"], "w", "boom again") == "dead"
+    job = queue.get(job_id)
+    assert job["status"] == "dead" and job["last_error"] == "boom again"
+    assert queue.claim("w", ["media"]) is None
+
+    assert queue.requeue_dead() == 1
+    assert queue.claim("w", ["media"])["attempts"] == 1
+
+
+def test_retry_waits_for_its_backoff(queue):
+    job_id = queue.enqueue("media", {})
+    queue.fail(queue.claim("w", ["media"])["id"], "w", "boom")
+    assert queue.claim("w", ["media"]) is None
+    assert queue.get(job_id)["available_at"] >= time.time() + job_queue.RETRY_BASE_SECONDS - 1
+
+
+def test_expired_lease_on_last_attempt_is_dead_lettered(queue):
+    job_id = queue.enqueue("media", {}, max_attempts=1)
+    queue.claim("dead-worker", ["media"], lease_seconds=0.05)
+    time.sleep(0.1)
+    assert queue.claim("w", ["media"]) is None
+    job = queue.get(job_id)
+    assert job["status"] == "dead" and job["last_error"] == "lease expired"
+
+
+def test_worker_records_the_cause_of_a_system_exit(queue):
+    job_id = queue.enqueue("media", {}, max_attempts=1)
+
+    def handler(job):
+        try:
+            raise RuntimeError("provider down")
+        except RuntimeError:
+            raise SystemExit(1)
+
+    assert run_worker(queue, ["media"], handler, exit_when_empty=True) == 1
+    assert queue.get(job_id)["last_error"] == "RuntimeError: provider down"
+    assert queue.stats() == {"dead": {"adhoc": 1}}
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Check the content-addressed media cache: keys, hits and misses, expiry, LRU eviction and sharing between instances
+"""
+import os
+import time
+
+import pytest
+
+from media_cache import MediaCache, cache_key, file_digest
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "out" / "image.png"
+    path.parent.mkdir()
+    path.write_bytes(b"x" * 1024)
+    return path
+
+
+def test_key_ignores_prompt_whitespace_but_not_params():
+    assert cache_key("image", "a  cat\n on a mat", {"n": 1}) == cache_key("image", "a cat on a mat", {"n": 1})
+    assert cache_key("image", "a cat", {"n": 1}) != cache_key("image", "a cat", {"n": 2})
+    assert cache_key("image", "a cat", {}) != cache_key("video", "a cat", {})
+
+
+def test_put_then_get_returns_a_copy_in_the_cache(tmp_path, artifact):
+    cache = MediaCache(tmp_path / "cache")
+    assert cache.get("image", "a cat", {}) is None
+    cached = cache.put("image", "a cat", {}, str(artifact))
+    assert cached.startswith(str(tmp_path / "cache"))
+    assert cached.endswith(".png")
+    assert cache.get("image", " a  cat ", {}) == cached
+    assert file_digest(cached) == file_digest(str(artifact))
+
+
+def test_disabled_and_refresh_never_hit(tmp_path, artifact):
+    assert MediaCache(tmp_path / "off", enabled=False).put("image", "a cat", {}, str(artifact)) is None
+    MediaCache(tmp_path / "cache").put("image", "a cat", {}, str(artifact))
+    assert MediaCache(tmp_path / "cache", refresh=True).get("image", "a cat", {}) is None
+
+
+def test_missing_or_expired_files_are_misses(tmp_path, artifact):
+    cache = MediaCache(tmp_path / "cache", max_age_days=1)
+    cached = cache.put("image", "a cat", {}, str(artifact))
+    os.unlink(cached)
+    assert cache.get("image", "a cat", {}) is None
+
+    cached = cache.put("image", "a cat", {}, str(artifact))
+    with cache.locked_index():
+        for entry in cache.index.values():
+            entry["created"] -= 2 * 24 * 60 * 60
+    assert cache.get("image", "a cat", {}) is None
+    assert not os.path.exists(cached)
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(tmp_path, artifact):
+    # Room for two 1 KB artifacts
+    cache = MediaCache(tmp_path / "cache", max_size_mb=2.5 / 1024)
+    first = cache.put("image", "first", {}, str(artifact))
+    time.sleep(0.01)
+    cache.put("image", "second", {}, str(artifact))
+    time.sleep(0.01)
+    assert cache.get("image", "first", {}) == first
+    time.sleep(0.01)
+    cache.put("image", "third", {}, str(artifact))
+
+    assert cache.get("image", "second", {}) is None
+    assert cache.get("image", "first", {}) == first
+    assert cache.get("image", "third", {}) is not None
+
+
+def test_instances_sharing_a_directory_keep_each_others_entries(tmp_path, artifact):
+    one = MediaCache(tmp_path / "cache")
+    two = MediaCache(tmp_path / "cache")
+    one.put("image", "from one", {}, str(artifact))
+    two.put("image", "from two", {}, str(artifact))
+
+    fresh = MediaCache(tmp_path / "cache")
+    assert fresh.get("image", "from one", {}) is not None
+    assert fresh.get("image", "from two", {}) is not None
+
+
+def test_unreadable_index_starts_empty(tmp_path, artifact):
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "cache" / "index.json").write_text("{not json")
+    cache = MediaCache(tmp_path / "cache")
+    assert cache.index == {}
+    assert cache.put("image", "a cat", {}, str(artifact)) is not None
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Check the job API: request validation, event streaming and eviction of finished jobs
+"""
+import http.client
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from media_server import MediaJobServer
+
+DEFAULTS = {"image_prompt": "a cat", "text_overlay": "hi", "music_prompt": "calm", "caption_variants": None}
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_media_workflow(self, image_prompt, text_overlay, music_prompt, run_id=None, progress=None,
+                                caption_variants=None):
+        progress({"event": "stage_started", "stage": "image"})
+        self.release.wait(5)
+        return {"generated_files": {"final_video": f"output/{run_id}.mp4"}}
+
+
+@pytest.fixture
+def api():
+    generator = FakeGenerator()
+    server = MediaJobServer(generator, DEFAULTS)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.handler())
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+
+    def request(method, path, body=None):
+        connection = http.client.HTTPConnection("127.0.0.1", httpd.server_port, timeout=10)
+        connection.request(method, path, body=None if body is None else json.dumps(body))
+        response = connection.getresponse()
+        data = response.read()
+        connection.close()
+        return response.status, data
+
+    yield server, generator, request
+    generator.release.set()
+    httpd.shutdown()
+    httpd.server_close()
+    server.executor.shutdown(wait=True)
+
+
+@pytest.mark.parametrize("body", [
+    {"image_prompt": 42},
+    {"music_prompt": ["calm"]},
+    {"caption_variants": "one caption"},
+    {"caption_variants": ["ok", 3]},
+    {"id": 7},
+    {"id": "../escape"},
+    ["not", "an", "object"],
+])
+def test_malformed_jobs_are_rejected_with_400(api, body):
+    _, _, request = api
+    status, data = request("POST", "/jobs", body)
+    assert status == 400, data
+
+
+def test_running_id_conflicts_and_events_stream_to_completion(api):
+    server, generator, request = api
+    generator.release.clear()
+    assert request("POST", "/jobs", {"id": "run-1", "caption_variants": ["a", "b"]})[0] == 202
+    assert request("POST", "/jobs", {"id": "run-1"})[0] == 409
+    generator.release.set()
+
+    status, data = request("GET", "/jobs/run-1/events")
+    events = [line[len("event: "):] for line in data.decode().splitlines() if line.startswith("event: ")]
+    assert status == 200 and events[0] == "job_queued" and events[-1] == "job_finished"
+    status, data = request("GET", "/jobs/run-1/result")
+    assert json.loads(data)["generated_files"]["final_video"] == "output/run-1.mp4"
+
+
+def test_finished_jobs_are_evicted_by_count_and_age(api):
+    server, _, _ = api
+    server.max_finished = 2
+    for index in range(4):
+        server.submit({"id": f"job-{index}"})
+        deadline = time.time() + 5
+        while not server.get(f"job-{index}").done and time.time() < deadline:
+            time.sleep(0.01)
+    assert [job["id"] for job in server.list()] == ["job-2", "job-3"]
+
+    server.finished_ttl = 0
+    assert server.list() == []
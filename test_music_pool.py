@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Check the music pool's claim/deposit/refill cycle and its statistics
+"""
+import time
+
+import pytest
+
+from music_pool import MusicPool, bucket_key, in_window, parse_hours
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return MusicPool(tmp_path / "pool", default_target=2)
+
+
+def make_track(directory, name="track.wav"):
+    path = directory / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"RIFF" + bytes(32))
+    return str(path)
+
+
+def test_claim_counts_a_miss_then_hits_a_deposited_track(pool, tmp_path):
+    assert pool.claim("Calm  Rain", "ambient", "slow", tmp_path / "out") is None
+    assert pool.deposit("calm rain", "ambient", "slow", make_track(tmp_path / "new")) == 1
+
+    claimed = pool.claim("calm rain", "ambient", "slow", tmp_path / "out")
+    assert claimed and claimed.startswith(str(tmp_path / "out"))
+    assert open(claimed, "rb").read().startswith(b"RIFF")
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["ready"]) == (1, 1, 0)
+    assert stats["hit_rate"] == 0.5
+    assert stats["buckets"][0]["bucket"] == bucket_key("calm rain", "ambient", "slow")
+
+
+def test_claim_skips_and_marks_lost_files(pool, tmp_path):
+    pool.deposit("waves", "", "", make_track(tmp_path / "new", "a.wav"))
+    pool.deposit("waves", "", "", make_track(tmp_path / "new", "b.wav"))
+    with pool.connect() as db:
+        first = db.execute("SELECT file FROM tracks ORDER BY id LIMIT 1").fetchone()["file"]
+    (pool.root / first).unlink()
+
+    claimed = pool.claim("waves", "", "", tmp_path / "out")
+    assert claimed is not None
+    with pool.connect() as db:
+        statuses = [row["status"] for row in db.execute("SELECT status FROM tracks ORDER BY id")]
+    assert statuses == ["lost", "claimed"]
+    assert pool.claim("waves", "", "", tmp_path / "out") is None
+
+
+def test_refill_tops_buckets_up_and_records_lag(pool, tmp_path):
+    pool.add_bucket("forest", target=2)
+    made = []
+
+    def generate(prompt, style, tempo):
+        made.append(prompt)
+        return make_track(tmp_path / "incoming", f"{len(made)}.wav")
+
+    time.sleep(0.01)
+    assert pool.refill(generate) == 2
+    assert pool.deficits() == []
+    stats = pool.stats()
+    assert stats["ready"] == 2
+    lag = stats["refill_lag"]
+    assert lag["refills"] == 1 and lag["max_seconds"] is not None and lag["max_seconds"] >= 0
+    assert stats["buckets"][0]["deficit_seconds"] is None
+
+    pool.claim("forest", "", "", tmp_path / "out")
+    assert pool.stats()["buckets"][0]["deficit_seconds"] is not None
+
+
+def test_refill_at_peak_only_seeds_empty_buckets(pool, tmp_path):
+    pool.add_bucket("empty", target=3)
+    pool.add_bucket("partial", target=3)
+    pool.deposit("partial", "", "", make_track(tmp_path / "new"))
+    hour = time.localtime().tm_hour
+    closed = ((hour + 1) % 24, (hour + 2) % 24)
+
+    made = []
+    assert pool.refill(lambda p, s, t: made.append(p) or make_track(tmp_path / "in", f"{len(made)}.wav"),
+                       off_peak=closed) == 1
+    assert made == ["empty"]
+
+
+def test_failed_generations_are_not_counted(pool, tmp_path):
+    pool.add_bucket("storm", target=1)
+
+    def generate(prompt, style, tempo):
+        raise RuntimeError("quota")
+
+    assert pool.refill(generate) == 0
+    assert pool.stats()["ready"] == 0
+
+
+def test_off_peak_window_wraps_midnight():
+    window = parse_hours("22-6")
+    assert in_window(window, 23) and in_window(window, 2) and not in_window(window, 12)
+    with pytest.raises(ValueError):
+        parse_hours("late")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Check local caption rendering: style-specific names, safe rewrites and CJK glyphs
+"""
+import os
+
+import pytest
+from PIL import Image
+
+from overlay import TextCompositor, OverlayStyle, load_fallback_font, missing_glyphs, select_font
+
+JAPANESE_CAPTION = "猫はとてもかわいい"
+
+
+@pytest.fixture
+def base_image(tmp_path):
+    path = tmp_path / "base.png"
+    Image.new("RGB", (320, 240), (40, 90, 160)).save(path)
+    return str(path)
+
+
+def test_styles_get_their_own_files(base_image, tmp_path):
+    center = TextCompositor(OverlayStyle(position="center")).render_captions(base_image, ["Hi"], tmp_path)
+    top = TextCompositor(OverlayStyle(position="top")).render_captions(base_image, ["Hi"], tmp_path)
+    assert center["Hi"] != top["Hi"]
+    assert "_top_" in os.path.basename(top["Hi"])
+
+
+def test_rerender_replaces_instead_of_rewriting_in_place(base_image, tmp_path):
+    compositor = TextCompositor()
+    path = compositor.render_captions(base_image, ["Hi"], tmp_path)["Hi"]
+    # Stands in for the artifact store's hardlinked blob
+    blob = tmp_path / "blob.png"
+    os.link(path, blob)
+    before = blob.read_bytes()
+    compositor.style.fill = (255, 0, 0, 255)
+    compositor.save(compositor.render(Image.open(base_image).convert("RGBA"), "Hi"), path)
+    assert blob.read_bytes() == before
+    assert not os.path.samefile(path, blob)
+    assert not [name for name in os.listdir(tmp_path) if ".tmp" in name]
+
+
+def test_japanese_caption_uses_a_font_with_its_glyphs(base_image, tmp_path):
+    if load_fallback_font(None, 32) is None:
+        pytest.skip("no CJK-capable font installed (e.g. fonts-noto-cjk)")
+    font = select_font(JAPANESE_CAPTION, None, None, 32)
+    assert missing_glyphs(font, JAPANESE_CAPTION) == []
+    path = TextCompositor().render_captions(base_image, [JAPANESE_CAPTION], tmp_path)[JAPANESE_CAPTION]
+    with Image.open(path) as image:
+        assert image.size == (320, 240)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Check the perceptual-hash index: hash stability, exact-radius search and reuse across workers
+"""
+import random
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from phash_index import MultiIndexHash, PerceptualIndex, hamming, phash
+
+
+def smooth_noise(seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray((rng.random((16, 16)) * 255).astype(np.uint8)).resize((256, 256), Image.BICUBIC)
+
+
+@pytest.fixture
+def images(tmp_path):
+    """An image, the same image with a small caption-sized mark, and an unrelated image"""
+    paths = {name: tmp_path / f"{name}.png" for name in ("original", "marked", "other")}
+    original = smooth_noise(1).convert("RGB")
+    original.save(paths["original"])
+    ImageDraw.Draw(original).rectangle((10, 10, 30, 20), fill=(255, 255, 255))
+    original.save(paths["marked"])
+    smooth_noise(2).save(paths["other"])
+    return {name: str(path) for name, path in paths.items()}
+
+
+def test_similar_images_hash_close_and_different_ones_far(images):
+    original = phash(images["original"])
+    assert phash(images["original"]) == original
+    assert hamming(original, phash(images["marked"])) <= 6
+    assert hamming(original, phash(images["other"])) > 6
+
+
+def test_multi_index_search_matches_a_linear_scan():
+    rng = random.Random(0)
+    table = MultiIndexHash(radius=6)
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    # Near neighbours of the first value, at increasing distances
+    base = values[0]
+    for bits in range(1, 10):
+        values.append(base ^ ((1 << bits) - 1))
+    for position, value in enumerate(values):
+        table.add(value, position)
+
+    expected = sorted((hamming(base, value), -position) for position, value in enumerate(values)
+                      if hamming(base, value) <= 6)
+    assert table.search(base) == [(distance, -negative) for distance, negative in expected]
+
+
+def test_find_video_needs_the_same_caption_and_an_existing_video(tmp_path, images):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+    index = PerceptualIndex(tmp_path / "phash.jsonl")
+    index.add(phash(images["original"]), images["original"], str(video), "a cat", "Hello  world")
+
+    match = index.find_video(phash(images["marked"]), "Hello world")
+    assert match["video"] == str(video)
+    assert match["distance"] <= 6
+    assert index.find_video(phash(images["marked"]), "Goodbye") is None
+    assert index.find_video(phash(images["other"]), "Hello world") is None
+
+    video.unlink()
+    assert index.find_video(phash(images["original"]), "Hello world") is None
+
+
+def test_entries_from_another_worker_are_picked_up(tmp_path, images):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+    reader = PerceptualIndex(tmp_path / "phash.jsonl")
+    writer = PerceptualIndex(tmp_path / "phash.jsonl")
+    image_hash = phash(images["original"])
+    assert reader.find_video(image_hash, None) is None
+
+    writer.add(image_hash, images["original"], str(video), "a cat", None)
+    assert reader.find_video(image_hash, None)["video"] == str(video)
+
+
+def test_bad_and_partial_lines_are_skipped(tmp_path, images):
+    path = tmp_path / "phash.jsonl"
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+    image_hash = phash(images["original"])
+    path.write_text('not json\n{"phash": "%016x", "video": "%s", "caption": ""}\n{"phash": "00'
+                    % (image_hash, video))
+
+    index = PerceptualIndex(path)
+    assert index.find_video(image_hash, None)["video"] == str(video)
+    # The unterminated line is left for the next refresh
+    assert index.offset < path.stat().st_size
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Check that every rendition crops the expected share of the source
+Runs the real ffmpeg filters on a synthetic 1280x720 clip.
+"""
+import re
+import subprocess
+
+import pytest
+
+from ffmpeg_tools import get_ffmpeg_exe, probe_media
+from renditions import PRESETS, parse_rendition, parse_renditions, encode_renditions
+
+SOURCE_WIDTH, SOURCE_HEIGHT = 1280, 720
+
+# Share of the source (width, height) each preset keeps after its center crop
+EXPECTED_SHARE = {
+    "landscape": (1.0, 1.0),
+    "portrait": (405 / 1280, 1.0),
+    "square": (720 / 1280, 1.0),
+}
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    path = tmp_path_factory.mktemp("renditions") / "source.mp4"
+    subprocess.run(
+        [get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+         "-f", "lavfi", "-i", f"testsrc=size={SOURCE_WIDTH}x{SOURCE_HEIGHT}:rate=10:duration=1",
+         "-c:v", "libx264", "-pix_fmt", "yuv420p", str(path)],
+        check=True
+    )
+    return str(path)
+
+
+def crop_size(source_path, crop_filter):
+    """Frame size after a crop filter, as reported by showinfo"""
+    proc = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-i", source_path, "-frames:v", "1",
+         "-vf", f"{crop_filter},showinfo", "-f", "null", "-"],
+        capture_output=True, text=True, errors="replace"
+    )
+    match = re.search(r"\bs:(\d+)x(\d+)", proc.stderr)
+    assert match, proc.stderr
+    return int(match.group(1)), int(match.group(2))
+
+
+@pytest.mark.parametrize("preset", sorted(PRESETS))
+def test_crop_keeps_expected_share(source, preset):
+    width, height = crop_size(source, parse_rendition(preset).crop_filter())
+    share_width, share_height = EXPECTED_SHARE[preset]
+    # yuv420p rounds crop sizes down to even pixels
+    assert abs(width - SOURCE_WIDTH * share_width) <= 2
+    assert abs(height - SOURCE_HEIGHT * share_height) <= 2
+
+
+def test_encoded_renditions_match_their_specs(source, tmp_path):
+    renditions = [parse_rendition(preset) for preset in sorted(PRESETS)]
+    outputs = encode_renditions(source, renditions, tmp_path, "clip", preset="ultrafast")
+    for rendition, output in zip(renditions, outputs):
+        info = probe_media(output["path"])
+        assert (info["width"], info["height"]) == (rendition.width, rendition.height)
+
+
+def test_duplicate_rendition_names_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Duplicate rendition name 'square'"):
+        parse_renditions(["square", "portrait", "square=1:1@540x540:2M"])
+    with pytest.raises(ValueError, match="Duplicate"):
+        encode_renditions("unused.mp4", [parse_rendition("square")] * 2, tmp_path, "clip")
+    assert [r.name for r in parse_renditions(["square", "small=1:1@540x540:2M"])] == ["square", "small"]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Check latency-aware routing: ranking, hedging, failover, loser cancellation and persisted stats
+"""
+import threading
+import time
+
+import pytest
+
+from routing import ProviderRouter, Route, RouteStats
+
+
+def route(name, seconds=0.0, result=None, fail=False, calls=None):
+    """A route that answers after `seconds`, or stops early when cancelled"""
+    def call(*args, cancel: threading.Event, **kwargs):
+        if calls is not None:
+            calls.append(name)
+        if cancel.wait(seconds):
+            return ""
+        if fail:
+            raise RuntimeError(f"{name} is down")
+        return result or f"{name}.png"
+    return Route(name, call)
+
+
+def seed(route_, seconds, ok=True, count=5):
+    for _ in range(count):
+        route_.stats.record(seconds, ok)
+
+
+def test_percentiles_and_error_rate():
+    stats = RouteStats()
+    assert stats.latency_percentile(50) is None
+    for seconds in (1, 2, 3, 4, 5, 6, 7, 8, 9, 10):
+        stats.record(seconds, True)
+    stats.record(100, False)
+    assert stats.latency_percentile(50) == 5
+    assert stats.latency_percentile(95) == 10
+    assert stats.error_rate() == pytest.approx(1 / 11)
+
+
+def test_router_needs_a_route():
+    with pytest.raises(ValueError):
+        ProviderRouter("image", [])
+
+
+def test_ranking_prefers_healthy_then_fast_and_keeps_unmeasured_order():
+    slow, fast, broken, new = route("slow"), route("fast"), route("broken"), route("new")
+    seed(slow, 5.0)
+    seed(fast, 1.0)
+    seed(broken, 0.1, ok=False)
+    router = ProviderRouter("image", [slow, fast, broken, new])
+    assert [r.name for r in router.ranked()] == ["new", "fast", "slow", "broken"]
+
+
+def test_failed_route_fails_over_to_the_next():
+    calls = []
+    router = ProviderRouter("image", [route("primary", fail=True, calls=calls),
+                                      route("backup", calls=calls)], hedge_after=10)
+    assert router.call("prompt") == "backup.png"
+    assert calls == ["primary", "backup"]
+    assert router.stats()["primary"]["error_rate"] == 1.0
+
+
+def test_every_route_failing_returns_empty():
+    router = ProviderRouter("image", [route("a", fail=True), route("b", fail=True)], hedge_after=10)
+    assert router.call() == ""
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    cancelled = threading.Event()
+
+    def stalled(*args, cancel: threading.Event, **kwargs):
+        cancel.wait(5)
+        if cancel.is_set():
+            cancelled.set()
+        return "stalled.png"
+
+    router = ProviderRouter("image", [Route("stalled", stalled), route("backup")], hedge_after=0.05)
+    started = time.time()
+    assert router.call() == "backup.png"
+    assert time.time() - started < 1
+    assert cancelled.wait(1)
+
+
+def test_hedge_delay_follows_the_route_p95():
+    measured, unmeasured = route("measured"), route("unmeasured")
+    seed(measured, 2.0)
+    router = ProviderRouter("image", [measured, unmeasured], default_hedge_seconds=30)
+    assert router.hedge_delay(measured) == 2.0
+    assert router.hedge_delay(unmeasured) == 30
+
+
+def test_stats_persist_across_routers(tmp_path):
+    stats_path = tmp_path / "routing.json"
+    ProviderRouter("image", [route("a")], stats_path=stats_path).call()
+    ProviderRouter("video", [route("v")], stats_path=stats_path).call()
+
+    reloaded = ProviderRouter("image", [route("a")], stats_path=stats_path)
+    assert reloaded.stats()["a"]["samples"] == 1
+    assert ProviderRouter("video", [route("v")], stats_path=stats_path).stats()["v"]["samples"] == 1